@@ -25,5 +25,21 @@ setup(
     author="Renga Rajan K",
     author_email="maharengarajan46@gmail.com",
     packages=find_packages(),
+    # app.py holds the Flask factory loaded by bot-serve and `gunicorn app:app`
+    py_modules=["app"],
     install_requires=get_requirements("requirements.txt"),
+    extras_require={
+        # asyncio serving mode, see src/bot/asgi.py
+        "async": ["quart", "quart-cors", "aiomysql", "httpx", "aiosmtplib", "hypercorn"],
+    },
+    entry_points={
+        "console_scripts": [
+            "bot-serve=src.bot.serve:main",
+            "bot-serve-async=src.bot.asgi:main",
+            "bot-migrate=src.bot.migrations:main",
+            "bot-export=src.bot.export:main",
+            "bot-rollup=src.bot.rollups:main",
+            "bot-outbox=src.bot.outbox:main",
+        ],
+    },
 )
\ No newline at end of file
@@ -1,26 +1,157 @@
-import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
 import ssl
 import sys
+import time
+import atexit
+import threading
 from src.bot.exception import CustomException
 from src.bot.logger import logging
+from src.bot.config import settings
 from src.bot.database import get_smtp_credentials
+from src.bot.metrics import phase, Gauge
 
-def configure():
-    load_dotenv()
+_ssl_context = None
 
-configure()
-host = os.getenv("database_host_name")
-user = os.getenv("database_user_name")
-password = os.getenv("database_user_password")
-database = os.getenv("database_name")
 
+def get_ssl_context():
+    # building the default context loads the CA bundle from disk, so do it once
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
 
 
-def send_email(sender_email, receiver_emails, cc_email, subject, message, from_name="Chatbot_Datanetiix"):
+class SMTPSession:
+    """
+    Keeps one authenticated SMTP connection open across send_email calls.
+
+    A connection idle for more than `noop_after` seconds is checked with NOOP
+    before reuse, one idle past `max_idle` is dropped without asking, and a send
+    that fails because the server hung up is retried once on a fresh connection.
+    """
+
+    def __init__(self, noop_after=30, max_idle=240, max_messages=100):
+        self.noop_after = noop_after
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._server = None
+        self._key = None
+        self._last_used = 0.0
+        self._sent_on_connection = 0
+        self._stats = {"handshakes": 0, "messages_sent": 0, "noop_checks": 0, "reconnects": 0, "send_failures": 0}
+
+    def _open(self, smtp_credentials):
+        if settings.smtp.debug_server:
+            debug_host, _, debug_port = settings.smtp.debug_server.partition(":")
+            with phase("smtp_connect"):
+                server = smtplib.SMTP(debug_host, int(debug_port or 25))
+        else:
+            with phase("smtp_connect"):
+                server = smtplib.SMTP(smtp_credentials['smtp_server'], smtp_credentials['smtp_port'])
+                server.starttls(context=get_ssl_context())
+            with phase("smtp_login"):
+                server.login(smtp_credentials['smtp_username'], smtp_credentials['smtp_password'])
+        self._stats["handshakes"] += 1
+        self._sent_on_connection = 0
+        logging.info("SMTP connection opened")
+        return server
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            logging.info("Closing the SMTP connection")
+        self._server = None
+        self._key = None
+
+    def _is_usable(self, key):
+        if self._server is None or key != self._key:
+            return False
+        if self._sent_on_connection >= self.max_messages:
+            return False
+        idle = time.monotonic() - self._last_used
+        if idle > self.max_idle:
+            return False
+        if idle > self.noop_after:
+            self._stats["noop_checks"] += 1
+            try:
+                return self._server.noop()[0] == 250
+            except Exception:
+                return False
+        return True
+
+    def send(self, smtp_credentials, sender_email, recipients, message):
+        # the key changes when the SMTP config is edited, which forces a new login
+        key = (settings.smtp.debug_server, smtp_credentials.get('smtp_server'), smtp_credentials.get('smtp_port'), smtp_credentials.get('smtp_username'))
+        with self._lock:
+            for attempt in (1, 2):
+                if not self._is_usable(key):
+                    self._close()
+                    self._server = self._open(smtp_credentials)
+                    self._key = key
+                try:
+                    with phase("smtp_send"):
+                        self._server.sendmail(sender_email, recipients, message)
+                except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException, OSError) as e:
+                    self._stats["send_failures"] += 1
+                    dropped = not isinstance(e, smtplib.SMTPResponseException) or e.smtp_code == 421
+                    if not dropped:
+                        raise
+                    # the message was not accepted, so one retry on a new connection cannot duplicate it
+                    self._close()
+                    if attempt == 2:
+                        raise
+                    self._stats["reconnects"] += 1
+                    logging.warning(f"SMTP send failed, reconnecting: {e}")
+                    continue
+                self._last_used = time.monotonic()
+                self._sent_on_connection += 1
+                self._stats["messages_sent"] += 1
+                return
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def reset(self):
+        # after fork the inherited connection belongs to the parent; drop it without QUIT
+        self._lock = threading.Lock()
+        self._server = None
+        self._key = None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, connected=self._server is not None)
+
+
+smtp_session = SMTPSession(
+    noop_after=settings.smtp.noop_after,
+    max_idle=settings.smtp.max_idle,
+    max_messages=settings.smtp.max_messages_per_connection,
+)
+atexit.register(smtp_session.close)
+
+
+def get_smtp_stats():
+    return smtp_session.stats()
+
+
+Gauge(
+    "bot_smtp_events_total",
+    "SMTP logins, messages sent on the shared connection, NOOP checks, reconnects and failed sends",
+    ("event",),
+    lambda: [((event,), get_smtp_stats()[event]) for event in ("handshakes", "messages_sent", "noop_checks", "reconnects", "send_failures")],
+    kind="counter",
+)
+Gauge("bot_smtp_connected", "1 while the shared SMTP connection is open", (), lambda: [((), int(get_smtp_stats()["connected"]))])
+
+
+def build_email(sender_email, receiver_emails, cc_email, subject, message, from_name="Chatbot_Datanetiix"):
     # Ensure receiver_emails is treated as a list
     if isinstance(receiver_emails, str):
         receiver_emails = [receiver_emails]
@@ -38,38 +169,138 @@ def send_email(sender_email, receiver_emails, cc_email, subject, message, from_n
 
     # Add the message body
     msg.attach(MIMEText(message, "plain"))
+    return msg, receiver_emails + cc_email
 
-    try:
-        smtp_credentials = get_smtp_credentials(host, user, password, database)
-        logging.info(f"SMTP credentials fetched: {smtp_credentials}")
-
-        # Debugging: Print receiver_emails and cc_email
-        logging.info(f"Receiver Emails (Processed): {receiver_emails}")
-        logging.info(f"CC Emails (Processed): {cc_email}")
 
-        # Create a secure SSL context
-        context = ssl.create_default_context()
+def send_email(sender_email, receiver_emails, cc_email, subject, message, from_name="Chatbot_Datanetiix"):
+    msg, all_recipients = build_email(sender_email, receiver_emails, cc_email, subject, message, from_name)
 
-        # Create a secure connection with the SMTP server
-        server = smtplib.SMTP(smtp_credentials['smtp_server'], smtp_credentials['smtp_port'])
-        server.starttls(context=context)
-        server.login(smtp_credentials['smtp_username'], smtp_credentials['smtp_password'])
+    try:
+        smtp_credentials = get_smtp_credentials()
+        logging.info(f"SMTP credentials fetched for {smtp_credentials['smtp_username']} at {smtp_credentials['smtp_server']}")
 
-        # Send the email
-        all_recipients = receiver_emails + cc_email
+        # Send the email over the shared, already authenticated connection
         logging.info(f"Sending email to: {all_recipients}")
 
-        server.sendmail(sender_email, all_recipients, msg.as_string())
+        smtp_session.send(smtp_credentials, sender_email, all_recipients, msg.as_string())
         logging.info("Email sent successfully!")
     except Exception as e:
         logging.error(f"An error occurred while sending the email: {str(e)}")
         raise CustomException(e, sys)
+
+
+async def open_async_smtp(smtp_credentials):
+    # aiosmtplib is only needed by the asyncio serving mode (src/bot/asgi.py)
+    import aiosmtplib
+
+    if settings.smtp.debug_server:
+        debug_host, _, debug_port = settings.smtp.debug_server.partition(":")
+        client = aiosmtplib.SMTP(hostname=debug_host, port=int(debug_port or 25), start_tls=False)
+        with phase("smtp_connect"):
+            await client.connect()
+        return client
+
+    client = aiosmtplib.SMTP(
+        hostname=smtp_credentials['smtp_server'],
+        port=int(smtp_credentials['smtp_port']),
+        start_tls=True,
+        tls_context=get_ssl_context(),
+    )
+    with phase("smtp_connect"):
+        await client.connect()
+    with phase("smtp_login"):
+        await client.login(smtp_credentials['smtp_username'], smtp_credentials['smtp_password'])
+    return client
+
+
+async def send_emails_async(smtp_credentials, emails):
+    """
+    Sends (sender_email, receiver_emails, cc_email, subject, message) tuples over
+    one async SMTP connection. Returns one exception or None per email, in order,
+    so a rejected message does not stop the rest of the batch.
+    """
+    results = []
+    client = await open_async_smtp(smtp_credentials)
+    try:
+        for sender_email, receiver_emails, cc_email, subject, message in emails:
+            msg, all_recipients = build_email(sender_email, receiver_emails, cc_email, subject, message)
+            try:
+                with phase("smtp_send"):
+                    await client.sendmail(sender_email, all_recipients, msg.as_string())
+                results.append(None)
+            except Exception as e:
+                logging.error(f"An error occurred while sending the email: {str(e)}")
+                results.append(e)
     finally:
-        # Close the SMTP connection
-        logging.info("Closing the SMTP connection")
-        server.quit()
+        try:
+            await client.quit()
+        except Exception:
+            pass
+    return results
+
+
+def prospect_email_message(prospect_conversation):
+    return (
+        f"Hi, new user logged in our chatbot, Find the below details for your reference:\n\n"
+        f"New client details:\n\n"
+        f"Date: {prospect_conversation.date}\n"
+        f"Time: {prospect_conversation.time}\n"
+        f"IP: {prospect_conversation.ip_address}\n"
+        f"Name: {prospect_conversation.name}\n"
+        f"Email: {prospect_conversation.email}\n"
+        f"Contact: {prospect_conversation.contact}\n"
+        f"Company: {prospect_conversation.company}\n"
+        f"Industries: {prospect_conversation.industries_choosen}\n"
+        f"Verticals: {prospect_conversation.verticals_choosen}\n"
+        f"Requirements: {prospect_conversation.requirement}\n"
+        f"Known Source: {prospect_conversation.known_source}\n"
+        f"Rating: {prospect_conversation.rating}\n"
+        f"Feedback: {prospect_conversation.feedback}"
+    )
+
+
+def existing_client_email_message(existing_client_conversation):
+    return (
+        f"Hi, one of our client logged in our chatbot, Find the below details for your reference:\n\n"
+        f"Client details:\n\n"
+        f"Date: {existing_client_conversation.date}\n"
+        f"Time: {existing_client_conversation.time}\n"
+        f"IP: {existing_client_conversation.ip_address}\n"
+        f"Name: {existing_client_conversation.name}\n"
+        f"Email: {existing_client_conversation.email}\n"
+        f"Contact: {existing_client_conversation.contact}\n"
+        f"Company: {existing_client_conversation.company}\n"
+        f"Verticals: {existing_client_conversation.verticals_choosen}\n"
+        f"Contact Team: {existing_client_conversation.issue_escalation}\n"
+        f"Issue Urgency: {existing_client_conversation.issue_type}\n"
+        f"Issue description: {existing_client_conversation.issue_text}\n"
+        f"Rating: {existing_client_conversation.rating}\n"
+        f"Feedback: {existing_client_conversation.feedback}"
+    )
+
+
+def job_seeker_email_message(job_seeker_conversation):
+    return (
+        f"Hi, New job seeker logged in our chatbot, Find the below details for your reference:\n\n"
+        f"Job Seeker details:\n\n"
+        f"Date: {job_seeker_conversation.date}\n"
+        f"Time: {job_seeker_conversation.time}\n"
+        f"IP: {job_seeker_conversation.ip_address}\n"
+        f"Name: {job_seeker_conversation.name}\n"
+        f"Email: {job_seeker_conversation.email}\n"
+        f"Contact: {job_seeker_conversation.contact}\n"
+        f"Company: {job_seeker_conversation.company}\n"
+        f"Category: {job_seeker_conversation.category}\n"
+        f"Verticals: {job_seeker_conversation.verticals_choosen}\n"
+        f"Interview mode: {job_seeker_conversation.interview_mode}\n"
+        f"Time availability: {job_seeker_conversation.time_available}\n"
+        f"Notice period: {job_seeker_conversation.notice_period}\n"
+        f"Linkedin URL: {job_seeker_conversation.linkedin_url}\n"
+        f"Rating: {job_seeker_conversation.rating}\n"
+        f"Feedback: {job_seeker_conversation.feedback}"
+    )
 
 
 if __name__=="__main__":
-    smtp_credentials = get_smtp_credentials(host, user, password, database)
+    smtp_credentials = get_smtp_credentials()
     send_email(smtp_credentials['sender_email'], smtp_credentials['prospect_receiver_emails'], smtp_credentials['cc_email'], smtp_credentials['prospect_email_subject'], message='test', from_name="Chatbot_Datanetiix")
\ No newline at end of file
@@ -0,0 +1,253 @@
+"""
+Optional asyncio serving mode.
+
+Serves the same routes as app.py from a Quart app. The handlers are the
+async twins in src/bot/flow.py: aiomysql for MySQL, httpx for the greeting
+lookups, aiosmtplib for the in-process outbox worker. Validation, option
+catalogs, email text, caches and the write-behind buffer are shared with
+the sync app, so both modes answer identically. A request waiting on I/O
+holds a coroutine instead of a thread, so one process can keep thousands
+of idle conversations open.
+
+    pip install quart quart-cors aiomysql httpx aiosmtplib hypercorn
+    bot-serve-async                       # or: python -m src.bot.asgi
+    hypercorn src.bot.asgi:app --bind 0.0.0.0:8000 --workers 2
+
+bot-serve-async listens on server_bind (default 0.0.0.0:8000) with
+server_workers processes (default 1). The sync app (app.py / bot-serve) is
+unchanged and remains the default. As with bot-serve,
+conversation_write_mode=buffered is refused with more than one worker.
+"""
+import sys
+import time
+import asyncio
+from quart import Quart, request, jsonify, g, Response
+from quart_cors import cors
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings, check_write_mode
+from src.bot.database import create_tables, create_database, close_async_pools
+from src.bot.flow import (
+    PERSONAS,
+    choose_client,
+    handle_details_async,
+    handle_step_async,
+    handle_feedback_async,
+    handle_batch_async,
+)
+from src.bot.validation import rejection
+from src.bot.metrics import render, observe_request, route_of, CONTENT_TYPE
+from src.bot.tracing import begin, finish, end, REQUEST_ID_HEADER
+from src.bot.export import prepare_export, export_stream, response_headers
+from src.bot.rollups import prepare_report, rollup_report
+from src.bot.conversation_buffer import conversation_buffer
+from src.bot.outbox import run_worker_async
+from src.bot.greet import build_greeting_async, close_async_http
+from src.bot.utils import get_client_ip
+
+workers = settings.server.workers or 1
+
+
+def internal_error(e):
+    logging.error(f"Error in processing request: {e}")
+    return jsonify({"message": "Internal server error.", "status": "error", "error": str(e)}), 500
+
+
+# this api is responsible for creating a database
+async def create_database_api():
+    try:
+        data = await request.get_json()
+        result = await asyncio.to_thread(create_database, data.get('host'), data.get('user'), data.get('password'))
+        return jsonify(result, {"status": "success", "message": "DB created successfully"})
+    except Exception as e:
+        logging.error(f"Error in processing request: {e}")
+        return jsonify({"status": "error", "message": "Internal Server Error", "error": str(e)}), 500
+
+
+# the below API is responsible for create tables
+async def create_tables_api():
+    try:
+        data = await request.get_json()
+        result = await asyncio.to_thread(
+            create_tables, data.get('host'), data.get('user'), data.get('password'), data.get('database')
+        )
+        return jsonify(result, {"status": "success", "message": "Tables created successfully"})
+    except Exception as e:
+        logging.error(f"Error in processing request: {e}")
+        return jsonify({"status": "error", "message": "Internal Server Error", "error": str(e)}), 500
+
+
+# this API responsible for greeting the user
+async def get_greeting():
+    try:
+        message = await build_greeting_async(get_client_ip(request))
+        logging.info(f"weather greet given to user - {message}")
+        return jsonify({"status": "success", "message": message})
+    except Exception as e:
+        logging.error(f"Error in processing request: {e}")
+        return jsonify({"status": "error", "message": "Internal Server Error", "error": str(e)}), 500
+
+
+# this API is responsible for choosing client type
+async def client():
+    try:
+        body, status = choose_client(await request.get_json())
+        return jsonify(body), status
+    except Exception as e:
+        return internal_error(e)
+
+
+def persona_view(handler, persona, step=None):
+    async def view():
+        try:
+            data = await request.get_json()
+            if step is None:
+                body, status = await handler(persona, data)
+            else:
+                body, status = await handler(persona, step, data)
+            return jsonify(body), status
+        except Exception as e:
+            return internal_error(e)
+    return view
+
+
+async def validate_request():
+    rejected = rejection(request.endpoint, request.method, await request.get_json(silent=True))
+    if rejected is not None:
+        body, status = rejected
+        return jsonify(body), status
+    return None
+
+
+async def begin_request():
+    g.metrics_started = time.perf_counter()
+    g.trace = begin(request.headers.get(REQUEST_ID_HEADER))
+
+
+async def finish_request(response):
+    route = route_of(request)
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    trace = g.get("trace")
+    if trace is not None:
+        response.headers.update(finish(trace, route, request.method, response.status_code))
+    return response
+
+
+async def end_request(exception=None):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        end(trace)
+
+
+# this API is responsible for streaming lead exports to sales
+async def export_api(persona_name):
+    export, rejection = prepare_export(persona_name, request.headers.get("Authorization"), request.args)
+    if rejection is not None:
+        body, status = rejection
+        return jsonify(body), status
+    logging.info(f"{persona_name} export started - {export['start']} to {export['end']} as {export['fmt']}")
+    # the pages are read with the sync pool, one chunk at a time off the event loop
+    chunks = export_stream(**export)
+
+    async def stream():
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    mimetype, headers = response_headers(export)
+    return Response(stream(), mimetype=mimetype, headers=headers)
+
+
+# this API is responsible for serving the dashboard numbers
+async def rollups_api(persona_name):
+    try:
+        report, rejection = prepare_report(persona_name, request.headers.get("Authorization"), request.args)
+        if rejection is not None:
+            body, status = rejection
+            return jsonify(body), status
+        return jsonify(await asyncio.to_thread(rollup_report, **report)), 200
+    except Exception as e:
+        return internal_error(e)
+
+
+async def metrics_view():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+def register_routes(app):
+    app.add_url_rule('/create_database', "create_database_api", create_database_api, methods=['POST'])
+    app.add_url_rule('/create_tables', "create_tables_api", create_tables_api, methods=['POST'])
+    app.add_url_rule("/chatbot/greeting", "get_greeting", get_greeting, methods=["GET"])
+    app.add_url_rule("/chatbot/client", "client", client, methods=["POST"])
+    app.add_url_rule("/export/<persona_name>", "export", export_api, methods=["GET"])
+    app.add_url_rule("/rollups/<persona_name>", "rollups", rollups_api, methods=["GET"])
+
+    for persona in PERSONAS.values():
+        app.add_url_rule(persona.details_url, persona.details_endpoint, persona_view(handle_details_async, persona), methods=["POST"])
+        for step in persona.steps.values():
+            app.add_url_rule(step.url, step.endpoint, persona_view(handle_step_async, persona, step), methods=["POST"])
+        app.add_url_rule(persona.feedback_url, persona.feedback_endpoint, persona_view(handle_feedback_async, persona), methods=["POST"])
+        app.add_url_rule(persona.batch_url, persona.batch_endpoint, persona_view(handle_batch_async, persona), methods=["POST"])
+
+
+def create_async_app(start_outbox_worker=None):
+    app = cors(Quart(__name__))
+    app.before_request(begin_request)
+    app.after_request(finish_request)
+    app.teardown_request(end_request)
+    app.before_request(validate_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
+    register_routes(app)
+
+    if start_outbox_worker is None:
+        start_outbox_worker = settings.outbox.worker_in_process
+    background = {}
+
+    @app.before_serving
+    async def startup():
+        if start_outbox_worker:
+            background["stop"] = asyncio.Event()
+            background["outbox"] = asyncio.ensure_future(run_worker_async(background["stop"]))
+
+    @app.after_serving
+    async def shutdown():
+        if "outbox" in background:
+            background["stop"].set()
+            await background["outbox"]
+        await asyncio.to_thread(conversation_buffer.flush_all)
+        await close_async_http()
+        await close_async_pools()
+
+    return app
+
+
+app = create_async_app()
+
+
+def main():
+    try:
+        from hypercorn.config import Config
+        from hypercorn.run import run
+    except ImportError as e:
+        logging.error("hypercorn is not installed, run `pip install hypercorn`")
+        raise CustomException(e, sys)
+    try:
+        check_write_mode(workers)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+    config = Config()
+    config.application_path = "src.bot.asgi:app"
+    config.bind = [settings.server.bind]
+    config.workers = workers
+    logging.info(f"starting hypercorn on {settings.server.bind} with {workers} workers")
+    run(config)
+
+
+if __name__ == "__main__":
+    main()
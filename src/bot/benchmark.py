@@ -0,0 +1,156 @@
+"""
+Throughput benchmark for the chatbot HTTP server.
+
+Fires a fixed number of requests at one or more running servers from a pool
+of keep-alive clients and prints requests/second and latency percentiles
+for each, so the development server and the production server can be
+compared on the same machine.
+
+Comparing the two (run each server on its own, same host, same .env):
+
+    # 1. development server (app.py), port 8000
+    python app.py
+    python -m src.bot.benchmark --url dev=http://127.0.0.1:8000
+
+    # 2. production server, e.g. 4 workers x 4 threads on port 8001
+    server_bind=127.0.0.1:8001 server_workers=4 server_threads=4 bot-serve
+    python -m src.bot.benchmark --url prod=http://127.0.0.1:8001
+
+    # or both at once if they are running side by side
+    python -m src.bot.benchmark --url dev=http://127.0.0.1:8000 --url prod=http://127.0.0.1:8001
+
+The default request is POST /chatbot/client, which touches neither MySQL nor
+any outside API, so the result is the server's own overhead. Use --path and
+--body to measure other routes. Run the load generator on a different core
+or host than the server when possible, and report the machine, worker/thread
+settings and --concurrency along with the numbers.
+
+Measured on a 1-CPU Linux sandbox, Python 3.11, Flask 3.1, gunicorn 26,
+with the load generator on the same core as the servers, one server
+benchmarked at a time, alternating dev and prod three times:
+
+    log_dir=/tmp/benchlogs python app.py
+    log_dir=/tmp/benchlogs server_bind=127.0.0.1:8001 server_workers=3 server_threads=4 python -m src.bot.serve
+    python -m src.bot.benchmark --url dev=http://127.0.0.1:8000 --requests 3000 --concurrency 32 --warmup 100
+    python -m src.bot.benchmark --url prod=http://127.0.0.1:8001 --requests 3000 --concurrency 32 --warmup 100
+
+    concurrency  server                       req/s          p50 ms        p99 ms
+    32           dev  (python app.py)         274.1 - 285.0  42.5 - 105.9  151.3 - 298.9
+    32           prod (bot-serve, 3w x 4t)    339.7 - 345.9  61.6 -  82.4  205.1 - 252.2
+    8            dev  (python app.py)         297.0 - 359.2  21.0 -  26.1   46.0 -  53.7
+    8            prod (bot-serve, 3w x 4t)    335.3 - 344.3  22.0 -  22.6   45.8 -  48.1
+
+No request failed. Requests/second is the stable figure: it moved by a few
+percent between runs. At concurrency 32 the medians are not: 32 client
+threads and the server share one core, so p50 mostly measures how the
+scheduler interleaves them and swung 2x between identical dev runs. Compare
+servers on throughput here, and rerun on a multi-core host, with the client
+elsewhere, before sizing server_workers.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+
+DEFAULT_PATH = "/chatbot/client"
+DEFAULT_BODY = '{"client_type": "1"}'
+
+_local = threading.local()
+
+
+def _session():
+    # one keep-alive connection per client thread
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _one_request(method, url, body, timeout):
+    started = time.perf_counter()
+    try:
+        response = _session().request(method, url, json=body, timeout=timeout)
+        ok = response.status_code < 500
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_benchmark(base_url, path=DEFAULT_PATH, method="POST", body=None, total=2000, concurrency=32, warmup=100, timeout=10):
+    try:
+        url = base_url.rstrip("/") + path
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: _one_request(method, url, body, timeout), range(warmup)))
+
+            started = time.perf_counter()
+            results = list(executor.map(lambda _: _one_request(method, url, body, timeout), range(total)))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        return {
+            "requests": total,
+            "concurrency": concurrency,
+            "errors": errors,
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+def parse_target(target):
+    # "name=url" split on the first "=", the URL itself may carry a query string; a bare URL has no name
+    name, _, base_url = target.partition("=")
+    if not base_url or "://" in name:
+        return "", target
+    return name, base_url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare chatbot server throughput")
+    parser.add_argument("--url", action="append", required=True, help="name=base_url of a running server, repeatable")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--body", default=DEFAULT_BODY, help="JSON body, empty for none")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    body = json.loads(args.body) if args.body else None
+    print(f"{'server':<10} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for target in args.url:
+        name, base_url = parse_target(target)
+        result = run_benchmark(
+            base_url,
+            path=args.path,
+            method=args.method,
+            body=body,
+            total=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+        )
+        print(
+            f"{name or base_url:<10} {result['requests_per_second']:>10} {result['p50_ms']:>9} "
+            f"{result['p95_ms']:>9} {result['p99_ms']:>9} {result['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""
+Settings for the whole app, read once from the environment and .env.
+
+    from src.bot.config import settings
+    settings.database.host, settings.greeting.http_timeout, settings.outbox.batch_size, ...
+
+load_settings() parses and checks every value and raises ConfigError listing
+all the bad ones at once, so a typo in .env stops startup instead of
+surfacing on some later request. The result is frozen: code reads settings,
+never os.getenv, and nothing re-reads .env on the request path.
+
+The environment variable names are the ones the app has always used
+(database_host_name, db_pool_size, greeting_deadline, ...). Variables already
+set in the environment win over .env.
+"""
+import os
+import ipaddress
+import multiprocessing
+from dataclasses import dataclass
+from typing import Optional
+from dotenv import load_dotenv
+
+
+class ConfigError(ValueError):
+    pass
+
+
+LOG_LEVELS = ("debug", "info", "warning", "error", "critical")
+# TimedRotatingFileHandler's `when` units
+ROTATE_WHEN = ("s", "m", "h", "d", "midnight", "w0", "w1", "w2", "w3", "w4", "w5", "w6")
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    host: Optional[str]
+    user: Optional[str]
+    password: Optional[str]
+    name: Optional[str]
+    pool_size: int
+    pool_max_overflow: int
+    pool_timeout: float
+    pool_recycle: float
+    port: int = 3306
+    # read replicas as (host, port) pairs, same user, password and database as the primary
+    replicas: tuple = ()
+    replica_max_lag: float = 5.0
+    replica_lag_check_interval: float = 2.0
+    replica_check_lag: bool = True  # false for stand-ins that are not real replicas
+
+
+@dataclass(frozen=True)
+class SmtpSettings:
+    # "host:port" of a local SMTP stand-in (e.g. `python -m aiosmtpd -n -l localhost:1025`);
+    # when set, mail goes there in plain text without STARTTLS or login
+    debug_server: Optional[str]
+    noop_after: float
+    max_idle: float
+    max_messages_per_connection: int
+    credentials_ttl: float
+
+
+@dataclass(frozen=True)
+class GreetingSettings:
+    weather_api_key: Optional[str]
+    http_timeout: float
+    deadline: float
+    workers: int
+    location_cache_size: int
+    location_cache_ttl: float
+    location_cache_stale: float
+    weather_cache_size: int
+    weather_cache_ttl: float
+    weather_cache_stale: float
+    # "ipapi" asks ipapi.co over HTTPS; "local" resolves from the index built by `python -m src.bot.geoip build`
+    geoip_resolver: str
+    geoip_index_path: str
+
+
+@dataclass(frozen=True)
+class BufferSettings:
+    write_mode: str  # "write_through" or "buffered"
+    idle_timeout: float
+    max_conversations: int
+    flush_interval: float
+
+
+@dataclass(frozen=True)
+class OutboxSettings:
+    worker_in_process: bool
+    max_attempts: int
+    backoff_base: float
+    backoff_max: float
+    batch_size: int
+    poll_interval: float
+    lease_seconds: int
+    depth_cache_seconds: float
+
+
+@dataclass(frozen=True)
+class ServerSettings:
+    bind: str
+    workers: Optional[int]  # None: the entry point's own default
+    threads: int
+    worker_class: str
+    backlog: int
+    keepalive: int
+    timeout: int
+    graceful_timeout: int
+    max_requests: int
+    max_requests_jitter: int
+    preload: bool
+    access_log: Optional[str]
+    trusted_proxies: tuple  # networks allowed to set X-Forwarded-For
+
+
+@dataclass(frozen=True)
+class LogSettings:
+    dir: str
+    file: str
+    level: str
+    levels: str
+    format: str
+    queue_size: int
+    rate_limit: int
+    rate_window: float
+    max_bytes: int
+    rotate_when: str
+    rotate_interval: int
+    compress: bool
+    retention_days: float
+    max_archives: int
+
+
+@dataclass(frozen=True)
+class TraceSettings:
+    server_timing: bool
+    slow_ms: float
+    profile_sample_rate: float
+    profile_slow_ms: float
+    profile_dir: str
+
+
+@dataclass(frozen=True)
+class ExportSettings:
+    token: Optional[str]  # bearer token for /export/<persona> and /rollups/<persona>; unset disables both
+    page_size: int
+
+
+@dataclass(frozen=True)
+class RollupSettings:
+    settle_seconds: float  # rows younger than this are left for the next run, their conversation may still be going
+    batch_size: int
+
+
+@dataclass(frozen=True)
+class Settings:
+    database: DatabaseSettings
+    smtp: SmtpSettings
+    greeting: GreetingSettings
+    buffer: BufferSettings
+    outbox: OutboxSettings
+    server: ServerSettings
+    log: LogSettings
+    trace: TraceSettings
+    export: ExportSettings
+    rollup: RollupSettings
+
+
+class _Reader:
+    # collects every bad value instead of stopping at the first one
+    def __init__(self, environ):
+        self.environ = environ
+        self.problems = []
+
+    def text(self, name, default=None):
+        value = self.environ.get(name)
+        return default if value is None or value == "" else value
+
+    def _number(self, name, default, kind, minimum):
+        raw = self.text(name)
+        if raw is None:
+            return default
+        try:
+            value = kind(raw)
+        except ValueError:
+            self.problems.append(f"{name}={raw!r} is not a valid {kind.__name__}")
+            return default
+        if minimum is not None and value < minimum:
+            self.problems.append(f"{name}={raw!r} must be at least {minimum}")
+            return default
+        return value
+
+    def integer(self, name, default, minimum=0):
+        return self._number(name, default, int, minimum)
+
+    def decimal(self, name, default, minimum=0):
+        return self._number(name, default, float, minimum)
+
+    def flag(self, name, default):
+        raw = self.text(name)
+        if raw is None:
+            return default
+        if raw.lower() not in ("true", "false"):
+            self.problems.append(f"{name}={raw!r} must be true or false")
+            return default
+        return raw.lower() == "true"
+
+    def choice(self, name, default, choices):
+        value = self.text(name, default).lower()
+        if value not in choices:
+            self.problems.append(f"{name}={value!r} must be one of {', '.join(choices)}")
+            return default
+        return value
+
+    def levels(self, name, choices):
+        # "database=warning,greet=debug" -> "database=WARNING,greet=DEBUG", every level one of `choices`
+        levels = []
+        for item in self.text(name, "").split(","):
+            if not item.strip():
+                continue
+            module, _, level = item.partition("=")
+            if not module.strip() or level.strip().lower() not in choices:
+                self.problems.append(f"{name} has {item.strip()!r}, expected module=level with a level among {', '.join(choices)}")
+                continue
+            levels.append(f"{module.strip()}={level.strip().upper()}")
+        return ",".join(levels)
+
+    def hosts(self, name, default_port):
+        # "db-replica-1,db-replica-2:3307,[fd00::5]:3307,fd00::6" -> (("db-replica-1", 3306), ("db-replica-2", 3307), ...)
+        hosts = []
+        for item in self.text(name, "").split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if item.startswith("["):
+                # IPv6 with a port is written [address]:port
+                host, bracket, rest = item[1:].partition("]")
+                port = rest[1:]
+                valid = bracket and (rest == "" or (rest.startswith(":") and port != ""))
+            elif item.count(":") > 1:
+                host, port, valid = item, "", True  # a bare IPv6 address
+            else:
+                host, _, port = item.partition(":")
+                valid = True
+            if item.startswith("[") or ":" in host:
+                try:
+                    ipaddress.IPv6Address(host)
+                except ValueError:
+                    valid = False
+            if not valid or not host or (port and not port.isdigit()):
+                self.problems.append(f"{name} has an invalid host or port in {item!r}")
+                continue
+            hosts.append((host, int(port) if port else default_port))
+        return tuple(hosts)
+
+    def networks(self, name, default):
+        networks = []
+        for item in self.text(name, default).split(","):
+            if not item.strip():
+                continue
+            try:
+                networks.append(ipaddress.ip_network(item.strip(), strict=False))
+            except ValueError:
+                self.problems.append(f"{name} has an invalid address or CIDR block {item.strip()!r}")
+        return tuple(networks)
+
+
+def load_settings(environ=None, dotenv=True):
+    """Builds the Settings from `environ` (os.environ by default, after loading .env)."""
+    if environ is None:
+        if dotenv:
+            load_dotenv()
+        environ = os.environ
+    env = _Reader(environ)
+    logs_dir = env.text("log_dir", os.path.join(os.getcwd(), "logs"))
+    database_port = env.integer("database_port", 3306, minimum=1)
+
+    settings = Settings(
+        database=DatabaseSettings(
+            host=env.text("database_host_name"),
+            user=env.text("database_user_name"),
+            password=env.text("database_user_password"),
+            name=env.text("database_name"),
+            pool_size=env.integer("db_pool_size", 5, minimum=1),
+            pool_max_overflow=env.integer("db_pool_max_overflow", 10),
+            pool_timeout=env.decimal("db_pool_timeout", 30.0),
+            pool_recycle=env.decimal("db_pool_recycle", 3600.0),
+            port=database_port,
+            replicas=env.hosts("database_replica_hosts", database_port),
+            replica_max_lag=env.decimal("db_replica_max_lag", 5.0),
+            replica_lag_check_interval=env.decimal("db_replica_lag_check_interval", 2.0),
+            replica_check_lag=env.flag("db_replica_check_lag", True),
+        ),
+        smtp=SmtpSettings(
+            debug_server=env.text("smtp_debug_server"),
+            noop_after=env.decimal("smtp_noop_after", 30.0),
+            max_idle=env.decimal("smtp_max_idle", 240.0),
+            max_messages_per_connection=env.integer("smtp_max_messages_per_connection", 100, minimum=1),
+            credentials_ttl=env.decimal("smtp_credentials_ttl", 300.0),
+        ),
+        greeting=GreetingSettings(
+            weather_api_key=env.text("weather_api_key"),
+            http_timeout=env.decimal("greeting_http_timeout", 2.0),
+            deadline=env.decimal("greeting_deadline", 1.5),
+            workers=env.integer("greeting_workers", 8, minimum=1),
+            location_cache_size=env.integer("location_cache_size", 4096, minimum=1),
+            location_cache_ttl=env.decimal("location_cache_ttl", 86400.0),
+            location_cache_stale=env.decimal("location_cache_stale", 604800.0),
+            weather_cache_size=env.integer("weather_cache_size", 1024, minimum=1),
+            weather_cache_ttl=env.decimal("weather_cache_ttl", 900.0),
+            weather_cache_stale=env.decimal("weather_cache_stale", 3600.0),
+            geoip_resolver=env.choice("geoip_resolver", "ipapi", ("ipapi", "local")),
+            geoip_index_path=env.text("geoip_index_path", "geoip.idx"),
+        ),
+        buffer=BufferSettings(
+            write_mode=env.choice("conversation_write_mode", "write_through", ("write_through", "buffered")),
+            idle_timeout=env.decimal("conversation_buffer_idle_timeout", 300.0),
+            max_conversations=env.integer("conversation_buffer_max_conversations", 1000, minimum=1),
+            flush_interval=env.decimal("conversation_buffer_flush_interval", 30.0),
+        ),
+        outbox=OutboxSettings(
+            worker_in_process=env.flag("outbox_worker_in_process", False),
+            max_attempts=env.integer("outbox_max_attempts", 8, minimum=1),
+            backoff_base=env.decimal("outbox_backoff_base", 30.0),
+            backoff_max=env.decimal("outbox_backoff_max", 3600.0),
+            batch_size=env.integer("outbox_batch_size", 20, minimum=1),
+            poll_interval=env.decimal("outbox_poll_interval", 5.0),
+            lease_seconds=env.integer("outbox_lease_seconds", 300, minimum=1),
+            depth_cache_seconds=env.decimal("outbox_depth_cache_seconds", 15.0),
+        ),
+        server=ServerSettings(
+            bind=env.text("server_bind", "0.0.0.0:8000"),
+            workers=env.integer("server_workers", None, minimum=1),
+            threads=env.integer("server_threads", 4, minimum=1),
+            worker_class=env.text("server_worker_class", "gthread"),
+            backlog=env.integer("server_backlog", 2048, minimum=1),
+            keepalive=env.integer("server_keepalive", 5),
+            timeout=env.integer("server_timeout", 30),
+            graceful_timeout=env.integer("server_graceful_timeout", 30),
+            max_requests=env.integer("server_max_requests", 0),
+            max_requests_jitter=env.integer("server_max_requests_jitter", 0),
+            preload=env.flag("server_preload", False),
+            access_log=env.text("server_access_log"),
+            trusted_proxies=env.networks("trusted_proxies", "127.0.0.1,::1"),
+        ),
+        log=LogSettings(
+            dir=logs_dir,
+            file=env.text("log_file", "bot-{pid}.log"),
+            level=env.choice("log_level", "info", LOG_LEVELS).upper(),
+            levels=env.levels("log_levels", LOG_LEVELS),
+            format=env.choice("log_format", "text", ("text", "json")),
+            queue_size=env.integer("log_queue_size", 10000, minimum=1),
+            rate_limit=env.integer("log_rate_limit", 50),
+            rate_window=env.decimal("log_rate_window", 10.0),
+            max_bytes=env.integer("log_max_bytes", 10 * 1024 * 1024),
+            rotate_when=env.choice("log_rotate_when", "midnight", ROTATE_WHEN),
+            rotate_interval=env.integer("log_rotate_interval", 1, minimum=1),
+            compress=env.flag("log_compress", True),
+            retention_days=env.decimal("log_retention_days", 14.0),
+            max_archives=env.integer("log_max_archives", 50),
+        ),
+        trace=TraceSettings(
+            server_timing=env.flag("trace_server_timing", True),
+            slow_ms=env.decimal("trace_slow_ms", 1000.0),
+            profile_sample_rate=env.decimal("profile_sample_rate", 0.0),
+            profile_slow_ms=env.decimal("profile_slow_ms", 500.0),
+            profile_dir=env.text("profile_dir", os.path.join(logs_dir, "profiles")),
+        ),
+        export=ExportSettings(
+            token=env.text("export_token"),
+            page_size=env.integer("export_page_size", 1000, minimum=1),
+        ),
+        rollup=RollupSettings(
+            settle_seconds=env.decimal("rollup_settle_seconds", 3600.0),
+            batch_size=env.integer("rollup_batch_size", 10000, minimum=1),
+        ),
+    )
+    if settings.trace.profile_sample_rate > 1:
+        env.problems.append("profile_sample_rate must be between 0 and 1")
+    if env.problems:
+        raise ConfigError("invalid settings: " + "; ".join(env.problems))
+    return settings
+
+
+def default_workers():
+    # gunicorn's usual 2 x CPUs + 1 when server_workers is not set
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def check_write_mode(workers):
+    # the write-behind buffer lives in one process and nothing routes a conversation
+    # back to the worker holding its answers, so buffered mode is single-worker only
+    if settings.buffer.write_mode == "buffered" and workers > 1:
+        raise ConfigError(
+            f"conversation_write_mode=buffered needs server_workers=1, got {workers} workers; "
+            "scale with server_threads or use write_through"
+        )
+
+
+settings = load_settings()
@@ -0,0 +1,264 @@
+"""
+Write-behind buffer for chatbot step answers.
+
+With conversation_write_mode=write_through (the default) every step is an
+UPDATE + COMMIT as soon as it arrives, so nothing is lost if the process dies.
+
+With conversation_write_mode=buffered the answers are kept in memory keyed
+by (table, row_id) and written in one multi-column UPDATE when the
+conversation reaches its feedback step, when it has been idle for
+conversation_buffer_idle_timeout seconds, or when more than
+conversation_buffer_max_conversations are held (oldest first). Answers still
+buffered when the process is killed are lost. The buffer is per process and
+no server here routes a conversation back to the worker holding its answers,
+so bot-serve and bot-serve-async refuse buffered mode unless server_workers=1
+(see check_write_mode in src/bot/config.py). Threads within that worker share it.
+"""
+import sys
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.metrics import Gauge
+from src.bot.database import get_request_connection, create_cursor_object, pooled_connection, async_pooled_connection
+
+WRITE_THROUGH = "write_through"
+BUFFERED = "buffered"
+
+write_mode = settings.buffer.write_mode
+
+
+def update_statement(table, key_column, row_id, values):
+    # table and column names come from the handlers, never from the request body
+    assignments = ", ".join(f"{column} = %s" for column in values)
+    return f"UPDATE {table} SET {assignments} WHERE {key_column} = %s", (*values.values(), row_id)
+
+
+def write_values(cursor, table, key_column, row_id, values):
+    cursor.execute(*update_statement(table, key_column, row_id, values))
+
+
+class _Conversation:
+    def __init__(self, key_column):
+        self.key_column = key_column
+        self.pending = {}  # answers not yet written
+        self.known = None  # full row as inserted by this process, if it was
+        self.touched = time.monotonic()
+
+
+class ConversationBuffer:
+    def __init__(self, max_conversations=1000, idle_timeout=300):
+        self.max_conversations = max_conversations
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (table, row_id) -> _Conversation
+        self._sweeper = None
+        self._stats = {"steps_buffered": 0, "flushes": 0, "idle_flushes": 0, "overflow_flushes": 0, "flush_errors": 0}
+
+    def _touch(self, table, key_column, row_id):
+        # caller holds the lock; returns the entry moved to the most recent end
+        key = (table, str(row_id))
+        entry = self._entries.pop(key, None) or _Conversation(key_column)
+        entry.touched = time.monotonic()
+        self._entries[key] = entry
+        return entry
+
+    def _evict_overflow(self):
+        # caller holds the lock
+        overflow = []
+        while len(self._entries) > self.max_conversations:
+            overflow.append(self._entries.popitem(last=False))
+            self._stats["overflow_flushes"] += 1
+        return overflow
+
+    def record_insert(self, table, key_column, row_id, values):
+        with self._lock:
+            entry = self._touch(table, key_column, row_id)
+            entry.known = dict(values, **{key_column: row_id})
+            overflow = self._evict_overflow()
+        self._start_sweeper()
+        self._flush_entries(overflow)
+
+    def record(self, table, key_column, row_id, column, value):
+        with self._lock:
+            entry = self._touch(table, key_column, row_id)
+            entry.pending[column] = value
+            self._stats["steps_buffered"] += 1
+            overflow = self._evict_overflow()
+        self._start_sweeper()
+        self._flush_entries(overflow)
+
+    def pop(self, table, row_id):
+        # returns (answers still to write, full in-memory row or None)
+        with self._lock:
+            entry = self._entries.pop((table, str(row_id)), None)
+        if entry is None:
+            return {}, None
+        return dict(entry.pending), entry.known
+
+    def restore(self, table, key_column, row_id, values, known=None):
+        # a failed write goes back in without clobbering newer answers
+        if not values and known is None:
+            return
+        with self._lock:
+            entry = self._touch(table, key_column, row_id)
+            entry.pending = dict(values, **entry.pending)
+            if entry.known is None:
+                entry.known = known
+
+    def _write_behind(self, table, key_column, row_id, values):
+        try:
+            with pooled_connection() as mydb:
+                cursor = create_cursor_object(mydb)
+                write_values(cursor, table, key_column, row_id, values)
+                mydb.commit()
+                cursor.close()
+            with self._lock:
+                self._stats["flushes"] += 1
+        except Exception as e:
+            logging.error(f"write-behind flush failed for {table} {row_id}: {e}")
+            with self._lock:
+                self._stats["flush_errors"] += 1
+            self.restore(table, key_column, row_id, values)
+
+    def _flush_entries(self, entries):
+        for (table, row_id), entry in entries:
+            if entry.pending:
+                self._write_behind(table, entry.key_column, row_id, entry.pending)
+
+    def flush_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [(key, entry) for key, entry in self._entries.items() if entry.touched < cutoff]
+            for key, _ in idle:
+                del self._entries[key]
+            self._stats["idle_flushes"] += len(idle)
+        self._flush_entries(idle)
+        return len(idle)
+
+    def flush_all(self):
+        with self._lock:
+            pending = list(self._entries.items())
+            self._entries.clear()
+        self._flush_entries(pending)
+
+    def _start_sweeper(self):
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="conversation-buffer", daemon=True)
+                self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(settings.buffer.flush_interval)
+            try:
+                self.flush_idle()
+            except Exception as e:
+                logging.error(f"write-behind sweep failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, conversations=len(self._entries), mode=write_mode)
+
+
+conversation_buffer = ConversationBuffer(
+    max_conversations=settings.buffer.max_conversations, idle_timeout=settings.buffer.idle_timeout
+)
+atexit.register(conversation_buffer.flush_all)
+
+
+Gauge(
+    "bot_conversation_buffer_conversations",
+    "Conversations with answers held by the write-behind buffer",
+    (),
+    lambda: [((), get_buffer_stats()["conversations"])],
+)
+Gauge(
+    "bot_conversation_buffer_events_total",
+    "Write-behind buffer steps held, flushes by trigger and failed flushes",
+    ("event",),
+    lambda: [((event,), get_buffer_stats()[event]) for event in ("steps_buffered", "flushes", "idle_flushes", "overflow_flushes", "flush_errors")],
+    kind="counter",
+)
+
+
+def save_step(table, key_column, row_id, column, value):
+    try:
+        if write_mode == BUFFERED:
+            conversation_buffer.record(table, key_column, row_id, column, value)
+            return
+        mydb = get_request_connection()
+        cursor = create_cursor_object(mydb)
+        write_values(cursor, table, key_column, row_id, {column: value})
+        mydb.commit()
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+async def save_step_async(table, key_column, row_id, column, value):
+    try:
+        if write_mode == BUFFERED:
+            conversation_buffer.record(table, key_column, row_id, column, value)
+            return
+        async with async_pooled_connection() as mydb:
+            async with mydb.cursor() as cursor:
+                await cursor.execute(*update_statement(table, key_column, row_id, {column: value}))
+            await mydb.commit()
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+def remember_conversation(table, key_column, row_id, values):
+    # in buffered mode the inserted row is kept so the feedback email can be built from memory
+    if write_mode == BUFFERED:
+        conversation_buffer.record_insert(table, key_column, row_id, values)
+
+
+@contextmanager
+def flush_conversation(cursor, table, key_column, row_id, final_values):
+    """
+    Writes every buffered answer plus `final_values` in one UPDATE and yields
+    the whole row as a column -> value dict when this process holds all of it
+    in memory, otherwise None. The caller commits inside the block; if the
+    block raises before that, the buffered answers go back into the buffer.
+
+        with flush_conversation(cursor, table, key_column, row_id, {"FEEDBACK": text}) as in_memory:
+            ...
+            mydb.commit()
+    """
+    buffered, known = conversation_buffer.pop(table, row_id)
+    values = dict(buffered, **final_values)
+    try:
+        write_values(cursor, table, key_column, row_id, values)
+        yield None if known is None else dict(known, **values)
+    except Exception as e:
+        # nothing was committed, keep the answers for the next flush
+        conversation_buffer.restore(table, key_column, row_id, buffered, known)
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+@asynccontextmanager
+async def flush_conversation_async(cursor, table, key_column, row_id, final_values):
+    # same as flush_conversation on an aiomysql cursor
+    buffered, known = conversation_buffer.pop(table, row_id)
+    values = dict(buffered, **final_values)
+    try:
+        await cursor.execute(*update_statement(table, key_column, row_id, values))
+        yield None if known is None else dict(known, **values)
+    except Exception as e:
+        conversation_buffer.restore(table, key_column, row_id, buffered, known)
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+def get_buffer_stats():
+    return conversation_buffer.stats()
@@ -1,20 +1,528 @@
 import mysql.connector as conn
 import sys
-import os
-from dotenv import load_dotenv
+import asyncio
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass, replace
+from flask import g
 from src.bot.exception import CustomException
 from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.metrics import phase, Gauge, Counter
+
+
+class PoolExhaustedError(Exception):
+    pass
+
+
+class InstrumentedCursor:
+    # times every statement into bot_phase_seconds{phase="db_query"}
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        with phase("db_query"):
+            return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with phase("db_query"):
+            return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    # pooled connections are wrapped once when opened, so every caller's commits and queries are timed
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        with phase("db_commit"):
+            self._connection.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of MySQL connections.
+
+    Up to `size` idle connections are kept open between requests. When all of
+    them are checked out, up to `max_overflow` extra connections are opened and
+    closed again once returned. Past that, callers wait up to `timeout` seconds
+    before PoolExhaustedError is raised.
+    """
+
+    def __init__(self, host, user, password, database, size=5, max_overflow=10, timeout=30, recycle=3600, port=3306):
+        self.connect_args = {"host": host, "port": port, "user": user, "password": password, "database": database}
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = []  # (connection, last_returned) pairs, most recent last
+        self._open = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "returns": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "exhausted": 0,
+            "created": 0,
+            "discarded": 0,
+            "peak_in_use": 0,
+        }
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        wait_started = None
+        mydb = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    mydb, last_returned = self._idle.pop()
+                    break
+                if self._open < self.size + self.max_overflow:
+                    self._open += 1
+                    break
+                if wait_started is None:
+                    wait_started = time.monotonic()
+                    self._stats["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["exhausted"] += 1
+                    self._stats["wait_seconds"] += time.monotonic() - wait_started
+                    raise PoolExhaustedError(
+                        f"No MySQL connection available after {self.timeout}s "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+                self._cond.wait(remaining)
+
+            if wait_started is not None:
+                self._stats["wait_seconds"] += time.monotonic() - wait_started
+            self._stats["checkouts"] += 1
+            self._in_use += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+
+        try:
+            if mydb is None:
+                with phase("db_connect"):
+                    mydb = InstrumentedConnection(conn.connect(**self.connect_args))
+                with self._cond:
+                    self._stats["created"] += 1
+            elif time.monotonic() - last_returned > self.recycle:
+                # long idle connections may have been dropped by wait_timeout
+                mydb.ping(reconnect=True, attempts=1)
+            return mydb
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._stats["discarded"] += 1
+                self._cond.notify()
+            raise
+
+    def release(self, mydb):
+        discard = False
+        try:
+            if mydb.unread_result:
+                mydb.consume_results()
+            if mydb.in_transaction:
+                # never hand an uncommitted transaction to the next request
+                mydb.rollback()
+        except Exception as e:
+            logging.error(f"Discarding broken pooled connection: {e}")
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            self._stats["returns"] += 1
+            if discard or len(self._idle) >= self.size:
+                self._open -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append((mydb, time.monotonic()))
+                mydb = None
+            self._cond.notify()
+
+        if mydb is not None:
+            try:
+                mydb.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self.size,
+                max_overflow=self.max_overflow,
+                open=self._open,
+                idle=len(self._idle),
+                in_use=self._in_use,
+            )
+            return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _server(host, port):
+    if port == 3306:
+        return host
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+
+def get_connection_pool(db=None):
+    # `db` is a DatabaseSettings, the configured database by default
+    db = db or settings.database
+    key = (db.host, db.port, db.user, db.name)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                db.host,
+                db.user,
+                db.password,
+                db.name,
+                size=db.pool_size,
+                max_overflow=db.pool_max_overflow,
+                timeout=db.pool_timeout,
+                recycle=db.pool_recycle,
+                port=db.port,
+            )
+            _pools[key] = pool
+            logging.info(f"MySQL connection pool created for {_server(db.host, db.port)}/{db.name} (size={db.pool_size}, max_overflow={db.pool_max_overflow})")
+        return pool
+
+
+def get_pool_stats():
+    with _pools_lock:
+        return {f"{_server(key[0], key[1])}/{key[3]}": pool.stats() for key, pool in _pools.items()}
+
+
+def _pool_samples():
+    for name, stats in get_pool_stats().items():
+        for state in ("in_use", "idle", "open"):
+            yield (name, state), stats[state]
+        yield (name, "max"), stats["size"] + stats["max_overflow"]
+
+
+def _pool_wait_samples():
+    for name, stats in get_pool_stats().items():
+        yield (name, "waits"), stats["waits"]
+        yield (name, "exhausted"), stats["exhausted"]
+
+
+Gauge("bot_db_pool_connections", "MySQL pool connections by state", ("pool", "state"), _pool_samples)
+Gauge("bot_db_pool_events_total", "MySQL pool checkouts that had to wait or gave up", ("pool", "event"), _pool_wait_samples, kind="counter")
+
+
+def reset_pools():
+    # called in a freshly forked worker: sockets inherited from the parent belong
+    # to the parent, so they are forgotten (not closed) and each worker opens its own
+    global _pools_lock
+    _pools_lock = threading.Lock()
+    _pools.clear()
+    _async_pools.clear()
+    _replica_lag.clear()
+
+
+@contextmanager
+def pooled_connection(db=None):
+    pool = get_connection_pool(db)
+    mydb = pool.checkout()
+    try:
+        yield mydb
+    finally:
+        pool.release(mydb)
+
+
+_async_pools = {}  # (event loop, host, port, user, database) -> task creating the aiomysql pool
+
+
+async def _create_async_pool(key, db):
+    # aiomysql is only needed by the asyncio serving mode (src/bot/asgi.py)
+    import aiomysql
+
+    try:
+        pool = await aiomysql.create_pool(
+            host=db.host,
+            port=db.port,
+            user=db.user,
+            password=db.password,
+            db=db.name,
+            minsize=1,
+            maxsize=db.pool_size + db.pool_max_overflow,
+            pool_recycle=int(db.pool_recycle),
+            autocommit=False,
+        )
+    except Exception:
+        _async_pools.pop(key, None)
+        raise
+    logging.info(f"async MySQL connection pool created for {_server(db.host, db.port)}/{db.name} (maxsize={db.pool_size + db.pool_max_overflow})")
+    return pool
+
+
+async def get_async_pool(db=None):
+    db = db or settings.database
+    key = (id(asyncio.get_running_loop()), db.host, db.port, db.user, db.name)
+    task = _async_pools.get(key)
+    if task is None:
+        # concurrent first requests wait on the same pool instead of each creating one
+        task = _async_pools[key] = asyncio.ensure_future(_create_async_pool(key, db))
+    return await task
+
+
+async def close_async_pools():
+    # on ASGI shutdown; only pools created on the running event loop are closed
+    loop_id = id(asyncio.get_running_loop())
+    for key, task in list(_async_pools.items()):
+        if key[0] != loop_id:
+            continue
+        del _async_pools[key]
+        if task.done() and task.exception() is None:
+            pool = task.result()
+            pool.close()
+            await pool.wait_closed()
+
+
+@asynccontextmanager
+async def async_pooled_connection(db=None):
+    db = db or settings.database
+    pool = await get_async_pool(db)
+    try:
+        with phase("db_acquire"):
+            mydb = await asyncio.wait_for(pool.acquire(), db.pool_timeout)
+    except asyncio.TimeoutError:
+        raise PoolExhaustedError(f"no MySQL connection free after {db.pool_timeout}s")
+    try:
+        yield mydb
+    finally:
+        await _release_async(pool, mydb)
+
+
+async def _release_async(pool, mydb):
+    # aiomysql closes connections released mid-transaction; rolling back keeps them pooled
+    try:
+        if not mydb.closed and mydb.get_transaction_status():
+            await mydb.rollback()
+    except Exception:
+        mydb.close()
+    pool.release(mydb)
 
 
-def configure():
-    load_dotenv()
+# Read/write splitting. Writes, and reads that must see them, use the primary (settings.database).
+# Read-only work that tolerates a few seconds of lag goes through read_connection(), which picks
+# a replica from database_replica_hosts in turn, measures its lag with SHOW REPLICA STATUS at most
+# every db_replica_lag_check_interval seconds, and falls back to the primary when every replica
+# is further than db_replica_max_lag behind, unreachable, or not replicating. Two plain local
+# MySQL servers can stand in for a primary and a replica with db_replica_check_lag=false.
+READS = Counter("bot_db_reads_total", "Read-only operations by the server that took them and why", ("target", "reason"))
+_replica_lag = {}  # (host, port) -> (lag seconds or None when broken, monotonic time measured)
+_replica_lock = threading.Lock()
+_replica_turn = [0]
 
 
-configure()
-host = os.getenv("database_host_name")
-user = os.getenv("database_user_name")
-password = os.getenv("database_user_password")
-database = os.getenv("database_name")
+def _replica_lag_samples():
+    with _replica_lock:
+        lags = dict(_replica_lag)
+    for (host, port), (lag, _) in lags.items():
+        yield (_server(host, port),), -1 if lag is None else lag
+
+
+Gauge("bot_db_replica_lag_seconds", "Last measured replication lag per replica, -1 when broken or not replicating", ("replica",), _replica_lag_samples)
+
+
+def _replica_candidates(db):
+    """Yields (replica settings, whether its lag must be measured now), round robin, skipping recently bad ones."""
+    with _replica_lock:
+        _replica_turn[0] = (_replica_turn[0] + 1) % len(db.replicas)
+        turn = _replica_turn[0]
+    now = time.monotonic()
+    for host, port in db.replicas[turn:] + db.replicas[:turn]:
+        with _replica_lock:
+            measured = _replica_lag.get((host, port))
+        stale = measured is None or now - measured[1] >= db.replica_lag_check_interval
+        if not stale and not _fresh_enough(db, measured[0]):
+            continue
+        yield replace(db, host=host, port=port, replicas=()), stale and db.replica_check_lag
+
+
+def _fresh_enough(db, lag):
+    return lag is not None and lag <= db.replica_max_lag
+
+
+def _record_lag(replica, lag):
+    with _replica_lock:
+        _replica_lag[(replica.host, replica.port)] = (lag, time.monotonic())
+
+
+def _lag_from_status(description, row):
+    # no row: the server is not replicating; a NULL lag: replication is stopped
+    if row is None:
+        return None
+    status = dict(zip([column[0] for column in description], row))
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+def _measure_lag(mydb):
+    cursor = create_cursor_object(mydb, buffered=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Exception:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL before 8.0.22
+        return _lag_from_status(cursor.description, cursor.fetchone())
+    finally:
+        cursor.close()
+
+
+def _current_lag(replica):
+    with _replica_lock:
+        return _replica_lag.get((replica.host, replica.port), (None, 0))[0]
+
+
+def _replica_failed(replica, e):
+    logging.warning(f"replica {_server(replica.host, replica.port)} skipped: {e}")
+    _record_lag(replica, None)
+
+
+def _fallback_reason(db):
+    # why the primary takes the read: every replica is behind, or none is reachable
+    with _replica_lock:
+        lags = [_replica_lag.get(replica, (None, 0))[0] for replica in db.replicas]
+    return "replica_lagging" if any(lag is not None for lag in lags) else "replica_error"
+
+
+def _checkout_replica(db):
+    # (connection, pool, None) from a replica close enough to the primary, or (None, None, why not)
+    for replica, measure in _replica_candidates(db):
+        pool = get_connection_pool(replica)
+        try:
+            mydb = pool.checkout()
+        except Exception as e:
+            _replica_failed(replica, e)
+            continue
+        try:
+            if measure:
+                _record_lag(replica, _measure_lag(mydb))
+        except Exception as e:
+            pool.release(mydb)
+            _replica_failed(replica, e)
+            continue
+        if not db.replica_check_lag or _fresh_enough(db, _current_lag(replica)):
+            return mydb, pool, None
+        pool.release(mydb)
+    return None, None, _fallback_reason(db)
+
+
+@contextmanager
+def read_connection(db=None, fresh=False):
+    """
+    A pooled connection for read-only work: a replica within replica_max_lag
+    when one is configured, the primary otherwise. fresh=True reads from the
+    primary, for reads that must see a write just made (read-your-writes).
+    """
+    db = db or settings.database
+    if fresh:
+        reason = "fresh"
+    elif not db.replicas:
+        reason = "no_replica"
+    else:
+        mydb, pool, reason = _checkout_replica(db)
+        if mydb is not None:
+            READS.inc("replica", "replica")
+            try:
+                yield mydb
+            finally:
+                pool.release(mydb)
+            return
+    READS.inc("primary", reason)
+    with pooled_connection(db) as mydb:
+        yield mydb
+
+
+async def _checkout_replica_async(db):
+    for replica, measure in _replica_candidates(db):
+        try:
+            pool = await get_async_pool(replica)
+            with phase("db_acquire"):
+                mydb = await asyncio.wait_for(pool.acquire(), replica.pool_timeout)
+        except Exception as e:
+            _replica_failed(replica, e)
+            continue
+        try:
+            if measure:
+                async with mydb.cursor() as cursor:
+                    try:
+                        await cursor.execute("SHOW REPLICA STATUS")
+                    except Exception:
+                        await cursor.execute("SHOW SLAVE STATUS")
+                    _record_lag(replica, _lag_from_status(cursor.description, await cursor.fetchone()))
+        except Exception as e:
+            await _release_async(pool, mydb)
+            _replica_failed(replica, e)
+            continue
+        if not db.replica_check_lag or _fresh_enough(db, _current_lag(replica)):
+            return mydb, pool, None
+        await _release_async(pool, mydb)
+    return None, None, _fallback_reason(db)
+
+
+@asynccontextmanager
+async def async_read_connection(db=None, fresh=False):
+    db = db or settings.database
+    if fresh:
+        reason = "fresh"
+    elif not db.replicas:
+        reason = "no_replica"
+    else:
+        mydb, pool, reason = await _checkout_replica_async(db)
+        if mydb is not None:
+            READS.inc("replica", "replica")
+            try:
+                yield mydb
+            finally:
+                await _release_async(pool, mydb)
+            return
+    READS.inc("primary", reason)
+    async with async_pooled_connection(db) as mydb:
+        yield mydb
+
+
+def get_request_connection():
+    # one pooled connection per Flask request, returned by release_request_connection
+    if "mydb" not in g:
+        try:
+            g.mydb = get_connection_pool().checkout()
+        except Exception as e:
+            logging.error(f"An error occurred: {e}")
+            raise CustomException(e, sys)
+    return g.mydb
+
+
+def release_request_connection(exception=None):
+    mydb = g.pop("mydb", None)
+    if mydb is not None:
+        get_connection_pool().release(mydb)
+
+
+def init_app(app):
+    # teardown runs after every request, including ones that raised
+    app.teardown_appcontext(release_request_connection)
 
 
 def create_database(host, user, password):
@@ -32,34 +540,60 @@ def create_database(host, user, password):
 def connect_to_mysql_database(host, user, password, database):
     try:
         mydb = conn.connect(host=host, user=user, password=password, database=database)
-        logging.info("Connected to MySQL successfully!")
+        logging.debug("Connected to MySQL successfully!")
         return mydb
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e,sys)
     
 
-def create_cursor_object(mydb):
+def create_cursor_object(mydb, buffered=False):
     try:
-        cursor = mydb.cursor()
-        logging.info("Cursor object obtained successfully!")
+        cursor = mydb.cursor(buffered=buffered)
+        logging.debug("Cursor object obtained successfully!")
         return cursor
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e,sys)
     
 
+# secondary indexes of the conversation tables: (name, column), shared with src/bot/migrations.py
+CONVERSATION_INDEXES = {
+    "PROSPECTS": (
+        ("IDX_PROSPECTS_CREATED", "CREATED"),
+        ("IDX_PROSPECTS_EMAIL", "EMAIL_ID"),
+        ("IDX_PROSPECTS_CONTACT", "CONTACT_NUMBER"),
+        ("IDX_PROSPECTS_SOURCE", "KNOWN_SOURCE"),
+    ),
+    "EXISTING_CLIENT": (
+        ("IDX_EXISTING_CLIENT_CREATED", "CREATED"),
+        ("IDX_EXISTING_CLIENT_EMAIL", "EMAIL_ID"),
+        ("IDX_EXISTING_CLIENT_CONTACT", "CONTACT_NUMBER"),
+    ),
+    "JOB_SEEKER": (
+        ("IDX_JOB_SEEKER_CREATED", "CREATED"),
+        ("IDX_JOB_SEEKER_EMAIL", "EMAIL_ID"),
+        ("IDX_JOB_SEEKER_CONTACT", "CONTACT_NUMBER"),
+    ),
+}
+
+
+def index_clauses(table):
+    return ",\n                ".join(f"INDEX {name} ({column})" for name, column in CONVERSATION_INDEXES[table])
+
+
 def create_tables(host, user, password, database):
     try:
         mydb = connect_to_mysql_database(host, user, password, database)
         cursor = create_cursor_object(mydb)
 
         table_queries = [
-            """
+            # fixed-option answers are stored as the option number (TINYINT),
+            # older tables are converted by `bot-migrate apply` (src/bot/migrations.py)
+            f"""
             CREATE TABLE IF NOT EXISTS PROSPECTS(
                 PID INT AUTO_INCREMENT PRIMARY KEY,
-                CREATED_ON DATE,
-                CREATED_TIME TIME,
+                CREATED DATETIME NOT NULL,
                 IP VARCHAR(45),
                 NAME VARCHAR(255),
                 EMAIL_ID VARCHAR(255),
@@ -69,46 +603,67 @@ def create_tables(host, user, password, database):
                 VERTICAL VARCHAR(255),
                 REQUIREMENTS VARCHAR(255),
                 KNOWN_SOURCE VARCHAR(255),
-                RATING VARCHAR(255),
-                FEEDBACK VARCHAR(255)
+                RATING TINYINT UNSIGNED,
+                FEEDBACK VARCHAR(255),
+                {index_clauses("PROSPECTS")}
             )
             """,
-            """
+            f"""
             CREATE TABLE IF NOT EXISTS EXISTING_CLIENT(
                 EID INT AUTO_INCREMENT PRIMARY KEY,
-                CREATED_ON DATE,
-                CREATED_TIME TIME,
+                CREATED DATETIME NOT NULL,
                 IP VARCHAR(45),
                 NAME VARCHAR(255),
                 EMAIL_ID VARCHAR(255),
                 CONTACT_NUMBER VARCHAR(255),
                 COMPANY_NAME VARCHAR(255),
                 VERTICAL VARCHAR(255),
-                ISSUE_ESCALATION VARCHAR(255),
-                ISSUE_TYPE VARCHAR(255),
+                ISSUE_ESCALATION TINYINT UNSIGNED,
+                ISSUE_TYPE TINYINT UNSIGNED,
                 ISSUE_TEXT VARCHAR(255),
-                RATING VARCHAR(255),
-                FEEDBACK VARCHAR(255)
+                RATING TINYINT UNSIGNED,
+                FEEDBACK VARCHAR(255),
+                {index_clauses("EXISTING_CLIENT")}
             )
             """,
-            """
+            f"""
             CREATE TABLE IF NOT EXISTS JOB_SEEKER(
                 JID INT AUTO_INCREMENT PRIMARY KEY,
-                CREATED_ON DATE,
-                CREATED_TIME TIME,
+                CREATED DATETIME NOT NULL,
                 IP VARCHAR(45),
                 NAME VARCHAR(255),
                 EMAIL_ID VARCHAR(255),
                 CONTACT_NUMBER VARCHAR(255),
                 COMPANY_NAME VARCHAR(255),
-                CATEGORY VARCHAR(255),
+                CATEGORY TINYINT UNSIGNED,
                 VERTICAL VARCHAR(255),
-                INTERVIEW_MODE VARCHAR(255),
+                INTERVIEW_AVAILABLE TINYINT UNSIGNED,
+                INTERVIEW_MODE TINYINT UNSIGNED,
                 TIME_AVAILABLE VARCHAR(255),
-                NOTICE_PERIOD VARCHAR(255),
+                NOTICE_PERIOD TINYINT UNSIGNED,
                 LINKEDIN_URL VARCHAR(255),
-                RATING VARCHAR(255),
-                FEEDBACK VARCHAR(255)
+                RATING TINYINT UNSIGNED,
+                FEEDBACK VARCHAR(255),
+                {index_clauses("JOB_SEEKER")}
+            )
+            """,
+            # notification emails waiting for the outbox worker (src/bot/outbox.py)
+            """
+            CREATE TABLE IF NOT EXISTS EMAIL_OUTBOX(
+                OID INT AUTO_INCREMENT PRIMARY KEY,
+                CREATED_AT DATETIME NOT NULL,
+                STATUS VARCHAR(16) NOT NULL DEFAULT 'PENDING',
+                ATTEMPTS INT NOT NULL DEFAULT 0,
+                NEXT_ATTEMPT_AT DATETIME NOT NULL,
+                LOCKED_UNTIL DATETIME NULL,
+                SENDER_EMAIL VARCHAR(255),
+                RECEIVER_EMAILS TEXT,
+                CC_EMAIL TEXT,
+                SUBJECT VARCHAR(255),
+                MESSAGE TEXT,
+                LAST_ERROR TEXT,
+                SENT_AT DATETIME NULL,
+                INDEX IDX_OUTBOX_DUE (STATUS, NEXT_ATTEMPT_AT)
             )
             """
         ]
@@ -124,213 +679,282 @@ def create_tables(host, user, password, database):
         raise CustomException(e, sys)
 
 
-def extract_prospect_conversation():
+@dataclass
+class ProspectConversation:
+    id: int
+    created: object
+    ip_address: str
+    name: str
+    email: str
+    contact: str
+    company: str
+    industries_choosen: str
+    verticals_choosen: str
+    requirement: str
+    known_source: str
+    rating: str
+    feedback: str
+
+    @property
+    def date(self):
+        return self.created.date() if self.created else None
+
+    @property
+    def time(self):
+        return self.created.time() if self.created else None
+
+
+@dataclass
+class ExistingClientConversation:
+    id: int
+    created: object
+    ip_address: str
+    name: str
+    email: str
+    contact: str
+    company: str
+    verticals_choosen: str
+    issue_escalation: str
+    issue_type: str
+    issue_text: str
+    rating: str
+    feedback: str
+
+    @property
+    def date(self):
+        return self.created.date() if self.created else None
+
+    @property
+    def time(self):
+        return self.created.time() if self.created else None
+
+
+@dataclass
+class JobSeekerConversation:
+    id: int
+    created: object
+    ip_address: str
+    name: str
+    email: str
+    contact: str
+    company: str
+    category: str
+    verticals_choosen: str
+    interview_mode: str
+    time_available: str
+    notice_period: str
+    linkedin_url: str
+    rating: str
+    feedback: str
+
+    @property
+    def date(self):
+        return self.created.date() if self.created else None
+
+    @property
+    def time(self):
+        return self.created.time() if self.created else None
+
+
+# table column -> result field, per conversation table
+PROSPECT_COLUMNS = {
+    "PID": "id",
+    "CREATED": "created",
+    "IP": "ip_address",
+    "NAME": "name",
+    "EMAIL_ID": "email",
+    "CONTACT_NUMBER": "contact",
+    "COMPANY_NAME": "company",
+    "INDUSTRY": "industries_choosen",
+    "VERTICAL": "verticals_choosen",
+    "REQUIREMENTS": "requirement",
+    "KNOWN_SOURCE": "known_source",
+    "RATING": "rating",
+    "FEEDBACK": "feedback",
+}
+
+EXISTING_CLIENT_COLUMNS = {
+    "EID": "id",
+    "CREATED": "created",
+    "IP": "ip_address",
+    "NAME": "name",
+    "EMAIL_ID": "email",
+    "CONTACT_NUMBER": "contact",
+    "COMPANY_NAME": "company",
+    "VERTICAL": "verticals_choosen",
+    "ISSUE_ESCALATION": "issue_escalation",
+    "ISSUE_TYPE": "issue_type",
+    "ISSUE_TEXT": "issue_text",
+    "RATING": "rating",
+    "FEEDBACK": "feedback",
+}
+
+JOB_SEEKER_COLUMNS = {
+    "JID": "id",
+    "CREATED": "created",
+    "IP": "ip_address",
+    "NAME": "name",
+    "EMAIL_ID": "email",
+    "CONTACT_NUMBER": "contact",
+    "COMPANY_NAME": "company",
+    "CATEGORY": "category",
+    "VERTICAL": "verticals_choosen",
+    "INTERVIEW_MODE": "interview_mode",
+    "TIME_AVAILABLE": "time_available",
+    "NOTICE_PERIOD": "notice_period",
+    "LINKEDIN_URL": "linkedin_url",
+    "RATING": "rating",
+    "FEEDBACK": "feedback",
+}
+
+
+def conversation_from_columns(result_class, column_map, values):
+    # `values` maps column names to values, e.g. a fetched row or an in-memory conversation
+    return result_class(**{field: values.get(column) for column, field in column_map.items()})
+
+
+def conversation_query(table, column_map):
+    columns = list(column_map)
+    # the first column of each map is the table's primary key
+    return f"SELECT {', '.join(columns)} FROM {table} WHERE {columns[0]} = %s", columns
+
+
+def fetch_conversation(result_class, table, column_map, row_id, mydb=None, decode=None):
+    # `decode` turns the stored option codes of a row back into their labels, see flow.decode_columns
     try:
-        mydb = connect_to_mysql_database(host, user, password, database)
-        cursor = create_cursor_object(mydb)
+        query, columns = conversation_query(table, column_map)
 
-        query = "SELECT * FROM PROSPECTS ORDER BY PID DESC LIMIT 1"  # we can get the row with highest id value
-        cursor.execute(query)
+        if mydb is None:
+            # nothing of this caller's is waiting to be read back, a replica will do
+            with read_connection() as pooled_db:
+                return fetch_conversation(result_class, table, column_map, row_id, pooled_db, decode)
 
-        result = cursor.fetchone()  # getting only one row
-        if result:
-            # Extract the columns from the result
-            (
-                PID,
-                CREATED_ON,
-                CREATED_TIME,
-                IP,
-                NAME,
-                EMAIL_ID,
-                CONTACT_NUMBER,
-                COMPANY_NAME,
-                INDUSTRY,
-                VERTICAL,
-                REQUIREMENTS,
-                KNOWN_SOURCE,
-                RATING,
-                FEEDBACK
-            ) = result
-
-            # Extracted new_client details stored in dictionary format
-            prospect_details = {
-                "id": PID,
-                "date": CREATED_ON,
-                "time": CREATED_TIME,
-                "ip_address":IP,
-                "name": NAME,
-                "email": EMAIL_ID,
-                "contact": CONTACT_NUMBER,
-                "company": COMPANY_NAME,          
-                "industries_choosen": INDUSTRY,
-                "verticals_choosen": VERTICAL,
-                "requirement": REQUIREMENTS,
-                "known_source": KNOWN_SOURCE,
-                "rating": RATING,
-                "feedback": FEEDBACK
-            }
-
-            return prospect_details
-        
-        # Close the cursor and connection
-        cursor.close()
-        logging.info("cursor connection closed")
-        mydb.close()
-        logging.info("database closed")
+        with phase("conversation_fetch"):
+            # buffered so the caller's connection is free for its next statement
+            cursor = create_cursor_object(mydb, buffered=True)
+            cursor.execute(query, (row_id,))
+            result = cursor.fetchone()
+            cursor.close()
 
+        if result:
+            values = dict(zip(columns, result))
+            return conversation_from_columns(result_class, column_map, decode(values) if decode else values)
+        return None
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e,sys)
-    
 
-def extract_existing_client_conversation():
+
+async def fetch_conversation_async(result_class, table, column_map, row_id, mydb, decode=None):
     try:
-        mydb = connect_to_mysql_database(host, user, password, database)
-        cursor = create_cursor_object(mydb)
+        query, columns = conversation_query(table, column_map)
+        with phase("conversation_fetch"):
+            async with mydb.cursor() as cursor:
+                await cursor.execute(query, (row_id,))
+                result = await cursor.fetchone()
 
-        # execute sql query to retrive new_client details
-        query = "SELECT * FROM existing_client ORDER BY eid DESC LIMIT 1"  # we can get the row with highest id value
-        cursor.execute(query)
-        # Fetch the result
-        result = cursor.fetchone()  # getting only one row
         if result:
-            # Extract the columns from the result
-            (
-                id,
-                date,
-                time,
-                ip_address,
-                name,
-                email,
-                contact,
-                company,
-                selected_vertical,
-                issue_escalation,
-                issue_type,
-                issue_text,
-                rating,
-                feedback
-            ) = result
-
-            # Extracted new_client details stored in dictionary format
-            existing_client_details = {
-                "id": id,
-                "date": date,
-                "time": time,
-                "ip_address":ip_address,
-                "name": name,
-                "email": email,
-                "contact": contact,
-                "company": company,
-                "verticals_choosen": selected_vertical,
-                "issue_escalation": issue_escalation,
-                "issue_type": issue_type,
-                "issue_text": issue_text,
-                "rating": rating,
-                "feedback": feedback,
-            }
-
-            return existing_client_details
-        
-        # Close the cursor and connection
-        cursor.close()
-        logging.info("cursor connection closed")
-        mydb.close()
-        logging.info("database closed")
-
+            values = dict(zip(columns, result))
+            return conversation_from_columns(result_class, column_map, decode(values) if decode else values)
+        return None
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e,sys)
-    
 
-def extract_job_seeker_conversation():
-    try:
-        mydb = connect_to_mysql_database(host, user, password, database)
-        cursor = create_cursor_object(mydb)
 
-        # execute sql query to retrive new_client details
-        query = "SELECT * FROM job_seeker ORDER BY JID DESC LIMIT 1"  # we can get the row with highest id value
-        cursor.execute(query)
-        # Fetch the result
-        result = cursor.fetchone()  # getting only one row
-        if result:
-            # Extract the columns from the result
-            (
-                PID,
-                CREATED_ON,
-                CREATED_TIME,
-                IP,
-                NAME,
-                EMAIL_ID,
-                CONTACT_NUMBER,
-                COMPANY_NAME,
-                CATEGORY,
-                VERTICAL,
-                INTERVIEW_MODE,
-                TIME_AVAILABLE,
-                NOTICE_PERIOD,
-                LINKEDIN_URL,
-                RATING,
-                FEEDBACK,
-            ) = result
-
-            # Extracted job_seeker details stored in dictionary format
-            job_seeker_details = {
-                "id": PID,
-                "date": CREATED_ON,
-                "time": CREATED_TIME,
-                "ip_address":IP,
-                "name": NAME,
-                "email": EMAIL_ID,
-                "contact": CONTACT_NUMBER,
-                "company": COMPANY_NAME,
-                "category": CATEGORY,
-                "verticals_choosen": VERTICAL,
-                "interview_mode": INTERVIEW_MODE,
-                "time_available": TIME_AVAILABLE,
-                "notice_period": NOTICE_PERIOD,
-                "linkedin_url": LINKEDIN_URL,
-                "rating": RATING,
-                "feedback": FEEDBACK,
-            }
-
-            return job_seeker_details
-        
-        # Close the cursor and connection
-        cursor.close()
-        logging.info("cursor connection closed")
-        mydb.close()
-        logging.info("database closed")
+def fetch_prospect_conversation(row_id, mydb=None):
+    return fetch_conversation(ProspectConversation, "PROSPECTS", PROSPECT_COLUMNS, row_id, mydb)
 
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
-        raise CustomException(e,sys)
 
+def fetch_existing_client_conversation(row_id, mydb=None):
+    return fetch_conversation(ExistingClientConversation, "existing_client", EXISTING_CLIENT_COLUMNS, row_id, mydb)
+
+
+def fetch_job_seeker_conversation(row_id, mydb=None):
+    return fetch_conversation(JobSeekerConversation, "job_seeker", JOB_SEEKER_COLUMNS, row_id, mydb)
 
-def alter_table(host, user, password, database):
-    try:
-        mydb = connect_to_mysql_database(host, user, password, database)
-        cursor = create_cursor_object(mydb)
 
-        alter_table_query = """
-                            ALTER TABLE job_seeker 
-                            ADD COLUMN INTERVIEW_MODE VARCHAR(255) AFTER INTERVIEW_AVAILABLE,
-                            ADD COLUMN LINKEDIN_URL VARCHAR(255) AFTER NOTICE_PERIOD
-                            """
-        cursor.execute(alter_table_query)
-        logging.info("Columns added successfully")
+# SMTP_CREDENTIALS is a single row that only changes through smtp_creds_to_db,
+# which calls invalidate_smtp_credentials_cache() after writing
+_smtp_credentials_cache = {}
+_smtp_credentials_lock = threading.Lock()
+_smtp_credentials_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_smtp_credentials_changed = [None]  # monotonic time of the last invalidation in this process
 
+
+def _smtp_credentials_fresh(db):
+    # right after a change, read it back from the primary until every replica has had time to catch up
+    changed = _smtp_credentials_changed[0]
+    return changed is not None and time.monotonic() - changed < db.replica_max_lag + db.replica_lag_check_interval
+
+
+def _cached_smtp_credentials(key):
+    with _smtp_credentials_lock:
+        cached = _smtp_credentials_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            _smtp_credentials_stats["hits"] += 1
+            return dict(cached[1])
+        _smtp_credentials_stats["misses"] += 1
+    return None
+
+
+def _store_smtp_credentials(key, credentials):
+    with _smtp_credentials_lock:
+        _smtp_credentials_cache[key] = (time.monotonic() + settings.smtp.credentials_ttl, credentials)
+    return dict(credentials)
+
+
+def get_smtp_credentials(db=None):
+    db = db or settings.database
+    key = (db.host, db.name)
+    cached = _cached_smtp_credentials(key)
+    if cached is not None:
+        return cached
+    with phase("smtp_credentials_load"):
+        return _store_smtp_credentials(key, load_smtp_credentials(db))
+
+
+async def get_smtp_credentials_async(db=None):
+    db = db or settings.database
+    key = (db.host, db.name)
+    cached = _cached_smtp_credentials(key)
+    if cached is not None:
+        return cached
+    try:
+        with phase("smtp_credentials_load"):
+            async with async_read_connection(db, fresh=_smtp_credentials_fresh(db)) as mydb:
+                async with mydb.cursor() as cursor:
+                    await cursor.execute(SMTP_CREDENTIALS_QUERY)
+                    credentials = await cursor.fetchone()
+        return _store_smtp_credentials(key, smtp_credentials_from_row(credentials))
     except Exception as e:
         logging.error(f"An error occurred: {e}")
-        raise CustomException(e,sys)
-    
+        raise CustomException(e, sys)
+
+
+def invalidate_smtp_credentials_cache():
+    with _smtp_credentials_lock:
+        _smtp_credentials_cache.clear()
+        _smtp_credentials_stats["invalidations"] += 1
+        _smtp_credentials_changed[0] = time.monotonic()
+    logging.info("SMTP credentials cache invalidated")
+
+
+def get_smtp_credentials_cache_stats():
+    with _smtp_credentials_lock:
+        return dict(_smtp_credentials_stats, ttl=settings.smtp.credentials_ttl)
 
-def get_smtp_credentials(host, user, password, database):
-    try:
-        mydb = connect_to_mysql_database(host, user, password, database)
-        cursor = create_cursor_object(mydb)
 
-        query = """
+Gauge(
+    "bot_smtp_credentials_cache_total",
+    "SMTP credential cache hits, misses (a database read) and invalidations",
+    ("result",),
+    lambda: [((result,), get_smtp_credentials_cache_stats()[result]) for result in ("hits", "misses", "invalidations")],
+    kind="counter",
+)
+
+
+SMTP_CREDENTIALS_QUERY = """
                     SELECT 
                     smtp_server, 
                     smtp_port, 
@@ -349,29 +973,35 @@ def get_smtp_credentials(host, user, password, database):
                     LIMIT 1
                 """
 
-        cursor.execute(query)
-
-        credentials = cursor.fetchone()
 
-        mydb.close()
-
-        if credentials:
-            return {
-                "smtp_server": credentials[0],
-                "smtp_port": credentials[1],
-                "smtp_username": credentials[2],
-                "smtp_password": credentials[3],
-                "sender_email": credentials[4],
-                "prospect_receiver_emails": credentials[5],
-                "existing_client_receiver_emails": credentials[6],
-                "job_seeker_receiver_emails": credentials[7],
-                "cc_email": credentials[8],
-                "prospect_email_subject": credentials[9],
-                "existing_client_email_subject": credentials[10],
-                "job_seeker_email_subject": credentials[11],
-            }
-        else:
-            raise ValueError("No SMTP credentials found in the database.")
+def smtp_credentials_from_row(credentials):
+    if not credentials:
+        raise ValueError("No SMTP credentials found in the database.")
+    return {
+        "smtp_server": credentials[0],
+        "smtp_port": credentials[1],
+        "smtp_username": credentials[2],
+        "smtp_password": credentials[3],
+        "sender_email": credentials[4],
+        "prospect_receiver_emails": credentials[5],
+        "existing_client_receiver_emails": credentials[6],
+        "job_seeker_receiver_emails": credentials[7],
+        "cc_email": credentials[8],
+        "prospect_email_subject": credentials[9],
+        "existing_client_email_subject": credentials[10],
+        "job_seeker_email_subject": credentials[11],
+    }
+
+
+def load_smtp_credentials(db=None):
+    db = db or settings.database
+    try:
+        with read_connection(db, fresh=_smtp_credentials_fresh(db)) as mydb:
+            cursor = create_cursor_object(mydb, buffered=True)
+            cursor.execute(SMTP_CREDENTIALS_QUERY)
+            credentials = cursor.fetchone()
+            cursor.close()
+        return smtp_credentials_from_row(credentials)
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e, sys)
@@ -380,10 +1010,11 @@ def get_smtp_credentials(host, user, password, database):
 
 if __name__ == "__main__":
    
-    # create_database(host, user, password)
-    # create_tables(host, user, password, database)
+    # db = settings.database
+    # create_database(db.host, db.user, db.password)
+    # create_tables(db.host, db.user, db.password, db.name)
 
-    smtp_credentials = get_smtp_credentials(host, user, password, database)
+    smtp_credentials = get_smtp_credentials()
     print(smtp_credentials)
     print(smtp_credentials["job_seeker_receiver_emails"])
     print(type(smtp_credentials["job_seeker_receiver_emails"]))
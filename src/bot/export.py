@@ -0,0 +1,241 @@
+"""
+Lead exports for sales, instead of ad-hoc SQL against production.
+
+    GET /export/prospect?start=2026-01-01&end=2026-02-01&format=csv&gzip=true
+        Authorization: Bearer <export_token>
+
+    bot-export prospect --start 2026-01-01 --end 2026-02-01 --format ndjson --gzip -o leads.ndjson.gz
+
+The persona is prospect, existing_client or job_seeker. start is inclusive
+and end exclusive. Both are UTC dates or datetimes and both are optional.
+format is csv (the default) or ndjson, and gzip=true compresses the output.
+Option codes are written out as their labels. The endpoint answers 404 until
+export_token is set. The CLI reads the database directly, using the
+credentials from .env.
+
+Rows are read in keyset pages of export_page_size rows, ordered by
+(CREATED, primary key):
+    WHERE CREATED > last created OR (CREATED = last created AND key > last key)
+The CREATED index serves this order, so no query ever skips rows with
+OFFSET. Each page is one short query, read whole, and the pooled
+connection goes back to the pool before its rows are encoded and sent.
+Memory therefore stays at one page whatever the table size, and a slow
+client never pins a connection or a read view, not even for one page.
+Pages are read from a replica when one is configured (see read_connection
+in src/bot/database.py).
+"""
+import io
+import sys
+import csv
+import hmac
+import json
+import zlib
+import argparse
+from datetime import datetime
+from flask import request, jsonify, Response, stream_with_context
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.database import read_connection, create_cursor_object
+from src.bot.metrics import phase
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_bound(value):
+    # "2026-01-01" or "2026-01-01T09:30:00"; a date means its midnight
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def page_query(persona, columns, start, end, after, page_size):
+    key = persona.key_column
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("CREATED >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("CREATED < %s")
+        params.append(end)
+    if after is not None:
+        conditions.append(f"(CREATED > %s OR (CREATED = %s AND {key} > %s))")
+        params.extend((after[0], after[0], after[1]))
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f"SELECT {', '.join(columns)} FROM {persona.table}{where} ORDER BY CREATED, {key} LIMIT %s"
+    return query, tuple(params) + (page_size,)
+
+
+def iter_rows(persona, start=None, end=None, page_size=None, db=None):
+    """Yields the persona's rows in the date range as column -> value dicts, option codes decoded."""
+    # imported here: flow pulls in the whole app, the CLI only needs its catalogs
+    from src.bot.flow import decode_columns
+
+    columns = list(persona.column_map)
+    page_size = page_size or settings.export.page_size
+    after = None
+    while True:
+        query, params = page_query(persona, columns, start, end, after, page_size)
+        with read_connection(db) as mydb:
+            with phase("export_page"):
+                cursor = create_cursor_object(mydb)
+                cursor.execute(query, params)
+                rows = cursor.fetchmany(page_size)
+                cursor.close()
+        # the connection is back in the pool before a slow client is handed a single row
+        for row in rows:
+            values = dict(zip(columns, row))
+            after = (values["CREATED"], values[persona.key_column])
+            yield decode_columns(persona, values)
+        if len(rows) < page_size:
+            return
+
+
+def _chunks(pieces):
+    # groups small strings into CHUNK_SIZE writes
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def _csv_lines(persona, rows):
+    fields = list(persona.column_map.values())
+    line = io.StringIO()
+    writer = csv.writer(line)
+    writer.writerow(fields)
+    yield line.getvalue()
+    for row in rows:
+        line.seek(0)
+        line.truncate()
+        writer.writerow(["" if value is None else value for value in row.values()])
+        yield line.getvalue()
+
+
+def _ndjson_lines(persona, rows):
+    fields = list(persona.column_map.values())
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row.values())), default=str) + "\n"
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(persona, start=None, end=None, fmt="csv", compress=False, db=None):
+    """The export as an iterator of byte chunks."""
+    rows = iter_rows(persona, start, end, db=db)
+    lines = _csv_lines(persona, rows) if fmt == "csv" else _ndjson_lines(persona, rows)
+    chunks = _chunks(lines)
+    return _gzip(chunks) if compress else chunks
+
+
+def export_filename(persona, start, end, fmt, compress):
+    span = "_".join(bound.strftime("%Y%m%d") for bound in (start, end) if bound is not None) or "all"
+    return f"{persona.name}_{span}.{fmt}" + (".gz" if compress else "")
+
+
+def authorized(authorization):
+    token = settings.export.token
+    scheme, _, supplied = (authorization or "").partition(" ")
+    return bool(token) and scheme.lower() == "bearer" and hmac.compare_digest(supplied.strip().encode(), token.encode())
+
+
+def prepare_export(persona_name, authorization, args):
+    """
+    Checks an export request. Returns (export options, None), or (None, the
+    rejection response) for a disabled endpoint, a bad token or bad arguments.
+    """
+    from src.bot.flow import PERSONAS
+
+    if not settings.export.token:
+        return None, ({"message": "Not found.", "code": 404}, 404)
+    if not authorized(authorization):
+        return None, ({"message": "A valid export token is required.", "code": 401}, 401)
+    persona = PERSONAS.get(persona_name)
+    if persona is None:
+        return None, ({"message": f"Unknown persona, choose one of {', '.join(PERSONAS)}.", "code": 404}, 404)
+    fmt = (args.get("format") or "csv").lower()
+    if fmt not in FORMATS:
+        return None, ({"message": "format must be csv or ndjson.", "code": 400}, 400)
+    try:
+        start, end = parse_bound(args.get("start")), parse_bound(args.get("end"))
+    except ValueError:
+        return None, ({"message": "start and end must be ISO dates, e.g. 2026-01-31.", "code": 400}, 400)
+    compress = (args.get("gzip") or "false").lower() in ("1", "true", "yes")
+    return {"persona": persona, "start": start, "end": end, "fmt": fmt, "compress": compress}, None
+
+
+def response_headers(export):
+    filename = export_filename(**export)
+    mimetype = "application/gzip" if export["compress"] else FORMATS[export["fmt"]]
+    return mimetype, {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+def _logged(persona, chunks):
+    # the status line is already sent, so a failure can only cut the download short
+    try:
+        yield from chunks
+    except Exception as e:
+        logging.error(f"{persona.name} export stopped: {e}")
+        raise
+
+
+# this API is responsible for streaming lead exports to sales
+def export_view(persona_name):
+    export, rejection = prepare_export(persona_name, request.headers.get("Authorization"), request.args)
+    if rejection is not None:
+        body, status = rejection
+        return jsonify(body), status
+    logging.info(f"{persona_name} export started - {export['start']} to {export['end']} as {export['fmt']}")
+    mimetype, headers = response_headers(export)
+    return Response(stream_with_context(_logged(export["persona"], export_stream(**export))), mimetype=mimetype, headers=headers)
+
+
+def init_app(app):
+    app.add_url_rule("/export/<persona_name>", "export", export_view, methods=["GET"])
+
+
+def main(argv=None):
+    from src.bot.flow import PERSONAS
+
+    parser = argparse.ArgumentParser(description="Export the leads of one persona as CSV or NDJSON")
+    parser.add_argument("persona", choices=list(PERSONAS))
+    parser.add_argument("--start", help="first UTC date or datetime, inclusive")
+    parser.add_argument("--end", help="last UTC date or datetime, exclusive")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("-o", "--output", help="file to write, default stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        start, end = parse_bound(args.start), parse_bound(args.end)
+    except ValueError:
+        parser.error("--start and --end must be ISO dates, e.g. 2026-01-31")
+    try:
+        target = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in export_stream(PERSONAS[args.persona], start, end, args.format, args.gzip):
+                target.write(chunk)
+        finally:
+            if args.output:
+                target.close()
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+if __name__ == "__main__":
+    main()
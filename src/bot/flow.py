@@ -0,0 +1,835 @@
+"""
+Declarative description of the three chatbot conversations.
+
+Each persona (prospect, existing client, job seeker) is declared once: the
+table it writes to, its user details and feedback routes, and its steps.
+A step names its URL, the request field it reads, the option catalog it
+validates against, the column it fills and the response it returns.
+app.py registers one view per route and all of them go through the
+handlers at the bottom of this file, so the per-step work is the same for
+every step and is counted in one place (get_flow_stats). Each handler has
+an async twin for src/bot/asgi.py; both share the validation and message
+building and differ only in how they talk to MySQL.
+
+Option catalogs are frozen at import, so nothing is rebuilt per request.
+"""
+import time
+import threading
+from functools import partial
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+from src.bot.logger import logging
+from src.bot.metrics import Gauge
+from src.bot.database import (
+    get_request_connection,
+    async_pooled_connection,
+    create_cursor_object,
+    get_smtp_credentials,
+    get_smtp_credentials_async,
+    conversation_from_columns,
+    fetch_conversation,
+    fetch_conversation_async,
+    ProspectConversation,
+    ExistingClientConversation,
+    JobSeekerConversation,
+    PROSPECT_COLUMNS,
+    EXISTING_CLIENT_COLUMNS,
+    JOB_SEEKER_COLUMNS,
+)
+from src.bot.alert import prospect_email_message, existing_client_email_message, job_seeker_email_message
+from src.bot.outbox import enqueue_email, enqueue_email_async
+from src.bot.conversation_buffer import (
+    save_step,
+    save_step_async,
+    flush_conversation,
+    flush_conversation_async,
+    remember_conversation,
+)
+from src.bot.utils import (
+    get_current_utc_datetime,
+    is_valid_name,
+    is_valid_email,
+    is_valid_contact_number,
+)
+
+
+def frozen(options):
+    return MappingProxyType(dict(options))
+
+
+RATING_OPTIONS = frozen({
+    "1": "Requires Improvement",
+    "2": "Acceptable",
+    "3": "Above Average",
+    "4": "Excellent",
+    "5": "Outstanding",
+})
+
+CLIENT_TYPES = frozen({
+    "1": "Welcome, Prospects!",
+    "2": "Welcome, existing client!",
+    "3": "Welcome, Job seeker!",
+    "4": "Bye!",
+})
+
+INVALID_OPTION = ({"message": "Please choose a valid option.", "code": 400}, 200)
+INVALID_RATING = ({"status": "error", "message": "Invalid option. Please choose from 1 to 5."}, 200)
+
+# columns filled by the user details insert, in VALUES order
+DETAILS_COLUMNS = ("CREATED", "IP", "NAME", "EMAIL_ID", "CONTACT_NUMBER", "COMPANY_NAME")
+
+
+class InvalidStep(Exception):
+    def __init__(self, body, status=200):
+        super().__init__(body)
+        self.body = body
+        self.status = status
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    url: str
+    endpoint: str
+    column: str
+    input_key: str
+    response: Callable
+    log_message: str
+    options: Optional[Mapping] = None  # None for free text steps
+    multi: bool = False  # list of options, stored comma separated
+    other_options: frozenset = frozenset()  # options that take a free text specification
+    other_key: Optional[str] = None  # request field holding that specification
+    other_replaces: bool = False  # store the specification instead of "Others : <specification>"
+    invalid_response: Optional[tuple] = None  # (body, status); None raises ValueError("Invalid selection")
+
+    @property
+    def coded(self):
+        # a single choice without free text is stored as its option number (TINYINT)
+        return self.options is not None and not self.multi and not self.other_options
+
+
+@dataclass(frozen=True)
+class Persona:
+    name: str
+    table: str
+    key_column: str
+    details_url: str
+    details_endpoint: str
+    details_message: str
+    feedback_url: str
+    feedback_endpoint: str
+    batch_url: str
+    batch_endpoint: str
+    conversation_class: type
+    column_map: Mapping
+    email_message: Callable
+    receivers_key: str
+    subject_key: str
+    steps: Mapping = field(default_factory=dict)
+
+    @property
+    def coded_columns(self):
+        # column -> options of the steps stored as option numbers
+        return {step.column: step.options for step in self.steps.values() if step.coded}
+
+
+def _steps(*steps):
+    return frozen((step.name, step) for step in steps)
+
+
+def _rating_step(prefix, endpoint, label):
+    return Step(
+        name="rate",
+        url=f"{prefix}/rate",
+        endpoint=endpoint,
+        column="RATING",
+        input_key="selected_option",
+        options=RATING_OPTIONS,
+        invalid_response=INVALID_RATING,
+        response=lambda value, row_id: ({"status": "success", "message": value, "code": 200, "row_id": row_id}, 200),
+        log_message=label + " star rating saved in DB - {value}",
+    )
+
+
+def _requirement_step(name, endpoint, options, other_option):
+    return Step(
+        name=name,
+        url=f"/chatbot/prospect/{name}",
+        endpoint=endpoint,
+        column="REQUIREMENTS",
+        input_key="selected_option",
+        options=frozen(options),
+        other_options=frozenset({other_option}),
+        other_key="requirement_specification",
+        invalid_response=INVALID_OPTION,
+        response=lambda value, row_id: ({"selected_requirement": value, "code": 200, "row_id": row_id}, 200),
+        log_message="prospect requirement saved in DB - {value}",
+    )
+
+
+PROSPECT = Persona(
+    name="prospect",
+    table="PROSPECTS",
+    key_column="PID",
+    details_url="/chatbot/prospect",
+    details_endpoint="prospect_details",
+    details_message="prospect details collected successfully.",
+    feedback_url="/chatbot/prospect/feedback",
+    feedback_endpoint="save_feedback",
+    batch_url="/chatbot/prospect/batch",
+    batch_endpoint="prospect_batch",
+    conversation_class=ProspectConversation,
+    column_map=PROSPECT_COLUMNS,
+    email_message=prospect_email_message,
+    receivers_key="prospect_receiver_emails",
+    subject_key="prospect_email_subject",
+    steps=_steps(
+        Step(
+            name="industries",
+            url="/chatbot/prospect/industries",
+            endpoint="industries",
+            column="INDUSTRY",
+            input_key="selected_options",
+            multi=True,
+            options=frozen({
+                "1": "Insurance",
+                "2": "Banking",
+                "3": "Finance",
+                "4": "Logistics",
+                "5": "Healthcare",
+                "6": "Manufacturing",
+                "7": "Ecommerce",
+                "8": "Technology",
+                "9": "Automotive",
+                "10": "Retail",
+                "11": "Others",
+            }),
+            other_options=frozenset({"11"}),
+            other_key="source_specification",
+            response=lambda value, row_id: ({"selected_industries": value, "code": 200, "row_id": row_id}, 200),
+            log_message="industry saved in DB - {value}",
+        ),
+        Step(
+            name="verticals",
+            url="/chatbot/prospect/verticals",
+            endpoint="verticals_prospect",
+            column="VERTICAL",
+            input_key="selected_option",
+            options=frozen({
+                "1": "Data and AI",
+                "2": "IT Infrastructure",
+                "3": "Microsoft dynamics",
+                "4": "Custom app",
+                "5": "Sales force",
+                "6": "Others",
+            }),
+            other_options=frozenset({"6"}),
+            other_key="source_specification",
+            response=lambda value, row_id: ({"selected_vertical": value, "code": 200, "row_id": row_id}, 200),
+            log_message="vertical saved in DB - {value}",
+        ),
+        # requirements for AI & custom app
+        _requirement_step("ai_requirement", "requirement", {
+            "1": "Develop a new project",
+            "2": "Enhance an existing project",
+            "3": "Project consultation or troubleshooting",
+            "4": "Others",
+        }, "4"),
+        # requirements for MD365
+        _requirement_step("md_requirement", "md_requirement", {
+            "1": "New Implementation / Re-implementation",
+            "2": "Version Upgrades",
+            "3": "Support Services",
+            "4": "Integration Services",
+            "5": "Others",
+        }, "5"),
+        # requirements for salesforce
+        _requirement_step("sf_requirement", "sf_requirement", {
+            "1": "New Implementation / Re-implementation",
+            "2": "Platform Migration",
+            "3": "Support Services",
+            "4": "Integration Services",
+            "5": "Others",
+        }, "5"),
+        # requirements for IT
+        _requirement_step("it_requirement", "it_requirement", {
+            "1": "Infrastructure support",
+            "2": "Maintenance and Troubleshooting",
+            "3": "Implementation and Migration",
+            "4": "Others",
+        }, "4"),
+        Step(
+            name="known_source",
+            url="/chatbot/prospect/known_source",
+            endpoint="known_source",
+            column="KNOWN_SOURCE",
+            input_key="selected_option",
+            options=frozen({
+                "1": "Google",
+                "2": "LinkedIn",
+                "3": "Email Campaign",
+                "4": "News Letter",
+                "5": "Reference",
+                "6": "Others",
+            }),
+            other_options=frozenset({"5", "6"}),
+            other_key="source_specification",
+            other_replaces=True,
+            invalid_response=INVALID_OPTION,
+            response=lambda value, row_id: ({"selected_known_source": value, "code": 200, "row_id": row_id}, 200),
+            log_message="known source saved in DB - {value}",
+        ),
+        _rating_step("/chatbot/prospect", "get_rating_new_client", "new client"),
+    ),
+)
+
+
+EXISTING_CLIENT = Persona(
+    name="existing_client",
+    table="EXISTING_CLIENT",
+    key_column="EID",
+    details_url="/chatbot/existing_client",
+    details_endpoint="existing_client_details",
+    details_message="User details collected successfully.",
+    feedback_url="/chatbot/existing_client/feedback",
+    feedback_endpoint="save_client_feedback",
+    batch_url="/chatbot/existing_client/batch",
+    batch_endpoint="existing_client_batch",
+    conversation_class=ExistingClientConversation,
+    column_map=EXISTING_CLIENT_COLUMNS,
+    email_message=existing_client_email_message,
+    receivers_key="existing_client_receiver_emails",
+    subject_key="existing_client_email_subject",
+    steps=_steps(
+        Step(
+            name="verticals",
+            url="/chatbot/existing_client/verticals",
+            endpoint="verticals_exixting_client",
+            column="VERTICAL",
+            input_key="selected_options",
+            multi=True,
+            options=frozen({
+                "1": "Data and AI",
+                "2": "Sales force",
+                "3": "Microsoft dynamics",
+                "4": "Custom app",
+                "5": "IT Infrastructure",
+                "6": "Others",
+            }),
+            other_options=frozenset({"6"}),
+            other_key="source_specification",
+            response=lambda value, row_id: ({"selected_verticals": value, "code": 200, "row_id": row_id}, 200),
+            log_message="existing client vertical saved in DB - {value}",
+        ),
+        Step(
+            name="issue_escalation",
+            url="/chatbot/existing_client/issue_escalation",
+            endpoint="issue_escalation",
+            column="ISSUE_ESCALATION",
+            input_key="selected_option",
+            options=frozen({"1": "Sales", "2": "Support"}),
+            invalid_response=INVALID_OPTION,
+            response=lambda value, row_id: ({"selected_isse_type": value, "code": 200, "row_id": row_id}, 200),
+            log_message="issue escalation selected - {value}",
+        ),
+        Step(
+            name="issue_type",
+            url="/chatbot/existing_client/issue_type",
+            endpoint="issue_type",
+            column="ISSUE_TYPE",
+            input_key="user_response",
+            options=frozen({"1": "Low", "2": "Medium", "3": "High"}),
+            invalid_response=INVALID_OPTION,
+            response=lambda value, row_id: ({"user_response": value, "row_id": row_id, "code": 200}, 200),
+            log_message="existing client issue type saved - {value}",
+        ),
+        Step(
+            name="collect_issue",
+            url="/chatbot/existing_client/collect_issue",
+            endpoint="collect_issue",
+            column="ISSUE_TEXT",
+            input_key="issue",
+            response=lambda value, row_id: ({"message": "client issue saved", "issue": value, "row_id": row_id}, 200),
+            log_message="client issue saved in Db",
+        ),
+        _rating_step("/chatbot/existing_client", "get_rating_existing_client", "existing client"),
+    ),
+)
+
+
+JOB_SEEKER = Persona(
+    name="job_seeker",
+    table="JOB_SEEKER",
+    key_column="JID",
+    details_url="/chatbot/job_seeker",
+    details_endpoint="job_seeker_details",
+    details_message="User details collected successfully.",
+    feedback_url="/chatbot/job_seeker/jobseeker_feedback",
+    feedback_endpoint="save_jobseeker_feedback",
+    batch_url="/chatbot/job_seeker/batch",
+    batch_endpoint="job_seeker_batch",
+    conversation_class=JobSeekerConversation,
+    column_map=JOB_SEEKER_COLUMNS,
+    email_message=job_seeker_email_message,
+    receivers_key="job_seeker_receiver_emails",
+    subject_key="job_seeker_email_subject",
+    steps=_steps(
+        Step(
+            name="category",
+            url="/chatbot/job_seeker/category",
+            endpoint="category",
+            column="CATEGORY",
+            input_key="user_type",
+            options=frozen({"1": "Fresher", "2": "Experienced", "3": "External consultant"}),
+            invalid_response=INVALID_OPTION,
+            response=lambda value, row_id: ({"user_type": value, "row_id": row_id, "code": 200}, 200),
+            log_message="job seeker category saved - {value}",
+        ),
+        Step(
+            name="verticals",
+            url="/chatbot/job_seeker/verticals",
+            endpoint="verticals_job_seeker",
+            column="VERTICAL",
+            input_key="selected_options",
+            multi=True,
+            options=frozen({
+                "1": "Data and AI",
+                "2": "IT Infrastructure",
+                "3": "Microsoft dynamics",
+                "4": "Custom app",
+                "5": "Salesforce",
+                "6": "Others",
+            }),
+            other_options=frozenset({"6"}),
+            other_key="source_specification",
+            response=lambda value, row_id: ({"selected_verticals": value, "code": 200, "row_id": row_id}, 200),
+            log_message="job seeker vertical saved in DB - {value}",
+        ),
+        Step(
+            name="interview_avail",
+            url="/chatbot/job_seeker_details/category/verticals/interview_avail",
+            endpoint="interview_available_check",
+            column="INTERVIEW_AVAILABLE",
+            input_key="user_response",
+            options=frozen({"1": "Yes", "2": "No"}),
+            invalid_response=INVALID_OPTION,
+            response=lambda value, row_id: ({"selected_interview_avail": value, "row_id": row_id, "code": 200}, 200),
+            log_message="interview availability checked - {value}",
+        ),
+        Step(
+            name="interview_mode",
+            url="/chatbot/job_seeker/interview_mode",
+            endpoint="interview_mode",
+            column="INTERVIEW_MODE",
+            input_key="user_response",
+            options=frozen({"1": "Virtual Interview", "2": "In person Interview"}),
+            invalid_response=INVALID_OPTION,
+            response=lambda value, row_id: ({"selected_interview_mode": value, "row_id": row_id, "code": 200}, 200),
+            log_message="interview mode collected - {value}",
+        ),
+        Step(
+            name="date_of_interview",
+            url="/chatbot/job_seeker/date_of_interview",
+            endpoint="date_of_interview",
+            column="TIME_AVAILABLE",
+            input_key="interview_date",
+            response=lambda value, row_id: ({"interview_date": value, "row_id": row_id, "code": 200}, 200),
+            log_message="intervie date available collected - {value}",
+        ),
+        Step(
+            name="notice_period",
+            url="/chatbot/job_seeker/notice_period",
+            endpoint="notice_period",
+            column="NOTICE_PERIOD",
+            input_key="joining_date",
+            options=frozen({
+                "1": "Immediate Joiner",
+                "2": "Below 30 days",
+                "3": "30 days",
+                "4": "60 days",
+                "5": "90 days",
+            }),
+            invalid_response=({"error": "Invalid input. Please select a valid option.", "code": 400}, 200),
+            response=lambda value, row_id: ({"joining_date": value, "row_id": row_id, "code": 200}, 200),
+            log_message="notice period collected - {value}",
+        ),
+        Step(
+            name="linkedin_url",
+            url="/chatbot/job_seeker/linkedin_url",
+            endpoint="collect_linkedin_url",
+            column="LINKEDIN_URL",
+            input_key="linkedin_url",
+            invalid_response=({"error": "No LinkedIn URL provided"}, 400),
+            response=lambda value, row_id: ({"message": "LinkedIn URL received", "row_id": row_id, "linkedin_url": value}, 200),
+            log_message="linkedin url collected - {value}",
+        ),
+        _rating_step("/chatbot/job_seeker", "get_rating_job_seeker", "job seeker"),
+    ),
+)
+
+
+PERSONAS = frozen((persona.name, persona) for persona in (PROSPECT, EXISTING_CLIENT, JOB_SEEKER))
+
+
+_stats_lock = threading.Lock()
+_stats = {}  # "persona.step" -> {"calls", "rejected", "seconds"}
+
+
+def _record(persona, name, started, rejected=False):
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        stats = _stats.setdefault(f"{persona.name}.{name}", {"calls": 0, "rejected": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["rejected"] += int(rejected)
+        stats["seconds"] += elapsed
+
+
+def get_flow_stats():
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def _flow_samples():
+    for name, stats in get_flow_stats().items():
+        yield (name, "saved"), stats["calls"] - stats["rejected"]
+        yield (name, "rejected"), stats["rejected"]
+
+
+Gauge("bot_flow_steps_total", "Conversation steps handled, by persona.step and outcome", ("step", "outcome"), _flow_samples, kind="counter")
+Gauge(
+    "bot_flow_step_seconds_total",
+    "Time spent in the conversation step handlers, by persona.step",
+    ("step",),
+    lambda: [((name,), stats["seconds"]) for name, stats in get_flow_stats().items()],
+    kind="counter",
+)
+
+
+def _option_label(step, option, data):
+    if option in step.other_options:
+        specification = data.get(step.other_key)
+        if step.other_replaces:
+            return specification
+        return step.options[option] + " : " + specification
+    return step.options[option]
+
+
+def resolve_step(step, data):
+    """
+    Validates one step's request body against its catalog. Returns the value
+    to store and the value to echo back (a list for multi-select steps), or
+    raises InvalidStep carrying the step's own error response.
+    """
+    if step.options is None:
+        value = data.get(step.input_key)
+        if step.invalid_response is not None and not value:
+            raise InvalidStep(*step.invalid_response)
+        return value, value
+
+    if step.multi:
+        # unknown options in a multi-select are dropped, as before
+        labels = [_option_label(step, option, data) for option in data.get(step.input_key, []) if option in step.options]
+        return ",".join(labels), labels
+
+    selected = data.get(step.input_key)
+    if selected not in step.options:
+        if step.invalid_response is None:
+            raise ValueError("Invalid selection")
+        raise InvalidStep(*step.invalid_response)
+    label = _option_label(step, selected, data)
+    if step.coded:
+        return int(selected), label
+    return label, label
+
+
+def decode_columns(persona, values):
+    """Returns a copy of a conversation's column -> value dict with option codes replaced by their labels."""
+    decoded = dict(values)
+    for column, options in persona.coded_columns.items():
+        code = decoded.get(column)
+        if code is not None:
+            decoded[column] = options.get(str(code), code)
+    return decoded
+
+
+def choose_client(data):
+    client_type = data.get("client_type")
+    if client_type not in CLIENT_TYPES:
+        message = "Invalid option. Please choose a valid option."
+        status_code = 400
+    else:
+        message = CLIENT_TYPES[client_type]
+        status_code = 200
+
+    logging.info(f"Client type found: {message}")
+    return {"message": message, "code": status_code}, 200
+
+
+def handle_step(persona, step, data):
+    started = time.perf_counter()
+    row_id = data.get("row_id")
+    try:
+        value, shown = resolve_step(step, data)
+    except InvalidStep as invalid:
+        _record(persona, step.name, started, rejected=True)
+        return invalid.body, invalid.status
+
+    save_step(persona.table, persona.key_column, row_id, step.column, value)
+    logging.info(step.log_message.format(value=shown if step.coded else value))
+    _record(persona, step.name, started)
+    return step.response(shown, row_id)
+
+
+async def handle_step_async(persona, step, data):
+    started = time.perf_counter()
+    row_id = data.get("row_id")
+    try:
+        value, shown = resolve_step(step, data)
+    except InvalidStep as invalid:
+        _record(persona, step.name, started, rejected=True)
+        return invalid.body, invalid.status
+
+    await save_step_async(persona.table, persona.key_column, row_id, step.column, value)
+    logging.info(step.log_message.format(value=shown if step.coded else value))
+    _record(persona, step.name, started)
+    return step.response(shown, row_id)
+
+
+def resolve_details(data):
+    """Returns (values in DETAILS_COLUMNS order, None) or (None, the rejection response)."""
+    name = data.get("name")
+    email = data.get("email")
+    contact = data.get("contact")
+    company = data.get("company")
+    ip = data.get("ip")  # this IP captured by frontend code
+
+    if not is_valid_name(name):
+        return None, ({"message": "Please enter a valid name.", "code": 400}, 200)
+
+    if not is_valid_email(email):
+        return None, ({"message": "Please enter a valid email address.", "code": 400}, 200)
+
+    if not is_valid_contact_number(contact):
+        return None, ({"message": "Please enter a valid contact number.", "code": 400}, 200)
+
+    # stored as a naive UTC DATETIME
+    created = get_current_utc_datetime().replace(microsecond=0, tzinfo=None)
+    return (created, ip, name, email, contact, company), None
+
+
+def details_query(persona):
+    return f"INSERT INTO {persona.table} ({', '.join(DETAILS_COLUMNS)}) VALUES ({', '.join(['%s'] * len(DETAILS_COLUMNS))})"
+
+
+def _details_saved(persona, row_id, values, started):
+    remember_conversation(persona.table, persona.key_column, row_id, dict(zip(DETAILS_COLUMNS, values)))
+    user_details = dict(zip(("ip_address", "name", "email", "contact", "company"), values[1:]))
+    logging.info(f"{persona.name} details saved in DB - {user_details}")
+    _record(persona, "details", started)
+    return {"message": persona.details_message, "row_id": row_id, "code": 200}, 200
+
+
+def handle_details(persona, data):
+    started = time.perf_counter()
+    values, rejection = resolve_details(data)
+    if rejection is not None:
+        _record(persona, "details", started, rejected=True)
+        return rejection
+
+    mydb = get_request_connection()
+    cursor = create_cursor_object(mydb)
+    cursor.execute(details_query(persona), values)
+    row_id = cursor.lastrowid  # Get the ID (primary key) of the inserted row
+    mydb.commit()
+    return _details_saved(persona, row_id, values, started)
+
+
+async def handle_details_async(persona, data):
+    started = time.perf_counter()
+    values, rejection = resolve_details(data)
+    if rejection is not None:
+        _record(persona, "details", started, rejected=True)
+        return rejection
+
+    async with async_pooled_connection() as mydb:
+        async with mydb.cursor() as cursor:
+            await cursor.execute(details_query(persona), values)
+            row_id = cursor.lastrowid
+        await mydb.commit()
+    return _details_saved(persona, row_id, values, started)
+
+
+def feedback_email(persona, conversation, smtp_credentials):
+    # the outbox row for a finished conversation, as enqueue_email arguments
+    return (
+        smtp_credentials["sender_email"],
+        smtp_credentials[persona.receivers_key],
+        smtp_credentials["cc_email"],
+        smtp_credentials[persona.subject_key],
+        persona.email_message(conversation),
+    )
+
+
+def _queue_feedback_email(persona, cursor, mydb, row_id, in_memory):
+    # the email is built from this conversation's own row, from memory when the buffer holds all of it;
+    # otherwise it is read on the request's primary connection, which sees the UPDATE just made
+    if in_memory is not None:
+        conversation = conversation_from_columns(persona.conversation_class, persona.column_map, decode_columns(persona, in_memory))
+    else:
+        conversation = fetch_conversation(
+            persona.conversation_class, persona.table, persona.column_map, row_id, mydb, partial(decode_columns, persona)
+        )
+    logging.info(f"{persona.name} conversation collected")
+
+    # queue the email in the same transaction as the feedback
+    if conversation:
+        smtp_credentials = get_smtp_credentials()
+        enqueue_email(cursor, *feedback_email(persona, conversation, smtp_credentials))
+
+
+async def _queue_feedback_email_async(persona, cursor, mydb, row_id, in_memory):
+    if in_memory is not None:
+        conversation = conversation_from_columns(persona.conversation_class, persona.column_map, decode_columns(persona, in_memory))
+    else:
+        conversation = await fetch_conversation_async(
+            persona.conversation_class, persona.table, persona.column_map, row_id, mydb, partial(decode_columns, persona)
+        )
+    logging.info(f"{persona.name} conversation collected")
+
+    if conversation:
+        smtp_credentials = await get_smtp_credentials_async()
+        await enqueue_email_async(cursor, *feedback_email(persona, conversation, smtp_credentials))
+
+
+def handle_feedback(persona, data):
+    started = time.perf_counter()
+    mydb = get_request_connection()
+    cursor = create_cursor_object(mydb)
+    feedback_text = data.get("text")
+    row_id = data.get("row_id")  # Get the user ID from the request
+
+    # buffered step answers and the feedback go out in one UPDATE, back into the buffer if the commit is never reached
+    with flush_conversation(cursor, persona.table, persona.key_column, row_id, {"FEEDBACK": feedback_text}) as in_memory:
+        _queue_feedback_email(persona, cursor, mydb, row_id, in_memory)
+        mydb.commit()
+    logging.info(f"{persona.name} feedback saved in Db")
+    _record(persona, "feedback", started)
+    return {"message": "Feedback saved successfully", "feedback": feedback_text, "row_id": row_id}, 200
+
+
+async def handle_feedback_async(persona, data):
+    started = time.perf_counter()
+    feedback_text = data.get("text")
+    row_id = data.get("row_id")
+
+    async with async_pooled_connection() as mydb:
+        async with mydb.cursor() as cursor:
+            async with flush_conversation_async(cursor, persona.table, persona.key_column, row_id, {"FEEDBACK": feedback_text}) as in_memory:
+                await _queue_feedback_email_async(persona, cursor, mydb, row_id, in_memory)
+                await mydb.commit()
+    logging.info(f"{persona.name} feedback saved in Db")
+    _record(persona, "feedback", started)
+    return {"message": "Feedback saved successfully", "feedback": feedback_text, "row_id": row_id}, 200
+
+
+def resolve_batch(persona, data):
+    """
+    Validates every step of a batch, e.g.
+        {"row_id": 7, "steps": [{"step": "category", "user_type": "2"},
+                                {"step": "notice_period", "joining_date": "3"},
+                                {"step": "feedback", "text": "thanks"}]}
+    with the same catalogs as the single-step routes. Returns the per-step
+    results (each the body its single-step route would have returned), the
+    column -> value answers and the number of rejected steps.
+    """
+    row_id = data.get("row_id")
+    results = []
+    values = {}
+    rejected = 0
+
+    for payload in data.get("steps") or []:
+        name = payload.get("step")
+        if name == "feedback":
+            values["FEEDBACK"] = payload.get("text")
+            body, status = {"message": "Feedback saved successfully", "feedback": payload.get("text"), "row_id": row_id}, 200
+            results.append({"step": name, "status": status, "response": body})
+            continue
+
+        step = persona.steps.get(name)
+        if step is None:
+            rejected += 1
+            results.append({"step": name, "status": 400, "response": {"message": "Unknown step.", "code": 400}})
+            continue
+
+        try:
+            value, shown = resolve_step(step, dict(payload, row_id=row_id))
+        except InvalidStep as invalid:
+            rejected += 1
+            results.append({"step": name, "status": invalid.status, "response": invalid.body})
+            continue
+        except ValueError as e:
+            # the single-step route answers these with a 500; here they only reject the batch
+            rejected += 1
+            results.append({"step": name, "status": 400, "response": {"message": str(e), "code": 400}})
+            continue
+
+        values[step.column] = value
+        body, status = step.response(shown, row_id)
+        results.append({"step": name, "status": status, "response": body})
+    return results, values, rejected
+
+
+def _batch_rejected(persona, row_id, results, rejected, started):
+    _record(persona, "batch", started, rejected=True)
+    message = "Nothing was saved, please correct the invalid steps." if rejected else "No steps provided."
+    return {"message": message, "code": 400, "row_id": row_id, "results": results}, 200
+
+
+def _batch_saved(persona, row_id, results, values, started):
+    logging.info(f"{persona.name} batch saved in DB - {', '.join(values)}")
+    _record(persona, "batch", started)
+    return {"message": "Steps saved successfully", "code": 200, "row_id": row_id, "results": results}, 200
+
+
+def handle_batch(persona, data):
+    """
+    Applies several steps of one conversation in a single request (see
+    resolve_batch). If any step is invalid nothing is written; otherwise all
+    answers go out in one UPDATE and one commit, with the notification email
+    queued in the same transaction when the batch includes the feedback.
+    """
+    started = time.perf_counter()
+    row_id = data.get("row_id")
+    results, values, rejected = resolve_batch(persona, data)
+    if rejected or not values:
+        return _batch_rejected(persona, row_id, results, rejected, started)
+
+    mydb = get_request_connection()
+    cursor = create_cursor_object(mydb)
+    with flush_conversation(cursor, persona.table, persona.key_column, row_id, values) as in_memory:
+        if "FEEDBACK" in values:
+            _queue_feedback_email(persona, cursor, mydb, row_id, in_memory)
+        mydb.commit()
+    if in_memory is not None and "FEEDBACK" not in values:
+        # the conversation continues, keep the row in memory for its feedback email
+        remember_conversation(persona.table, persona.key_column, row_id, in_memory)
+    return _batch_saved(persona, row_id, results, values, started)
+
+
+async def handle_batch_async(persona, data):
+    started = time.perf_counter()
+    row_id = data.get("row_id")
+    results, values, rejected = resolve_batch(persona, data)
+    if rejected or not values:
+        return _batch_rejected(persona, row_id, results, rejected, started)
+
+    async with async_pooled_connection() as mydb:
+        async with mydb.cursor() as cursor:
+            async with flush_conversation_async(cursor, persona.table, persona.key_column, row_id, values) as in_memory:
+                if "FEEDBACK" in values:
+                    await _queue_feedback_email_async(persona, cursor, mydb, row_id, in_memory)
+                await mydb.commit()
+    if in_memory is not None and "FEEDBACK" not in values:
+        remember_conversation(persona.table, persona.key_column, row_id, in_memory)
+    return _batch_saved(persona, row_id, results, values, started)
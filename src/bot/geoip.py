@@ -0,0 +1,185 @@
+"""
+Offline IP -> city resolver.
+
+`build_index` turns an IP range CSV into a binary index file, and
+`GeoIPIndex` memory-maps that file and answers lookups with a binary search,
+so every worker process shares the same pages from the OS cache.
+
+Accepted CSV layouts (header row required):
+    start_ip,end_ip,city             dotted/colon notation or integers
+    network,city                     CIDR blocks
+    network,geoname_id + --locations MaxMind GeoLite2-City-Blocks with
+                                     GeoLite2-City-Locations (geoname_id,city_name)
+
+IPv4 addresses are stored as IPv4-mapped IPv6 (::ffff:a.b.c.d) so both
+families live in one sorted 128-bit key space.
+
+Index layout (big endian):
+    header   magic(8s) record_count(I) strings_offset(Q)
+    records  start(16s) end(16s) city_offset(I), sorted by start
+    strings  length(H) utf-8 bytes, one per distinct city
+"""
+
+import io
+import sys
+import csv
+import mmap
+import struct
+import argparse
+import ipaddress
+import threading
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+
+MAGIC = b"BOTGEO01"
+HEADER = struct.Struct(">8sIQ")
+RECORD = struct.Struct(">16s16sI")
+STRING_LENGTH = struct.Struct(">H")
+
+
+def ip_key(ip):
+    address = ipaddress.ip_address(ip.strip() if isinstance(ip, str) else ip)
+    if address.version == 4:
+        address = ipaddress.IPv6Address((0xFFFF << 32) | int(address))
+    return address.packed
+
+
+def _parse_address(value):
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.IPv4Address(number) if number <= 0xFFFFFFFF else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+def _read_ranges(csv_path, locations_path=None):
+    cities_by_geoname = {}
+    if locations_path:
+        with open(locations_path, newline="", encoding="utf-8") as file_obj:
+            for row in csv.DictReader(file_obj):
+                cities_by_geoname[row["geoname_id"]] = row.get("city_name") or ""
+
+    with open(csv_path, newline="", encoding="utf-8") as file_obj:
+        for row in csv.DictReader(file_obj):
+            if "network" in row:
+                network = ipaddress.ip_network(row["network"].strip(), strict=False)
+                start, end = network[0], network[-1]
+            else:
+                start, end = _parse_address(row["start_ip"]), _parse_address(row["end_ip"])
+
+            if "city" in row:
+                city = row["city"]
+            elif "city_name" in row:
+                city = row["city_name"]
+            else:
+                city = cities_by_geoname.get(row.get("geoname_id") or "", "")
+            if city:
+                yield ip_key(start), ip_key(end), city.strip()
+
+
+def build_index(csv_path, index_path, locations_path=None):
+    try:
+        ranges = sorted(_read_ranges(csv_path, locations_path))
+
+        strings = io.BytesIO()
+        offsets = {}
+        records = io.BytesIO()
+        for start, end, city in ranges:
+            if city not in offsets:
+                # cut to the length field's limit on a character boundary, so lookups can decode it
+                encoded = city.encode("utf-8")[:0xFFFF].decode("utf-8", "ignore").encode("utf-8")
+                offsets[city] = strings.tell()
+                strings.write(STRING_LENGTH.pack(len(encoded)))
+                strings.write(encoded)
+            records.write(RECORD.pack(start, end, offsets[city]))
+
+        strings_offset = HEADER.size + RECORD.size * len(ranges)
+        with open(index_path, "wb") as file_obj:
+            file_obj.write(HEADER.pack(MAGIC, len(ranges), strings_offset))
+            file_obj.write(records.getvalue())
+            file_obj.write(strings.getvalue())
+
+        logging.info(f"GeoIP index built - {len(ranges)} ranges, {len(offsets)} cities -> {index_path}")
+        return len(ranges)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+class GeoIPIndex:
+    def __init__(self, index_path):
+        self.index_path = index_path
+        with open(index_path, "rb") as file_obj:
+            self._mm = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._strings_offset = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not a GeoIP index")
+
+    def _start(self, position):
+        offset = HEADER.size + position * RECORD.size
+        return self._mm[offset:offset + 16]
+
+    def lookup(self, ip):
+        try:
+            key = ip_key(ip)
+        except ValueError:
+            return None
+
+        # rightmost record whose start <= key; packed big endian bytes compare like the integers
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._start(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+
+        _, end, city_offset = RECORD.unpack_from(self._mm, HEADER.size + (lo - 1) * RECORD.size)
+        if key > end:
+            return None
+        position = self._strings_offset + city_offset
+        (length,) = STRING_LENGTH.unpack_from(self._mm, position)
+        start = position + STRING_LENGTH.size
+        return self._mm[start:start + length].decode("utf-8")
+
+    def close(self):
+        self._mm.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(index_path):
+    with _indexes_lock:
+        index = _indexes.get(index_path)
+        if index is None:
+            index = _indexes[index_path] = GeoIPIndex(index_path)
+            logging.info(f"GeoIP index loaded - {index.count} ranges from {index_path}")
+        return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the offline GeoIP index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile an IP range CSV into an index file")
+    build.add_argument("csv_path")
+    build.add_argument("index_path")
+    build.add_argument("--locations", help="MaxMind city locations CSV (geoname_id,city_name)")
+    lookup = commands.add_parser("lookup", help="resolve IPs against an index file")
+    lookup.add_argument("index_path")
+    lookup.add_argument("ips", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(build_index(args.csv_path, args.index_path, args.locations))
+    else:
+        index = get_index(args.index_path)
+        for ip in args.ips:
+            print(ip, index.lookup(ip))
+
+
+if __name__ == "__main__":
+    main()
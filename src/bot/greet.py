@@ -1,29 +1,217 @@
-import os
 import sys
+import time
+import asyncio
+import threading
+import ipaddress
 import requests
-from dotenv import load_dotenv
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
 from src.bot.exception import CustomException
 from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.geoip import get_index
+from src.bot.metrics import phase, Gauge
 
+GREETING = "Hello, buddy! Welcome to Datanetiix!"
 
-def configure():
-    load_dotenv()
+# one keep-alive session for ipapi / openweathermap instead of a new TCP+TLS handshake per call
+http = requests.Session()
+http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=settings.greeting.workers))
+http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=settings.greeting.workers))
 
+_executor = ThreadPoolExecutor(max_workers=settings.greeting.workers, thread_name_prefix="greeting")
+# stale entries refresh on their own pool so a refresh never queues behind the requests waiting for it
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="greeting-refresh")
+_enrichment_lock = threading.RLock()
+_inflight_enrichment = {}  # ip -> Future
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LookupCache:
+    """
+    Bounded LRU cache in front of a slow upstream lookup.
+
+    Entries younger than `ttl` are served as is. Entries up to `stale` seconds
+    past that are still served, while one background call refreshes them
+    (stale-while-revalidate). Concurrent misses for the same key wait on a
+    single upstream call instead of each making their own.
+    """
+
+    def __init__(self, name, maxsize, ttl, stale=0.0, cache_none=False):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale = stale
+        self.cache_none = cache_none
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> _Call
+        self._async_inflight = {}  # key -> asyncio.Task, for get_async on the event loop
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "merged": 0,
+            "upstream_calls": 0,
+            "upstream_errors": 0,
+            "upstream_seconds": 0.0,
+            "upstream_max_seconds": 0.0,
+        }
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[1]
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                if age < self.ttl + self.stale:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = _Call()
+                        _refresh_executor.submit(self._load, key, loader)
+                    return entry[0]
+            self._stats["misses"] += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+            else:
+                self._stats["merged"] += 1
+
+        if leader:
+            self._load(key, loader)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def _load(self, key, loader):
+        with self._lock:
+            call = self._inflight[key]
+        started = time.monotonic()
+        try:
+            call.value = loader(key)
+        except Exception as e:
+            call.error = e
+        self._store(key, call.value, call.error, time.monotonic() - started)
+        with self._lock:
+            del self._inflight[key]
+        call.done.set()
+
+    def _store(self, key, value, error, elapsed):
+        with self._lock:
+            self._stats["upstream_calls"] += 1
+            self._stats["upstream_seconds"] += elapsed
+            self._stats["upstream_max_seconds"] = max(self._stats["upstream_max_seconds"], elapsed)
+            if error is not None:
+                self._stats["upstream_errors"] += 1
+            elif value is not None or self.cache_none:
+                self._entries[key] = (value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    async def get_async(self, key, loader):
+        """
+        Same policy as get() for a coroutine `loader`. Concurrent misses on the
+        event loop await one upstream call; stale entries refresh in a task.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[1]
+                if age < self.ttl:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0]
+                if age < self.ttl + self.stale:
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key not in self._async_inflight:
+                        task = self._async_inflight[key] = asyncio.ensure_future(self._load_async(key, loader))
+                        # nobody awaits a refresh, so collect its error here
+                        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+                    return entry[0]
+            self._stats["misses"] += 1
+            task = self._async_inflight.get(key)
+            if task is None:
+                task = self._async_inflight[key] = asyncio.ensure_future(self._load_async(key, loader))
+            else:
+                self._stats["merged"] += 1
+        # shielded so a caller giving up does not cancel the load the others wait on
+        return await asyncio.shield(task)
+
+    async def _load_async(self, key, loader):
+        started = time.monotonic()
+        value, error = None, None
+        try:
+            value = await loader(key)
+        except Exception as e:
+            error = e
+        self._store(key, value, error, time.monotonic() - started)
+        self._async_inflight.pop(key, None)
+        if error is not None:
+            raise error
+        return value
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), maxsize=self.maxsize)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        calls = stats["upstream_calls"]
+        stats["upstream_avg_seconds"] = stats["upstream_seconds"] / calls if calls else 0.0
+        return stats
+
+
+def location_url(ip):
+    return f"https://ipapi.co/{ip}/city/"
+
+
+def weather_url(location):
+    return f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={settings.greeting.weather_api_key}"
+
+
+# bodies ipapi answers instead of a city; raising keeps them out of the location cache
+LOCATION_ERRORS = ("ratelimited", "undefined", "none", "reserved ip address", "invalid ip address")
+
+
+def parse_location(text):
+    city = text.strip()
+    if not city or len(city) > 100 or city.startswith(("{", "<")) or city.lower() in LOCATION_ERRORS:
+        raise ValueError(f"no city in the location response {city[:100]!r}")
+    return city
+
+
+def parse_weather(response):
+    # a failed lookup raises instead of returning None, so it is counted and never cached
+    if response.get("cod") != 200:
+        raise ValueError(f"weather lookup failed: {response.get('cod')} {response.get('message')}")
+    weather_desc = response["weather"][0]["main"].lower()
+    logging.info(f"current weather condition is {weather_desc}")
+    return weather_desc
 
-def get_ip_address():
-    try:
-        configure()
-        ip = requests.get(os.getenv('ip_api_key')).text
-        logging.info("ip address collected successfullyyyy")
-        return ip
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
-        raise CustomException(e,sys)
-    
 
 def get_location(ip):
     try:
-        location = requests.get(f"https://ipapi.co/{ip}/city/").text
+        with phase("greeting_location_lookup"):
+            response = http.get(location_url(ip), timeout=settings.greeting.http_timeout)
+            response.raise_for_status()
+        location = parse_location(response.text)
         logging.info("Location collected successfully")
         return location
     except Exception as e:
@@ -33,16 +221,10 @@ def get_location(ip):
 
 def get_weather(location):
     try:
-        configure()
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid={os.getenv('weather_api_key')}"
-        response = requests.get(url).json()
-
-        if response.get("cod") == 200:
-            weather_desc = response["weather"][0]["main"].lower()
-            logging.info(f"current weather condition is {weather_desc}")
-            return weather_desc
-        else:
-            return None
+        with phase("greeting_weather_lookup"):
+            response = http.get(weather_url(location), timeout=settings.greeting.http_timeout)
+            response.raise_for_status()
+        return parse_weather(response.json())
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e,sys)
@@ -66,10 +248,212 @@ def weather_greeting(weather_desc):
     except Exception as e:
         logging.error(f"An error occurred: {e}")
         raise CustomException(e,sys)
+
+
+_greeting = settings.greeting
+location_cache = LookupCache("location", _greeting.location_cache_size, _greeting.location_cache_ttl, _greeting.location_cache_stale)
+weather_cache = LookupCache("weather", _greeting.weather_cache_size, _greeting.weather_cache_ttl, _greeting.weather_cache_stale)
+
+
+def get_local_location(ip):
+    try:
+        with phase("greeting_geoip_local"):
+            location = get_index(settings.greeting.geoip_index_path).lookup(ip)
+        logging.info("Location resolved from local GeoIP index")
+        return location
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+def lookup_location(ip):
+    if settings.greeting.geoip_resolver == "local":
+        # an mmap lookup is cheaper than the cache in front of it
+        return get_local_location(ip)
+    return location_cache.get(ip, get_location)
+
+
+def lookup_weather(location):
+    if not location:
+        return None
+    return weather_cache.get(location, get_weather)
+
+
+def get_greeting_cache_stats():
+    return {"location": location_cache.stats(), "weather": weather_cache.stats()}
+
+
+def _cache_samples(*fields):
+    def samples():
+        for cache, stats in get_greeting_cache_stats().items():
+            for field in fields:
+                yield ((cache, field) if len(fields) > 1 else (cache,)), stats[field]
+    return samples
+
+
+Gauge(
+    "bot_greeting_cache_lookups_total",
+    "Greeting cache lookups by result; merged misses waited on another caller's upstream call",
+    ("cache", "result"),
+    _cache_samples("hits", "stale_hits", "misses", "merged"),
+    kind="counter",
+)
+Gauge("bot_greeting_cache_hit_ratio", "Fresh and stale hits over all greeting cache lookups", ("cache",), _cache_samples("hit_ratio"))
+Gauge("bot_greeting_cache_entries", "Entries held by the greeting caches", ("cache",), _cache_samples("size"))
+Gauge("bot_greeting_upstream_calls_total", "Location and weather API calls made by the caches", ("cache",), _cache_samples("upstream_calls"), kind="counter")
+Gauge("bot_greeting_upstream_errors_total", "Location and weather API calls that failed", ("cache",), _cache_samples("upstream_errors"), kind="counter")
+Gauge(
+    "bot_greeting_upstream_seconds_total",
+    "Time spent in location and weather API calls; divide by the calls for the average",
+    ("cache",),
+    _cache_samples("upstream_seconds"),
+    kind="counter",
+)
+Gauge("bot_greeting_upstream_max_seconds", "Slowest location and weather API call so far", ("cache",), _cache_samples("upstream_max_seconds"))
+
+
+def enrich_greeting(ip):
+    # the lookups depend on each other (ip -> city -> weather), so they run in order
+    if not ipaddress.ip_address(ip).is_global:
+        # private and loopback visitors have no city to look up
+        return None, None
+    ip_location = lookup_location(ip)
+    weather_desc = lookup_weather(ip_location)
+    return ip_location, weather_greeting(weather_desc)
+
+
+def _enrichment_done(key, future):
+    with _enrichment_lock:
+        _inflight_enrichment.pop(key, None)
+    if future.exception() is not None:
+        logging.error(f"greeting enrichment failed: {future.exception()}")
+
+
+def build_greeting(ip=None, deadline=None):
+    """
+    Returns the greeting message, enriched with city and weather when the
+    lookups finish within `deadline` seconds. Lookups that miss the deadline
+    keep running in the background and fill the location and weather caches
+    for the next visitor.
+    """
+    deadline = settings.greeting.deadline if deadline is None else deadline
+    if not ip:
+        # without the visitor's address there is nothing to geolocate
+        return GREETING
+
+    with _enrichment_lock:
+        future = _inflight_enrichment.get(ip)
+        if future is None:
+            future = _executor.submit(enrich_greeting, ip)
+            _inflight_enrichment[ip] = future
+            future.add_done_callback(lambda done: _enrichment_done(ip, done))
+
+    try:
+        ip_location, weather_info_greet = future.result(timeout=deadline)
+    except FutureTimeoutError:
+        logging.info(f"greeting enrichment missed the {deadline}s deadline, sending plain greeting")
+        return GREETING
+    except Exception as e:
+        logging.error(f"greeting enrichment failed: {e}")
+        return GREETING
+
+    return compose_greeting(ip_location, weather_info_greet)
+
+
+def compose_greeting(ip_location, weather_info_greet):
+    if ip_location and weather_info_greet:
+        return f"{GREETING} We hope you're connecting from {ip_location}. {weather_info_greet}"
+    return GREETING
+
+
+_async_http = None
+_async_enrichment = {}  # ip -> asyncio.Task, on the serving event loop
+
+
+def get_async_http():
+    # httpx is only needed by the asyncio serving mode (src/bot/asgi.py)
+    global _async_http
+    if _async_http is None:
+        import httpx
+        _async_http = httpx.AsyncClient(
+            timeout=settings.greeting.http_timeout,
+            limits=httpx.Limits(max_connections=settings.greeting.workers * 4, max_keepalive_connections=settings.greeting.workers),
+        )
+    return _async_http
+
+
+async def close_async_http():
+    global _async_http
+    if _async_http is not None:
+        await _async_http.aclose()
+        _async_http = None
+
+
+async def get_location_async(ip):
+    try:
+        with phase("greeting_location_lookup"):
+            response = await get_async_http().get(location_url(ip))
+            response.raise_for_status()
+        location = parse_location(response.text)
+        logging.info("Location collected successfully")
+        return location
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+async def get_weather_async(location):
+    try:
+        with phase("greeting_weather_lookup"):
+            response = await get_async_http().get(weather_url(location))
+            response.raise_for_status()
+        return parse_weather(response.json())
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+async def enrich_greeting_async(ip):
+    if not ipaddress.ip_address(ip).is_global:
+        return None, None
+    if settings.greeting.geoip_resolver == "local":
+        ip_location = get_local_location(ip)
+    else:
+        ip_location = await location_cache.get_async(ip, get_location_async)
+    weather_desc = await weather_cache.get_async(ip_location, get_weather_async) if ip_location else None
+    return ip_location, weather_greeting(weather_desc)
+
+
+def _async_enrichment_done(key, task):
+    _async_enrichment.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"greeting enrichment failed: {task.exception()}")
+
+
+async def build_greeting_async(ip=None, deadline=None):
+    # build_greeting for the event loop: same caches, deadline and message
+    deadline = settings.greeting.deadline if deadline is None else deadline
+    if not ip:
+        return GREETING
+
+    task = _async_enrichment.get(ip)
+    if task is None:
+        task = _async_enrichment[ip] = asyncio.ensure_future(enrich_greeting_async(ip))
+        task.add_done_callback(lambda done: _async_enrichment_done(ip, done))
+
+    try:
+        ip_location, weather_info_greet = await asyncio.wait_for(asyncio.shield(task), deadline)
+    except asyncio.TimeoutError:
+        logging.info(f"greeting enrichment missed the {deadline}s deadline, sending plain greeting")
+        return GREETING
+    except Exception as e:
+        logging.error(f"greeting enrichment failed: {e}")
+        return GREETING
+    return compose_greeting(ip_location, weather_info_greet)
     
 
 if __name__=="__main__":
-    ip = get_ip_address()
+    ip = sys.argv[1] if len(sys.argv) > 1 else "8.8.8.8"
     print(ip)
     ip_location = get_location(ip)
     print(ip_location)
@@ -1,19 +1,273 @@
+"""
+Logging setup shared by every module (`from src.bot.logger import logging`).
+
+Request threads never touch the log file. The root logger has a single
+QueueHandler that tags each record with its request id, applies the
+per-module levels and the rate limit, and puts it on an in-memory queue. A
+QueueListener thread formats the records and writes them to the file.
+
+Each process writes its own file, logs/bot-<pid>.log by default, so gunicorn
+workers never share one. A file is rotated when it reaches log_max_bytes or
+at log_rotate_when, whichever comes first. The old file is gzipped to
+bot-<pid>.log.<timestamp>.gz. Archives older than log_retention_days are
+deleted, and so are the oldest ones beyond log_max_archives. Together these
+keep disk and inode usage bounded. Rotation and cleanup run on the listener
+thread, never on a request. log_file=- sends everything to stderr instead,
+one shared sink for a process manager or container runtime to collect.
+
+Settings (environment or .env, read by src/bot/config.py):
+    log_level             root level, default INFO
+    log_levels            per-module levels, e.g. "database=WARNING,greet=DEBUG"
+    log_format            "text" (default) or "json", one object per line
+    log_queue_size        records held before new ones are dropped, default 10000
+    log_rate_limit        INFO/DEBUG records kept per call site per window, 0 = unlimited, default 50
+    log_rate_window       window in seconds, default 10
+    log_dir               directory for log files, default ./logs
+    log_file              file name, "{pid}" is replaced by the process id, default bot-{pid}.log, "-" = stderr
+    log_max_bytes         rotate at this size, 0 = never on size, default 10485760 (10 MB)
+    log_rotate_when       time based rotation (S, M, H, D, midnight, W0-W6), default midnight
+    log_rotate_interval   multiples of log_rotate_when, default 1
+    log_compress          gzip rotated files, default true
+    log_retention_days    delete archives older than this, default 14
+    log_max_archives      archives kept per log_dir at most, default 50
+
+Warnings and errors are never rate limited. When a call site has been
+throttled, its next kept record says how many were suppressed.
+"""
+import atexit
+import gzip
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import shutil
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from src.bot.config import settings
 
-LOG_FILE = f"{datetime.now().strftime('%d_%m_%y_%H_%M_%S')}.log"
-logs_path = os.path.join(os.getcwd(), "logs")
+logs_path = settings.log.dir
 os.makedirs(logs_path, exist_ok=True)
 
-LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE)
+LOG_FILE = settings.log.file
+LOG_FILE_PATH = None  # this process's current file, set by start_listener
+
+TEXT_FORMAT = "[%(asctime)s: %(levelname)s: %(module)s: %(request_id)s: %(message)s]"
+
+# set per request by src/bot/tracing.py, "-" outside a request
+request_id = ContextVar("request_id", default="-")
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class ModuleLevelFilter(logging.Filter):
+    # modules log through the root logger, so levels are matched on the module name
+    def __init__(self, levels, default):
+        super().__init__()
+        self.levels = levels
+        self.default = default
+
+    def filter(self, record):
+        return record.levelno >= self.levels.get(record.module, self.default)
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, limit, window):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._sites = {}  # (pathname, lineno) -> [window start, kept, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.limit <= 0 or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get((record.pathname, record.lineno))
+            if site is None:
+                site = self._sites[(record.pathname, record.lineno)] = [now, 0, 0]
+            elif now - site[0] >= self.window:
+                site[0], site[1] = now, 0
+            if site[1] >= self.limit:
+                site[2] += 1
+                return False
+            site[1] += 1
+            suppressed, site[2] = site[2], 0
+        if suppressed and not record.args:
+            record.msg = f"{record.msg} ({suppressed} similar suppressed)"
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # a full queue drops the record instead of blocking the request thread
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "module": record.module,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(spec):
+    levels = {}
+    for item in spec.split(","):
+        module, _, level = item.partition("=")
+        if module.strip() and level.strip():
+            levels[module.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class RotatingLogHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotates on time or size, whichever comes first, then compresses and prunes the archives."""
+
+    def __init__(self, filename, prefix, when, interval, max_bytes, compress, retention_days, max_archives):
+        super().__init__(filename, when=when, interval=interval, encoding="utf-8", delay=True)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.retention_days = retention_days
+        self.max_archives = max_archives
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        # checked before the write, so a file can end one record past max_bytes
+        return self.stream.tell() >= self.max_bytes
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            archive = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}"
+            suffix = 1
+            while os.path.exists(archive) or os.path.exists(archive + ".gz"):
+                archive = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}"
+                suffix += 1
+            os.rename(self.baseFilename, archive)
+            if self.compress:
+                with open(archive, "rb") as source, gzip.open(archive + ".gz", "wb") as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(archive)
+        self.prune()
+        self.rolloverAt = self.computeRollover(int(time.time()))
+
+    def prune(self):
+        directory = os.path.dirname(self.baseFilename)
+        cutoff = time.time() - self.retention_days * 86400
+        archives = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.startswith(self.prefix) or path == self.baseFilename or not os.path.isfile(path):
+                continue
+            try:
+                modified = os.path.getmtime(path)
+                if modified < cutoff:
+                    # expired archives, and the files of workers that exited long ago
+                    os.remove(path)
+                elif ".log." in name:
+                    archives.append((modified, path))
+            except OSError:
+                continue  # removed by another worker's prune
+        archives.sort()
+        for _, path in archives[:max(0, len(archives) - self.max_archives)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _file_handler():
+    global LOG_FILE_PATH
+    if LOG_FILE == "-":
+        handler = logging.StreamHandler(sys.stderr)
+    else:
+        LOG_FILE_PATH = os.path.join(logs_path, LOG_FILE.replace("{pid}", str(os.getpid())))
+        handler = RotatingLogHandler(
+            LOG_FILE_PATH,
+            prefix=LOG_FILE.split("{pid}")[0],
+            when=settings.log.rotate_when,
+            interval=settings.log.rotate_interval,
+            max_bytes=settings.log.max_bytes,
+            compress=settings.log.compress,
+            retention_days=settings.log.retention_days,
+            max_archives=settings.log.max_archives,
+        )
+        handler.prune()
+    handler.setFormatter(JsonFormatter() if settings.log.format == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+_log_queue = queue.Queue(maxsize=settings.log.queue_size)
+_listener = None
+
+
+def start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_log_queue, _file_handler(), respect_handler_level=True)
+    _listener.start()
+
+
+def stop_listener():
+    # writes out whatever is still queued
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def restart_listener():
+    # a forked worker inherits the queue but not the listener thread, and gets its own file
+    global _listener, _log_queue
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.close()  # the parent's file, still open in this process
+    _log_queue = queue.Queue(maxsize=settings.log.queue_size)
+    _queue_handler.queue = _log_queue
+    _listener = None
+    start_listener()
+
+
+_default_level = logging.getLevelName(settings.log.level)
+_module_levels = parse_levels(settings.log.levels)
+
+_queue_handler = DroppingQueueHandler(_log_queue)
+# filters run in the calling thread, the only place the request id is visible
+_queue_handler.addFilter(RequestIdFilter())
+_queue_handler.addFilter(ModuleLevelFilter(_module_levels, _default_level))
+_queue_handler.addFilter(RateLimitFilter(settings.log.rate_limit, settings.log.rate_window))
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[%(asctime)s: %(levelname)s: %(module)s: %(message)s]",
-    level=logging.INFO,
-)
+_root = logging.getLogger()
+# low enough for the most verbose module, ModuleLevelFilter does the rest
+_root.setLevel(min([_default_level, *_module_levels.values()]))
+_root.addHandler(_queue_handler)
+start_listener()
+atexit.register(stop_listener)
 
 #testing log
 # if __name__=="__main__":
-#   logging.info('logging has started')
\ No newline at end of file
+#   logging.info('logging has started')
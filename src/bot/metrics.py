@@ -0,0 +1,208 @@
+"""
+In-process metrics in the Prometheus text format.
+
+    phase("db_query")             time a block into bot_phase_seconds{phase=...}
+    REQUEST_SECONDS / ...         per-route latency and error counts (init_app)
+    Gauge(..., callback)          values read at scrape time (pool usage, outbox depth, cache and SMTP stats)
+
+Everything is kept in plain dicts behind one lock per metric, so recording
+costs a bisect and a few additions. render() builds the exposition text
+only when /metrics is scraped. Values are per process: under bot-serve
+each gunicorn worker answers /metrics with its own numbers.
+"""
+import time
+import threading
+from bisect import bisect_left
+from flask import g, request, Response
+from src.bot.logger import logging, DroppingQueueHandler
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}  # labels -> [per bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(labels)
+            if child is None:
+                child = self._children[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][index] += 1
+            child[1] += value
+            child[2] += 1
+
+    def samples(self):
+        with self._lock:
+            children = {labels: (list(child[0]), child[1], child[2]) for labels, child in self._children.items()}
+        for labels, (counts, total, count) in sorted(children.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Gauge:
+    """A metric read at scrape time: `callback()` returns (labels tuple, value) pairs."""
+
+    def __init__(self, name, documentation, labelnames, callback, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.kind = kind
+        REGISTRY.append(self)
+
+    def samples(self):
+        try:
+            values = list(self.callback())
+        except Exception as e:
+            logging.error(f"metric {self.name} could not be collected: {e}")
+            return
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("bot_http_request_seconds", "HTTP request latency by route", ("route", "method"))
+REQUESTS = Counter("bot_http_requests_total", "HTTP responses by route and status", ("route", "method", "status"))
+REQUEST_ERRORS = Counter("bot_http_errors_total", "HTTP 4xx/5xx responses by route", ("route", "status"))
+PHASE_SECONDS = Histogram("bot_phase_seconds", "Time spent in DB, SMTP and greeting lookup phases", ("phase",))
+PHASE_ERRORS = Counter("bot_phase_errors_total", "Phases that raised", ("phase",))
+Gauge(
+    "bot_log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+    (),
+    lambda: [((), DroppingQueueHandler.dropped)],
+    kind="counter",
+)
+
+
+_phase_listeners = []
+
+
+def add_phase_listener(listener):
+    # listener(name, started, seconds, failed) is called as each phase ends, e.g. by src/bot/tracing.py
+    _phase_listeners.append(listener)
+
+
+class Phase:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        PHASE_SECONDS.observe(seconds, self.name)
+        if exc_type is not None:
+            PHASE_ERRORS.inc(self.name)
+        for listener in _phase_listeners:
+            listener(self.name, self.started, seconds, exc_type is not None)
+        return False
+
+
+def phase(name):
+    # works in sync code and across awaits inside one coroutine
+    return Phase(name)
+
+
+def observe_request(route, method, status, seconds):
+    REQUEST_SECONDS.observe(seconds, route, method)
+    REQUESTS.inc(route, method, str(status))
+    if status >= 400:
+        REQUEST_ERRORS.inc(route, str(status))
+
+
+def route_of(request_obj):
+    # the URL rule, not the path, so label cardinality stays bounded
+    rule = request_obj.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop("metrics_started", None)
+    if started is not None:
+        observe_request(route_of(request), request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+
+def metrics_view():
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+def init_app(app):
+    # register before other before_request hooks so rejected requests are timed too
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
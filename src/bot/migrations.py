@@ -0,0 +1,393 @@
+"""
+Versioned schema migrations for the MySQL database.
+
+    bot-migrate status                    # or: python -m src.bot.migrations status
+    bot-migrate apply --dry-run           # print what would run, change nothing
+    bot-migrate apply                     # run every pending migration
+    bot-migrate apply --target 2          # stop after version 2
+
+Migrations run in version order. Each one that finishes is recorded in
+SCHEMA_VERSION and never runs again. A migration also checks
+information_schema before every change. A run that stopped halfway can
+therefore simply be started again, and a database built by create_tables
+(already in the current shape) only gets its versions recorded. Only one
+run at a time: a second bot-migrate exits while the first holds the
+"bot_schema_migrations" lock.
+
+Changes are made online so live chats keep writing while a migration runs:
+    ALTER TABLE ... ALGORITHM=INPLACE, LOCK=NONE
+        MySQL refuses a change it cannot make without blocking writes, it
+        never silently takes the lock (--allow-locking drops the clause)
+    lock_wait_timeout
+        an ALTER waiting for the table's metadata lock holds up every query
+        queued behind it, so it gives up after a few seconds and retries
+    backfills
+        UPDATEs run in primary key ranges of --batch-size rows, one commit
+        per range, with --pause seconds between ranges
+
+To add a migration, write a function taking the Runner and append it to
+MIGRATIONS with the next version number. Released versions are never
+edited or renumbered.
+"""
+import sys
+import time
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.database import connect_to_mysql_database, create_cursor_object, CONVERSATION_INDEXES
+
+LOCK_NAME = "bot_schema_migrations"
+LOCK_WAIT_TIMEOUT_ERROR = 1205
+
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS SCHEMA_VERSION(
+        VERSION INT PRIMARY KEY,
+        NAME VARCHAR(255) NOT NULL,
+        APPLIED_AT DATETIME NOT NULL,
+        STATEMENTS INT NOT NULL,
+        SECONDS DOUBLE NOT NULL
+    )
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable  # apply(runner)
+
+
+class Runner:
+    """Runs (or, in a dry run, only prints) the statements of one migration."""
+
+    def __init__(self, mydb, dry_run=False, online=True, batch_size=5000, pause=0.0, lock_wait_timeout=5, retries=10, old_code_quiet=600):
+        self.mydb = mydb
+        self.cursor = create_cursor_object(mydb, buffered=True)
+        self.dry_run = dry_run
+        self.online = online
+        self.batch_size = batch_size
+        self.pause = pause
+        self.retries = retries
+        self.old_code_quiet = old_code_quiet
+        self.statements = []
+        if not dry_run:
+            # only this session: the app's own connections keep the server default
+            self.cursor.execute("SET SESSION lock_wait_timeout = %s", (lock_wait_timeout,))
+
+    def columns(self, table):
+        # column -> (data type, nullable); empty when the table does not exist
+        self.cursor.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,),
+        )
+        return {name.upper(): (data_type.lower(), nullable == "YES") for name, data_type, nullable in self.cursor.fetchall()}
+
+    def indexes(self, table):
+        self.cursor.execute(
+            "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,),
+        )
+        return {name.upper() for (name,) in self.cursor.fetchall()}
+
+    def _record(self, statement, params=()):
+        self.statements.append(statement)
+        if self.dry_run:
+            print(statement + ";" + (f"  -- {params}" if params else ""))
+
+    def alter(self, table, clauses):
+        if not clauses:
+            return
+        statement = f"ALTER TABLE {table} " + ", ".join(clauses)
+        if self.online:
+            statement += ", ALGORITHM=INPLACE, LOCK=NONE"
+        self._record(statement)
+        if self.dry_run:
+            return
+        for attempt in range(1, self.retries + 1):
+            try:
+                self.cursor.execute(statement)
+                return
+            except Exception as e:
+                if getattr(e, "errno", None) != LOCK_WAIT_TIMEOUT_ERROR or attempt == self.retries:
+                    raise
+                # a long transaction holds the table, step aside so the queries queued behind us can run
+                logging.warning(f"{table} is busy, retrying the ALTER ({attempt}/{self.retries})")
+                time.sleep(min(30, 2 ** attempt))
+
+    def backfill(self, table, key, assignment, params=(), where=None):
+        """UPDATE table SET <assignment> [WHERE <where>] in primary key ranges of batch_size rows."""
+        statement = f"UPDATE {table} SET {assignment} WHERE " + (f"({where}) AND " if where else "") + f"{key} BETWEEN %s AND %s"
+        self._record(statement, params)
+        if self.dry_run:
+            return
+        self.cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table}")
+        low, high = self.cursor.fetchone()
+        if low is None:
+            return
+        updated = 0
+        for start in range(low, high + 1, self.batch_size):
+            self.cursor.execute(statement, tuple(params) + (start, start + self.batch_size - 1))
+            updated += self.cursor.rowcount
+            self.mydb.commit()
+            if self.pause:
+                time.sleep(self.pause)
+        logging.info(f"{table}: {updated} rows backfilled")
+
+    def execute(self, statement):
+        # statements safe to repeat, e.g. CREATE TABLE IF NOT EXISTS
+        self._record(" ".join(statement.split()))
+        if not self.dry_run:
+            self.cursor.execute(statement)
+
+    def count(self, query, params=()):
+        if self.dry_run:
+            return 0
+        self.cursor.execute(query, params)
+        return self.cursor.fetchone()[0]
+
+
+def _personas():
+    # imported here: flow pulls in the whole app, the migrations only need its catalogs
+    from src.bot.flow import PERSONAS
+    return PERSONAS.values()
+
+
+def add_step_columns(run):
+    # columns of steps added to the flow after a table was created (INTERVIEW_MODE, LINKEDIN_URL, ...)
+    for persona in _personas():
+        columns = run.columns(persona.table)
+        if not columns:
+            continue
+        missing = sorted({step.column for step in persona.steps.values()} - set(columns))
+        run.alter(persona.table, [
+            f"ADD COLUMN {column} {'TINYINT UNSIGNED' if column in persona.coded_columns else 'VARCHAR(255)'} NULL"
+            for column in missing
+        ])
+
+
+def _code_case(persona, column, source):
+    # labels written by the old code and option numbers the new code writes while the column is still text
+    options = persona.coded_columns[column]
+    pairs = [(label, int(code)) for code, label in options.items()] + [(code, int(code)) for code in options]
+    cases = " ".join(["WHEN %s THEN %s"] * len(pairs))
+    return f"CASE TRIM({source}) {cases} END", tuple(item for pair in pairs for item in pair)
+
+
+def _convert(run, persona, relabelled, has_created_on):
+    # safe to repeat, every pass recomputes the new columns from the old ones
+    table, key = persona.table, persona.key_column
+    if has_created_on:
+        run.backfill(table, key, "CREATED = TIMESTAMP(CREATED_ON, COALESCE(CREATED_TIME, '00:00:00'))", where="CREATED IS NULL AND CREATED_ON IS NOT NULL")
+    # rows written before dates were recorded keep a recognisable placeholder
+    run.backfill(table, key, "CREATED = '1970-01-01 00:00:00'", where="CREATED IS NULL" + (" AND CREATED_ON IS NULL" if has_created_on else ""))
+    for column in relabelled:
+        case, params = _code_case(persona, column, column)
+        run.backfill(table, key, f"{column}_CODE = {case}", params, where=f"{column} IS NOT NULL")
+
+
+def native_column_types(run):
+    """
+    CREATED_ON + CREATED_TIME -> CREATED DATETIME, and fixed-option labels ->
+    TINYINT UNSIGNED option numbers, using the catalogs in src/bot/flow.py.
+
+    The new columns are added next to the old ones and filled in batches
+    while the old code keeps writing. The swap then waits until the old code
+    is gone: it refuses while rows with CREATED_ON keep arriving (deploy the
+    new code, then run bot-migrate apply again). Right before the swap the
+    backfill runs once more. The swap renames the old and new columns in one
+    instant ALTER, copies over the rows written in between, and drops the
+    old columns last.
+    """
+    for persona in _personas():
+        table, key = persona.table, persona.key_column
+        columns = run.columns(table)
+        if not columns:
+            continue
+
+        has_created_on = "CREATED_ON" in columns
+        relabelled = [column for column in persona.coded_columns if column in columns and columns[column][0] != "tinyint"]
+        added = []
+        if "CREATED" not in columns:
+            added.append("ADD COLUMN CREATED DATETIME NULL")
+        added.extend(f"ADD COLUMN {column}_CODE TINYINT UNSIGNED NULL" for column in relabelled if f"{column}_CODE" not in columns)
+        run.alter(table, added)
+        _convert(run, persona, relabelled, has_created_on)
+
+        if has_created_on:
+            recent = run.count(
+                f"SELECT COUNT(*) FROM {table} WHERE CREATED_ON IS NOT NULL "
+                "AND TIMESTAMP(CREATED_ON, COALESCE(CREATED_TIME, '00:00:00')) > UTC_TIMESTAMP() - INTERVAL %s SECOND",
+                (run.old_code_quiet,),
+            )
+            if recent:
+                raise RuntimeError(
+                    f"{table}: {recent} rows from the old code in the last {run.old_code_quiet:g}s; the new columns are "
+                    "filled, deploy the new code everywhere and run bot-migrate apply again to finish the swap"
+                )
+            # catches what the old code wrote while the first pass ran
+            _convert(run, persona, relabelled, has_created_on)
+
+        for column in relabelled:
+            unmapped = run.count(f"SELECT COUNT(*) FROM {table} WHERE {column} IS NOT NULL AND {column}_CODE IS NULL")
+            if unmapped:
+                logging.warning(f"{table}.{column}: {unmapped} rows hold a label outside the catalog, stored as NULL")
+        # metadata only, so no write can land in a column that is on its way out
+        run.alter(table, [
+            clause for column in relabelled
+            for clause in (f"RENAME COLUMN {column} TO {column}_LABEL", f"RENAME COLUMN {column}_CODE TO {column}")
+        ])
+        # a run that stopped after the renames finds only the _LABEL columns
+        labelled = [column for column in persona.coded_columns if column in relabelled or f"{column}_LABEL" in columns]
+        for column in labelled:
+            case, params = _code_case(persona, column, f"{column}_LABEL")
+            run.backfill(table, key, f"{column} = {case}", params, where=f"{column} IS NULL AND {column}_LABEL IS NOT NULL")
+        if has_created_on:
+            # rows the old code inserted between the last pass and the renames
+            _convert(run, persona, [], has_created_on)
+
+        changes = []
+        if "CREATED" not in columns or columns["CREATED"][1]:
+            changes.append("MODIFY COLUMN CREATED DATETIME NOT NULL")
+        changes.extend(f"DROP COLUMN {old}" for old in ("CREATED_ON", "CREATED_TIME") if old in columns)
+        changes.extend(f"DROP COLUMN {column}_LABEL" for column in labelled)
+        run.alter(table, changes)
+
+
+def conversation_indexes(run):
+    for table, indexes in CONVERSATION_INDEXES.items():
+        if not run.columns(table):
+            continue
+        existing = run.indexes(table)
+        run.alter(table, [f"ADD INDEX {name} ({column})" for name, column in indexes if name not in existing])
+
+
+def rollup_tables(run):
+    from src.bot.rollups import ROLLUP_TABLES
+
+    for statement in ROLLUP_TABLES:
+        run.execute(statement)
+
+
+MIGRATIONS = (
+    Migration(1, "conversation step columns", add_step_columns),
+    Migration(2, "native column types", native_column_types),
+    Migration(3, "conversation indexes", conversation_indexes),
+    Migration(4, "lead rollups", rollup_tables),
+)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'SCHEMA_VERSION'")
+    if not cursor.fetchone()[0]:
+        return {}
+    cursor.execute("SELECT VERSION, APPLIED_AT FROM SCHEMA_VERSION")
+    return dict(cursor.fetchall())
+
+
+def status(db=None):
+    """Returns (version, name, applied at or None) for every known migration."""
+    db = db or settings.database
+    try:
+        mydb = connect_to_mysql_database(db.host, db.user, db.password, db.name)
+        cursor = create_cursor_object(mydb, buffered=True)
+        applied = applied_versions(cursor)
+        cursor.close()
+        mydb.close()
+        return [(migration.version, migration.name, applied.get(migration.version)) for migration in MIGRATIONS]
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+def apply_migrations(db=None, dry_run=False, target=None, **runner_options):
+    """Runs the pending migrations up to `target` (all by default); returns the versions run."""
+    db = db or settings.database
+    try:
+        mydb = connect_to_mysql_database(db.host, db.user, db.password, db.name)
+        cursor = create_cursor_object(mydb, buffered=True)
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("another migration run holds the lock, try again when it has finished")
+        try:
+            if not dry_run:
+                cursor.execute(SCHEMA_VERSION_TABLE)
+            applied = applied_versions(cursor)
+            done = []
+            for migration in MIGRATIONS:
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                logging.info(f"migration {migration.version} ({migration.name}) started")
+                if dry_run:
+                    print(f"-- {migration.version}: {migration.name}")
+                started = time.perf_counter()
+                runner = Runner(mydb, dry_run=dry_run, **runner_options)
+                migration.apply(runner)
+                seconds = time.perf_counter() - started
+                if not dry_run:
+                    cursor.execute(
+                        "INSERT INTO SCHEMA_VERSION (VERSION, NAME, APPLIED_AT, STATEMENTS, SECONDS) VALUES (%s, %s, %s, %s, %s)",
+                        (
+                            migration.version,
+                            migration.name,
+                            datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None),
+                            len(runner.statements),
+                            seconds,
+                        ),
+                    )
+                    mydb.commit()
+                logging.info(f"migration {migration.version} finished with {len(runner.statements)} statements in {seconds:.1f}s")
+                done.append(migration.version)
+            return done
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchall()
+            cursor.close()
+            mydb.close()
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply the versioned schema migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list the migrations and when each was applied")
+    apply = commands.add_parser("apply", help="run the pending migrations")
+    apply.add_argument("--dry-run", action="store_true", help="print the statements without running them")
+    apply.add_argument("--target", type=int, help="last version to apply")
+    apply.add_argument("--batch-size", type=int, default=5000, help="rows per backfill UPDATE")
+    apply.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between backfill batches")
+    apply.add_argument("--lock-wait-timeout", type=int, default=5, help="seconds an ALTER waits for the table's metadata lock")
+    apply.add_argument("--retries", type=int, default=10, help="attempts per ALTER when the table stays busy")
+    apply.add_argument("--allow-locking", action="store_true", help="let MySQL choose the algorithm, even a blocking one")
+    apply.add_argument(
+        "--old-code-quiet", type=float, default=600, help="seconds without inserts from the old code before migration 2 swaps its columns"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for version, name, applied_at in status():
+            print(f"{version:>4}  {'applied ' + str(applied_at) if applied_at else 'pending':<28} {name}")
+        return
+
+    done = apply_migrations(
+        dry_run=args.dry_run,
+        target=args.target,
+        online=not args.allow_locking,
+        batch_size=args.batch_size,
+        pause=args.pause,
+        lock_wait_timeout=args.lock_wait_timeout,
+        retries=args.retries,
+        old_code_quiet=args.old_code_quiet,
+    )
+    if not args.dry_run:
+        print(f"applied {', '.join(map(str, done))}" if done else "nothing to apply")
+
+
+if __name__ == "__main__":
+    main()
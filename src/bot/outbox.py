@@ -0,0 +1,295 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+import threading
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.database import pooled_connection, create_cursor_object, get_smtp_credentials_async
+from src.bot.alert import send_email, send_emails_async
+from src.bot.metrics import Gauge
+from src.bot.tracing import traced
+
+
+PENDING = "PENDING"
+SENDING = "SENDING"
+SENT = "SENT"
+DEAD = "DEAD"
+
+
+ENQUEUE_QUERY = """
+                INSERT INTO EMAIL_OUTBOX (
+                CREATED_AT, STATUS, ATTEMPTS, NEXT_ATTEMPT_AT,
+                SENDER_EMAIL, RECEIVER_EMAILS, CC_EMAIL, SUBJECT, MESSAGE
+                ) VALUES (UTC_TIMESTAMP(), %s, 0, UTC_TIMESTAMP(), %s, %s, %s, %s, %s)
+                """
+
+
+def enqueue_values(sender_email, receiver_emails, cc_email, subject, message):
+    if isinstance(receiver_emails, (list, tuple)):
+        receiver_emails = ",".join(receiver_emails)
+    if isinstance(cc_email, (list, tuple)):
+        cc_email = ",".join(cc_email)
+    return (PENDING, sender_email, receiver_emails, cc_email, subject, message)
+
+
+def enqueue_email(cursor, sender_email, receiver_emails, cc_email, subject, message):
+    # runs on the caller's cursor so the email commits together with the caller's own writes
+    try:
+        cursor.execute(ENQUEUE_QUERY, enqueue_values(sender_email, receiver_emails, cc_email, subject, message))
+        logging.info(f"email queued in outbox - {subject}")
+        return cursor.lastrowid
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+async def enqueue_email_async(cursor, sender_email, receiver_emails, cc_email, subject, message):
+    # same as enqueue_email on an aiomysql cursor
+    try:
+        await cursor.execute(ENQUEUE_QUERY, enqueue_values(sender_email, receiver_emails, cc_email, subject, message))
+        logging.info(f"email queued in outbox - {subject}")
+        return cursor.lastrowid
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+
+def backoff_delay(attempts):
+    # exponential backoff with a little jitter so failed messages don't retry in lockstep
+    delay = min(settings.outbox.backoff_max, settings.outbox.backoff_base * (2 ** max(attempts - 1, 0)))
+    return int(delay * random.uniform(0.8, 1.0))
+
+
+def claim_batch(limit=settings.outbox.batch_size):
+    # SKIP LOCKED lets several workers drain the outbox without picking the same row;
+    # SENDING rows whose lease expired belong to a worker that died mid-send.
+    # Returns the rows and their lease: LOCKED_UNTIL doubles as the claim token, since a
+    # row is only re-claimed after its lease has passed, so a later claim always sets a later one
+    with pooled_connection() as mydb:
+        cursor = create_cursor_object(mydb, buffered=True)
+        mydb.start_transaction()
+        cursor.execute(
+            """
+            SELECT OID, ATTEMPTS, SENDER_EMAIL, RECEIVER_EMAILS, CC_EMAIL, SUBJECT, MESSAGE
+            FROM EMAIL_OUTBOX
+            WHERE (STATUS = %s AND NEXT_ATTEMPT_AT <= UTC_TIMESTAMP())
+               OR (STATUS = %s AND LOCKED_UNTIL < UTC_TIMESTAMP())
+            ORDER BY OID
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            """,
+            (PENDING, SENDING, limit),
+        )
+        rows = cursor.fetchall()
+        lease = None
+        if rows:
+            cursor.execute("SELECT UTC_TIMESTAMP() + INTERVAL %s SECOND", (settings.outbox.lease_seconds,))
+            lease = cursor.fetchone()[0]
+            placeholders = ", ".join(["%s"] * len(rows))
+            cursor.execute(
+                f"""
+                UPDATE EMAIL_OUTBOX
+                SET STATUS = %s, LOCKED_UNTIL = %s
+                WHERE OID IN ({placeholders})
+                """,
+                (SENDING, lease, *[row[0] for row in rows]),
+            )
+        mydb.commit()
+        cursor.close()
+    return rows, lease
+
+
+def mark_sent(oid, lease):
+    # only the worker still holding the lease may settle the row; returns False when the
+    # lease ran out mid-send and another worker has claimed the email since
+    with pooled_connection() as mydb:
+        cursor = create_cursor_object(mydb)
+        cursor.execute(
+            "UPDATE EMAIL_OUTBOX SET STATUS = %s, ATTEMPTS = ATTEMPTS + 1, SENT_AT = UTC_TIMESTAMP(), "
+            "LOCKED_UNTIL = NULL, LAST_ERROR = NULL WHERE OID = %s AND STATUS = %s AND LOCKED_UNTIL = %s",
+            (SENT, oid, SENDING, lease),
+        )
+        settled = cursor.rowcount == 1
+        mydb.commit()
+        cursor.close()
+    if not settled:
+        logging.warning(f"outbox email {oid} sent after its lease expired, another worker owns it now")
+    return settled
+
+
+def mark_failed(oid, lease, attempts, error):
+    attempts += 1
+    with pooled_connection() as mydb:
+        cursor = create_cursor_object(mydb)
+        if attempts >= settings.outbox.max_attempts:
+            cursor.execute(
+                "UPDATE EMAIL_OUTBOX SET STATUS = %s, ATTEMPTS = %s, LOCKED_UNTIL = NULL, LAST_ERROR = %s "
+                "WHERE OID = %s AND STATUS = %s AND LOCKED_UNTIL = %s",
+                (DEAD, attempts, str(error)[:2000], oid, SENDING, lease),
+            )
+            settled = cursor.rowcount == 1
+            if settled:
+                logging.error(f"outbox email {oid} moved to dead letter after {attempts} attempts: {error}")
+        else:
+            delay = backoff_delay(attempts)
+            cursor.execute(
+                "UPDATE EMAIL_OUTBOX SET STATUS = %s, ATTEMPTS = %s, LOCKED_UNTIL = NULL, LAST_ERROR = %s, "
+                "NEXT_ATTEMPT_AT = UTC_TIMESTAMP() + INTERVAL %s SECOND WHERE OID = %s AND STATUS = %s AND LOCKED_UNTIL = %s",
+                (PENDING, attempts, str(error)[:2000], delay, oid, SENDING, lease),
+            )
+            settled = cursor.rowcount == 1
+            if settled:
+                logging.warning(f"outbox email {oid} failed (attempt {attempts}), retrying in {delay}s: {error}")
+        mydb.commit()
+        cursor.close()
+    if not settled:
+        logging.warning(f"outbox email {oid} failed after its lease expired, another worker owns it now: {error}")
+    return settled
+
+
+def settle(oid, lease, attempts, error):
+    # a failed status update must not abandon the rest of the batch: the row stays
+    # SENDING and is claimed again once its lease expires
+    try:
+        if error is None:
+            if mark_sent(oid, lease):
+                logging.info(f"outbox email {oid} sent")
+        else:
+            mark_failed(oid, lease, attempts, error)
+    except Exception as e:
+        logging.error(f"outbox email {oid} could not be marked, it is retried when its lease expires: {e}")
+
+
+def drain_outbox(limit=settings.outbox.batch_size):
+    # sends one batch of due emails and returns how many were claimed
+    rows, lease = claim_batch(limit)
+    for oid, attempts, sender_email, receiver_emails, cc_email, subject, message in rows:
+        try:
+            send_email(sender_email, receiver_emails, cc_email, subject, message)
+        except Exception as e:
+            settle(oid, lease, attempts, e)
+        else:
+            settle(oid, lease, attempts, None)
+    return len(rows)
+
+
+async def drain_outbox_async(limit=settings.outbox.batch_size):
+    # claiming and marking rows is bookkeeping off the request path, so it reuses the
+    # sync statements on a thread; the batch itself goes out over one async SMTP connection
+    rows, lease = await asyncio.to_thread(claim_batch, limit)
+    if not rows:
+        return 0
+    try:
+        smtp_credentials = await get_smtp_credentials_async()
+        results = await send_emails_async(smtp_credentials, [row[2:] for row in rows])
+    except Exception as e:
+        results = [e] * len(rows)
+    for (oid, attempts, *_), error in zip(rows, results):
+        await asyncio.to_thread(settle, oid, lease, attempts, error)
+    return len(rows)
+
+
+def requeue_dead_letters():
+    with pooled_connection() as mydb:
+        cursor = create_cursor_object(mydb)
+        cursor.execute(
+            "UPDATE EMAIL_OUTBOX SET STATUS = %s, ATTEMPTS = 0, NEXT_ATTEMPT_AT = UTC_TIMESTAMP() WHERE STATUS = %s",
+            (PENDING, DEAD),
+        )
+        count = cursor.rowcount
+        mydb.commit()
+        cursor.close()
+    logging.info(f"{count} dead letter emails moved back to pending")
+    return count
+
+
+_depth_lock = threading.Lock()
+_depth = {"at": None, "counts": {}}
+
+
+def outbox_depth():
+    # emails per status; cached briefly so frequent scrapes do not each run the GROUP BY
+    with _depth_lock:
+        now = time.monotonic()
+        if _depth["at"] is None or now - _depth["at"] > settings.outbox.depth_cache_seconds:
+            with pooled_connection() as mydb:
+                cursor = create_cursor_object(mydb, buffered=True)
+                cursor.execute("SELECT STATUS, COUNT(*) FROM EMAIL_OUTBOX GROUP BY STATUS")
+                counts = {status: count for status, count in cursor.fetchall()}
+                cursor.close()
+            _depth.update(at=now, counts=counts)
+        return dict(_depth["counts"])
+
+
+def _depth_samples():
+    counts = outbox_depth()
+    for status in (PENDING, SENDING, SENT, DEAD):
+        yield (status,), counts.get(status, 0)
+
+
+Gauge("bot_outbox_emails", "Outbox emails by status", ("status",), _depth_samples)
+
+
+def run_worker(stop_event=None):
+    stop_event = stop_event or threading.Event()
+    logging.info("outbox worker started")
+    while not stop_event.is_set():
+        try:
+            # each pass gets its own trace id in the log, like a request
+            with traced("outbox drain"):
+                claimed = drain_outbox()
+        except Exception as e:
+            logging.error(f"outbox worker error: {e}")
+            claimed = 0
+        # a full batch means more is probably waiting, so go again without sleeping
+        if claimed < settings.outbox.batch_size:
+            stop_event.wait(settings.outbox.poll_interval)
+    logging.info("outbox worker stopped")
+
+
+async def run_worker_async(stop_event):
+    logging.info("async outbox worker started")
+    while not stop_event.is_set():
+        try:
+            with traced("outbox drain"):
+                claimed = await drain_outbox_async()
+        except Exception as e:
+            logging.error(f"outbox worker error: {e}")
+            claimed = 0
+        if claimed < settings.outbox.batch_size:
+            try:
+                await asyncio.wait_for(stop_event.wait(), settings.outbox.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    logging.info("async outbox worker stopped")
+
+
+def start_worker_thread():
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_worker, args=(stop_event,), name="outbox-worker", daemon=True)
+    thread.start()
+    return thread, stop_event
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deliver queued chatbot notification emails")
+    parser.add_argument("--once", action="store_true", help="send one batch of due emails and exit")
+    parser.add_argument("--requeue-dead", action="store_true", help="move dead letter emails back to pending and exit")
+    args = parser.parse_args(argv)
+
+    if args.requeue_dead:
+        print(requeue_dead_letters())
+    elif args.once:
+        print(drain_outbox())
+    else:
+        try:
+            run_worker()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
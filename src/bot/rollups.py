@@ -0,0 +1,364 @@
+"""
+Daily lead counts for the dashboards, kept in LEAD_ROLLUP_DAILY instead of
+GROUP BY queries over the conversation tables.
+
+One row per (persona, dimension, day, value) holds the number of leads:
+    total          every conversation, value ""
+    vertical       one count per chosen vertical (multi-select answers are split)
+    known_source   prospects only
+    rating         the rating label
+    funnel         conversations that reached each stage: details, then every
+                   step column in flow order, then feedback; "how many reach
+                   industries versus feedback" is two rows of the same day
+
+    bot-rollup update                                   # cron, e.g. every 5 minutes
+    bot-rollup rebuild [--persona prospect] [--start 2026-01-01 --end 2026-02-01]
+    bot-rollup show prospect funnel --start 2026-01-01
+    GET /rollups/prospect?dimension=funnel&start=2026-01-01&end=2026-02-01
+        Authorization: Bearer <export_token>
+
+`update` is incremental. ROLLUP_WATERMARK keeps, per persona, the highest
+primary key already counted. Each run counts the rows after it, in primary
+key ranges of rollup_batch_size. The counts are added with
+INSERT ... ON DUPLICATE KEY UPDATE, and the watermark is moved in the same
+transaction, so every row is counted exactly once. A row is only counted
+once it is rollup_settle_seconds old. Its answers are written while the
+conversation goes on, and in buffered mode only at the end.
+
+A conversation finished after it was counted (feedback given hours later)
+is not recounted. `rebuild` recounts every row up to the watermark, for all
+days or a date range, when exact numbers matter. The tables are created by
+`bot-migrate apply`, migration 4.
+"""
+import sys
+import json
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from flask import request, jsonify
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings
+from src.bot.database import pooled_connection, read_connection, create_cursor_object
+from src.bot.export import authorized, parse_bound
+from src.bot.metrics import phase
+
+LOCK_NAME = "bot_rollups"
+
+ROLLUP_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS LEAD_ROLLUP_DAILY(
+        PERSONA VARCHAR(32) NOT NULL,
+        DIMENSION VARCHAR(32) NOT NULL,
+        DAY DATE NOT NULL,
+        VALUE VARCHAR(255) NOT NULL,
+        LEADS INT UNSIGNED NOT NULL,
+        PRIMARY KEY (PERSONA, DIMENSION, DAY, VALUE)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ROLLUP_WATERMARK(
+        PERSONA VARCHAR(32) PRIMARY KEY,
+        LAST_ID INT NOT NULL,
+        UPDATED_AT DATETIME NOT NULL
+    )
+    """,
+)
+
+# dimension -> column, for the personas whose table has it
+DIMENSIONS = {"vertical": "VERTICAL", "known_source": "KNOWN_SOURCE", "rating": "RATING"}
+REPORTS = ("total", *DIMENSIONS, "funnel")
+
+UPSERT_COUNTS = """
+    INSERT INTO LEAD_ROLLUP_DAILY (PERSONA, DIMENSION, DAY, VALUE, LEADS) VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE LEADS = LEADS + VALUES(LEADS)
+"""
+
+UPSERT_WATERMARK = """
+    INSERT INTO ROLLUP_WATERMARK (PERSONA, LAST_ID, UPDATED_AT) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE LAST_ID = VALUES(LAST_ID), UPDATED_AT = VALUES(UPDATED_AT)
+"""
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def funnel_stages(persona):
+    """(stage, column) in the order a conversation fills them; steps sharing a column are one stage."""
+    by_column = {}
+    for step in persona.steps.values():
+        by_column.setdefault(step.column, []).append(step.name)
+    stages = [("details", None)]
+    stages.extend((names[0] if len(names) == 1 else column.lower(), column) for column, names in by_column.items())
+    stages.append(("feedback", "FEEDBACK"))
+    return stages
+
+
+def _dimensions(persona):
+    columns = {step.column for step in persona.steps.values()}
+    return {dimension: column for dimension, column in DIMENSIONS.items() if column in columns}
+
+
+def _read_columns(persona):
+    stage_columns = [column for _, column in funnel_stages(persona) if column is not None]
+    return list(dict.fromkeys([persona.key_column, "CREATED", *_dimensions(persona).values(), *stage_columns]))
+
+
+def _answers(persona, column, value):
+    # a multi-select answer counts once per chosen option
+    if value is None or value == "":
+        return []
+    if any(step.multi for step in persona.steps.values() if step.column == column):
+        return [part.strip()[:255] for part in str(value).split(",") if part.strip()]
+    return [str(value)[:255]]
+
+
+def count_rows(persona, rows, counts):
+    """Adds decoded conversation rows to `counts`, keyed (dimension, day, value)."""
+    dimensions = _dimensions(persona)
+    stages = funnel_stages(persona)
+    for row in rows:
+        day = row["CREATED"].date()
+        counts[("total", day, "")] += 1
+        for dimension, column in dimensions.items():
+            for value in _answers(persona, column, row.get(column)):
+                counts[(dimension, day, value)] += 1
+        for stage, column in stages:
+            if column is None or row.get(column) not in (None, ""):
+                counts[("funnel", day, stage)] += 1
+    return counts
+
+
+def _count_range(persona, mydb, conditions, params, counts):
+    # unbuffered, the rows are counted as they arrive and never held together
+    from src.bot.flow import decode_columns
+
+    columns = _read_columns(persona)
+    cursor = create_cursor_object(mydb)
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {persona.table} WHERE {' AND '.join(conditions)}", params)
+    count_rows(persona, (decode_columns(persona, dict(zip(columns, row))) for row in cursor), counts)
+    cursor.close()
+    return counts
+
+
+def _write_counts(cursor, persona, counts):
+    if counts:
+        cursor.executemany(UPSERT_COUNTS, [(persona.name, dimension, day, value, leads) for (dimension, day, value), leads in counts.items()])
+
+
+def _watermark(cursor, persona):
+    cursor.execute("SELECT LAST_ID FROM ROLLUP_WATERMARK WHERE PERSONA = %s", (persona.name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _locked(mydb):
+    cursor = create_cursor_object(mydb, buffered=True)
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError("another rollup run holds the lock, try again when it has finished")
+    return cursor
+
+
+def _unlock(cursor):
+    cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+    cursor.fetchall()
+    cursor.close()
+
+
+def update_persona(mydb, cursor, persona, now=None):
+    """Counts the settled rows after the persona's watermark; returns the number of rows counted."""
+    key = persona.key_column
+    watermark = _watermark(cursor, persona)
+    cutoff = (now or _utc_now()) - timedelta(seconds=settings.rollup.settle_seconds)
+    # keys are handed out in insert order, so everything up to this key is at least settle_seconds old
+    cursor.execute(f"SELECT MAX({key}) FROM {persona.table} WHERE {key} > %s AND CREATED < %s", (watermark, cutoff))
+    (upper,) = cursor.fetchone()
+    rows = 0
+    if upper is None:
+        return rows
+    while watermark < upper:
+        batch_end = min(upper, watermark + settings.rollup.batch_size)
+        with phase("rollup_batch"):
+            counts = _count_range(persona, mydb, [f"{key} > %s", f"{key} <= %s"], (watermark, batch_end), Counter())
+            _write_counts(cursor, persona, counts)
+            # what the batches counted, younger rows inside the key range included
+            rows += sum(leads for (dimension, _, _), leads in counts.items() if dimension == "total")
+            cursor.execute(UPSERT_WATERMARK, (persona.name, batch_end, _utc_now().replace(microsecond=0)))
+            mydb.commit()
+        watermark = batch_end
+    logging.info(f"{persona.name} rollups updated up to {key} {upper}")
+    return rows
+
+
+def update_rollups(db=None, now=None):
+    """Brings every persona's rollups up to date; returns persona -> rows counted."""
+    from src.bot.flow import PERSONAS
+
+    try:
+        with pooled_connection(db) as mydb:
+            cursor = _locked(mydb)
+            try:
+                return {name: update_persona(mydb, cursor, persona, now) for name, persona in PERSONAS.items()}
+            finally:
+                _unlock(cursor)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+def rebuild_rollups(persona_names=None, start=None, end=None, db=None):
+    """
+    Recounts the rows up to each watermark whose day is in [start, end)
+    (all days by default), replacing those days' rollups in one transaction.
+    """
+    from src.bot.flow import PERSONAS
+
+    try:
+        with pooled_connection(db) as mydb:
+            cursor = _locked(mydb)
+            try:
+                for name in persona_names or list(PERSONAS):
+                    persona = PERSONAS[name]
+                    conditions, params = [f"{persona.key_column} <= %s"], [_watermark(cursor, persona)]
+                    delete, delete_params = "DELETE FROM LEAD_ROLLUP_DAILY WHERE PERSONA = %s", [persona.name]
+                    if start is not None:
+                        conditions.append("CREATED >= %s")
+                        params.append(datetime.combine(start, datetime.min.time()))
+                        delete += " AND DAY >= %s"
+                        delete_params.append(start)
+                    if end is not None:
+                        conditions.append("CREATED < %s")
+                        params.append(datetime.combine(end, datetime.min.time()))
+                        delete += " AND DAY < %s"
+                        delete_params.append(end)
+                    counts = _count_range(persona, mydb, conditions, tuple(params), Counter())
+                    cursor.execute(delete, tuple(delete_params))
+                    _write_counts(cursor, persona, counts)
+                    mydb.commit()
+                    logging.info(f"{persona.name} rollups rebuilt - {start or 'first day'} to {end or 'last day'}")
+            finally:
+                _unlock(cursor)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e,sys)
+
+
+def rollup_report(persona, dimension, start=None, end=None, db=None):
+    """One dimension of a persona's rollups, per day and in total, from the rollup table alone."""
+    query = "SELECT DAY, VALUE, LEADS FROM LEAD_ROLLUP_DAILY WHERE PERSONA = %s AND DIMENSION = %s"
+    params = [persona.name, dimension]
+    if start is not None:
+        query += " AND DAY >= %s"
+        params.append(start)
+    if end is not None:
+        query += " AND DAY < %s"
+        params.append(end)
+    with read_connection(db) as mydb:
+        cursor = create_cursor_object(mydb, buffered=True)
+        cursor.execute(query + " ORDER BY DAY", tuple(params))
+        rows = cursor.fetchall()
+        cursor.close()
+
+    daily, totals = {}, Counter()
+    for day, value, leads in rows:
+        daily.setdefault(day.isoformat(), {})[value] = leads
+        totals[value] += leads
+    report = {
+        "persona": persona.name,
+        "dimension": dimension,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "daily": [{"day": day, "leads": values} for day, values in daily.items()],
+    }
+    if dimension == "funnel":
+        # in stage order, each with its share of the conversations that gave their details
+        reached = totals.get("details", 0)
+        report["stages"] = [
+            {"stage": stage, "leads": totals.get(stage, 0), "rate": round(totals.get(stage, 0) / reached, 4) if reached else None}
+            for stage, _ in funnel_stages(persona)
+        ]
+    else:
+        report["totals"] = dict(totals)
+    return report
+
+
+def prepare_report(persona_name, authorization, args):
+    """Returns (rollup_report arguments, None) or (None, the rejection response)."""
+    from src.bot.flow import PERSONAS
+
+    if not settings.export.token:
+        return None, ({"message": "Not found.", "code": 404}, 404)
+    if not authorized(authorization):
+        return None, ({"message": "A valid export token is required.", "code": 401}, 401)
+    persona = PERSONAS.get(persona_name)
+    if persona is None:
+        return None, ({"message": f"Unknown persona, choose one of {', '.join(PERSONAS)}.", "code": 404}, 404)
+    dimension = args.get("dimension") or "total"
+    if dimension not in REPORTS:
+        return None, ({"message": f"dimension must be one of {', '.join(REPORTS)}.", "code": 400}, 400)
+    try:
+        start, end = parse_bound(args.get("start")), parse_bound(args.get("end"))
+    except ValueError:
+        return None, ({"message": "start and end must be ISO dates, e.g. 2026-01-31.", "code": 400}, 400)
+    return {
+        "persona": persona,
+        "dimension": dimension,
+        "start": start.date() if start else None,
+        "end": end.date() if end else None,
+    }, None
+
+
+# this API is responsible for serving the dashboard numbers
+def rollups_view(persona_name):
+    try:
+        report, rejection = prepare_report(persona_name, request.headers.get("Authorization"), request.args)
+        if rejection is not None:
+            body, status = rejection
+            return jsonify(body), status
+        return jsonify(rollup_report(**report)), 200
+    except Exception as e:
+        logging.error(f"Error in processing request: {e}")
+        return jsonify({"message": "Internal server error.", "status": "error", "error": str(e)}), 500
+
+
+def init_app(app):
+    app.add_url_rule("/rollups/<persona_name>", "rollups", rollups_view, methods=["GET"])
+
+
+def main(argv=None):
+    from src.bot.flow import PERSONAS
+
+    parser = argparse.ArgumentParser(description="Maintain and read the daily lead rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("update", help="count the rows added since the last run")
+    rebuild = commands.add_parser("rebuild", help="recount days from the conversation tables")
+    rebuild.add_argument("--persona", action="append", choices=list(PERSONAS), help="repeatable, default all")
+    rebuild.add_argument("--start", help="first day, inclusive")
+    rebuild.add_argument("--end", help="last day, exclusive")
+    show = commands.add_parser("show", help="print one dimension as JSON")
+    show.add_argument("persona", choices=list(PERSONAS))
+    show.add_argument("dimension", choices=REPORTS)
+    show.add_argument("--start", help="first day, inclusive")
+    show.add_argument("--end", help="last day, exclusive")
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        for name, rows in update_rollups().items():
+            print(f"{name}: {rows} rows counted")
+        return
+
+    try:
+        start = parse_bound(args.start).date() if args.start else None
+        end = parse_bound(args.end).date() if args.end else None
+    except ValueError:
+        parser.error("--start and --end must be ISO dates, e.g. 2026-01-31")
+    if args.command == "rebuild":
+        rebuild_rollups(args.persona, start, end)
+    else:
+        print(json.dumps(rollup_report(PERSONAS[args.persona], args.dimension, start, end), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Production entry point: serves the chatbot with gunicorn's pre-fork workers.
+
+    bot-serve                      # installed by `pip install -e .`
+    python -m src.bot.serve
+
+Settings come from the environment (or .env), read by src/bot/config.py:
+    server_bind                host:port to listen on, default 0.0.0.0:8000
+    server_workers             worker processes, default 2 x CPUs + 1
+    server_threads             threads per worker (gthread), default 4
+    server_worker_class        gunicorn worker class, default gthread
+    server_backlog             pending connection queue, default 2048
+    server_keepalive           seconds an idle keep-alive connection stays open, default 5
+    server_timeout             seconds before a silent worker is killed and replaced, default 30
+    server_graceful_timeout    seconds in-flight requests get on shutdown/reload, default 30
+    server_max_requests        recycle a worker after this many requests, 0 = never (default)
+    server_max_requests_jitter random extra requests before recycling, default 0
+    server_preload             load the app once in the master before forking, default false
+    server_access_log          access log target, "-" for stdout, unset to disable
+
+Every worker gets its own MySQL pools, SMTP connection and log writer
+thread: whatever was opened before the fork is forgotten in post_fork. The outbox worker thread
+(outbox_worker_in_process=true) is started per worker after the fork. On
+shutdown each worker writes out its write-behind buffer before exiting.
+conversation_write_mode=buffered is refused unless server_workers=1: the
+buffer is per process and gunicorn does not send a conversation's requests
+to the same worker.
+"""
+import sys
+from src.bot.exception import CustomException
+from src.bot.logger import logging
+from src.bot.config import settings, default_workers, check_write_mode
+
+workers = settings.server.workers or default_workers()
+
+
+def post_fork(server, worker):
+    from src.bot.database import reset_pools
+    from src.bot.alert import smtp_session
+    from src.bot.logger import restart_listener
+
+    restart_listener()
+    reset_pools()
+    smtp_session.reset()
+    if settings.outbox.worker_in_process:
+        from src.bot.outbox import start_worker_thread
+        start_worker_thread()
+    logging.info(f"worker {worker.pid} ready")
+
+
+def worker_exit(server, worker):
+    from src.bot.conversation_buffer import conversation_buffer
+    from src.bot.alert import smtp_session
+
+    conversation_buffer.flush_all()
+    smtp_session.close()
+    logging.info(f"worker {worker.pid} stopped")
+
+
+def server_options():
+    server = settings.server
+    options = {
+        "bind": server.bind,
+        "workers": workers,
+        "threads": server.threads,
+        "worker_class": server.worker_class,
+        "backlog": server.backlog,
+        "keepalive": server.keepalive,
+        "timeout": server.timeout,
+        "graceful_timeout": server.graceful_timeout,
+        "max_requests": server.max_requests,
+        "max_requests_jitter": server.max_requests_jitter,
+        "preload_app": server.preload,
+        "post_fork": post_fork,
+        "worker_exit": worker_exit,
+    }
+    if server.access_log:
+        options["accesslog"] = server.access_log
+    return options
+
+
+def main():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as e:
+        logging.error("gunicorn is not installed, run `pip install gunicorn`")
+        raise CustomException(e, sys)
+
+    class ChatbotApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            # the outbox thread is started per worker in post_fork, never in the master
+            return create_app(start_outbox_worker=False)
+
+    try:
+        check_write_mode(workers)
+    except Exception as e:
+        logging.error(f"An error occurred: {e}")
+        raise CustomException(e, sys)
+
+    options = server_options()
+    server = settings.server
+    logging.info(f"starting gunicorn on {server.bind} with {workers} workers x {server.threads} threads ({server.worker_class})")
+    ChatbotApplication(options).run()
+
+
+if __name__ == "__main__":
+    main()
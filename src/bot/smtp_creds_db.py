@@ -1,20 +1,8 @@
 import sys
-import os
-from dotenv import load_dotenv
 from src.bot.exception import CustomException
 from src.bot.logger import logging
-from src.bot.database import connect_to_mysql_database, create_cursor_object
-
-
-def configure():
-    load_dotenv()
-
-
-configure()
-host = os.getenv("database_host_name")
-user = os.getenv("database_user_name")
-password = os.getenv("database_user_password")
-database = os.getenv("database_name")
+from src.bot.config import settings
+from src.bot.database import connect_to_mysql_database, create_cursor_object, invalidate_smtp_credentials_cache
 
 
 def smtp_creds_to_db(host, user, password, database):
@@ -74,6 +62,7 @@ def smtp_creds_to_db(host, user, password, database):
         cursor.execute(table_queries)
         cursor.execute(insert_values_query, values)
         mydb.commit()
+        invalidate_smtp_credentials_cache()
         logging.info("SMTP Tables and columns created successfully")
         return True
     except Exception as e:
@@ -82,4 +71,5 @@ def smtp_creds_to_db(host, user, password, database):
 
 
 if __name__ == "__main__":
-    smtp_creds_to_db(host, user, password, database)
+    db = settings.database
+    smtp_creds_to_db(db.host, db.user, db.password, db.name)
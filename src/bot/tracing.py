@@ -0,0 +1,219 @@
+"""
+Per-request tracing.
+
+Every request gets an id, taken from an incoming X-Request-ID header when it
+looks sane and generated otherwise. The id is echoed back in X-Request-ID
+and stamped on every log line written while the request runs.
+
+Each metrics.phase() that ends during the request (db_connect, db_query,
+db_commit, conversation_fetch, smtp_credentials, smtp_login, the greeting
+lookups, ...) is also recorded as a span of that request. The spans are
+returned in a Server-Timing header, one entry per phase with its total
+duration and count:
+
+    Server-Timing: db_query;dur=4.1;desc="x3", conversation_fetch;dur=2.0, total;dur=9.8
+
+Requests slower than trace_slow_ms (default 1000) are logged with every span
+in order, so a slow call can be read from the log alone.
+
+Settings (environment or .env):
+    trace_server_timing   send the Server-Timing header, default true
+    trace_slow_ms         log the spans of requests slower than this, default 1000
+    profile_sample_rate   fraction of requests run under cProfile, default 0 (off)
+    profile_slow_ms       keep a sampled profile only when the request took at least this long, default 500
+    profile_dir           where profiles are written, default logs/profiles
+
+Profiles are pstats dumps: `python -m pstats <file>`, `snakeviz <file>`, or
+`flameprof <file> > flame.svg` for a flame graph. Only one request per process
+is profiled at a time, and only in the sync app; under asyncio the event loop
+interleaves requests, so a profile would mix them.
+"""
+import os
+import re
+import time
+import uuid
+import random
+import cProfile
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from flask import g, request
+from src.bot.config import settings
+from src.bot.logger import logging, request_id
+from src.bot.metrics import add_phase_listener, route_of
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_trace = ContextVar("trace", default=None)
+_profile_lock = threading.Lock()  # cProfile allows one active profiler per process
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    __slots__ = ("request_id", "started", "spans", "token")
+
+    def __init__(self, incoming_id=None):
+        valid = incoming_id is not None and _VALID_REQUEST_ID.match(incoming_id)
+        self.request_id = incoming_id if valid else uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []  # (name, offset seconds, seconds, failed) in the order they ended
+        self.token = None
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def add(self, name, started, seconds, failed):
+        self.spans.append((name, started - self.started, seconds, failed))
+
+    def totals(self):
+        # name -> [seconds, count], in the order each phase first ended
+        totals = {}
+        for name, _, seconds, _ in self.spans:
+            total = totals.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+        return totals
+
+    def server_timing(self, elapsed_ms):
+        entries = []
+        for name, (seconds, count) in self.totals().items():
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="x{count}"'
+            entries.append(entry)
+        entries.append(f"total;dur={elapsed_ms:.1f}")
+        return ", ".join(entries)
+
+    def describe(self):
+        return " ".join(
+            f"{name}@{offset * 1000:.0f}ms={seconds * 1000:.1f}ms{'!' if failed else ''}"
+            for name, offset, seconds, failed in self.spans
+        )
+
+
+def _on_phase(name, started, seconds, failed):
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, started, seconds, failed)
+
+
+add_phase_listener(_on_phase)
+
+
+def begin(incoming_id=None):
+    """Starts a trace for the current request (or background job) and returns it."""
+    trace = Trace(incoming_id)
+    trace.token = (_trace.set(trace), request_id.set(trace.request_id))
+    return trace
+
+
+def finish(trace, route, method, status):
+    """Logs the spans of a slow request and returns the headers to add to its response."""
+    elapsed_ms = trace.elapsed_ms()
+    if elapsed_ms >= settings.trace.slow_ms:
+        logging.warning(f"slow request {method} {route} {status} {elapsed_ms:.0f}ms - {trace.describe()}")
+    headers = {REQUEST_ID_HEADER: trace.request_id}
+    if settings.trace.server_timing:
+        headers["Server-Timing"] = trace.server_timing(elapsed_ms)
+    return headers
+
+
+def end(trace):
+    if trace.token is not None:
+        trace_token, request_id_token = trace.token
+        trace.token = None
+        try:
+            request_id.reset(request_id_token)
+            _trace.reset(trace_token)
+        except ValueError:
+            # ended from a different context than it began in
+            request_id.set("-")
+            _trace.set(None)
+
+
+class traced:
+    """Traces a block outside a request, e.g. one outbox drain, so its log lines share an id."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = begin()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = self.trace.elapsed_ms()
+        if elapsed_ms >= settings.trace.slow_ms:
+            logging.warning(f"slow {self.name} {elapsed_ms:.0f}ms - {self.trace.describe()}")
+        end(self.trace)
+        return False
+
+
+def _start_profile():
+    if settings.trace.profile_sample_rate <= 0 or random.random() >= settings.trace.profile_sample_rate:
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    except Exception as e:
+        # another profiler (a debugger, coverage) is already active
+        _profile_lock.release()
+        logging.warning(f"request profiling skipped: {e}")
+        return None
+
+
+def _stop_profile(profiler, trace, route, elapsed_ms):
+    try:
+        profiler.disable()
+        if elapsed_ms < settings.trace.profile_slow_ms:
+            return None
+        os.makedirs(settings.trace.profile_dir, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(
+            settings.trace.profile_dir, f"{datetime.now().strftime('%d_%m_%y_%H_%M_%S')}_{name}_{elapsed_ms:.0f}ms_{trace.request_id}.prof"
+        )
+        profiler.dump_stats(path)
+        logging.info(f"request profile written to {path}")
+        return path
+    except Exception as e:
+        logging.error(f"request profile could not be written: {e}")
+        return None
+    finally:
+        _profile_lock.release()
+
+
+def _begin_request():
+    g.trace = begin(request.headers.get(REQUEST_ID_HEADER))
+    g.profiler = _start_profile()
+
+
+def _finish_request(response):
+    trace = g.get("trace")
+    if trace is None:
+        return response
+    route = route_of(request)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        _stop_profile(profiler, trace, route, trace.elapsed_ms())
+    response.headers.update(finish(trace, route, request.method, response.status_code))
+    return response
+
+
+def _end_request(exception=None):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        # after_request did not run, e.g. an earlier before_request hook raised
+        profiler.disable()
+        _profile_lock.release()
+    trace = g.pop("trace", None)
+    if trace is not None:
+        end(trace)
+
+
+def init_app(app):
+    # register right after metrics so validation and views run inside the trace
+    app.before_request(_begin_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
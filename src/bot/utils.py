@@ -1,19 +1,16 @@
 import re
 import sys
+import ipaddress
 from datetime import datetime, timezone
-from dotenv import load_dotenv
 from src.bot.exception import CustomException
 from src.bot.logger import logging
-
-
-def configure():
-    load_dotenv()
+from src.bot.config import settings
 
 
 def get_current_utc_datetime():
     try:
         current_utc_datetime = datetime.now(timezone.utc)
-        logging.info("current date time collected successfully")
+        logging.debug("current date time collected successfully")
         return current_utc_datetime
     except Exception as e:
         logging.error(f"An error occurred: {e}")
@@ -24,7 +21,7 @@ def extract_utc_date_and_time(utc_datetime):
     try:
         utc_date = utc_datetime.strftime('%Y-%m-%d')
         utc_time = utc_datetime.strftime('%H:%M:%S')
-        logging.info("UTC date and UTC time colleceted")
+        logging.debug("UTC date and UTC time colleceted")
         return utc_date, utc_time
     except Exception as e:
         logging.error(f"An error occurred: {e}")
@@ -41,7 +38,35 @@ def is_valid_email(email):
 
 def is_valid_contact_number(contact):
     return bool(re.match(r"^\+?\d{1,3}[-.\s]?\(?\d{1,3}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,4}[-.\s]?\d{1,9}$",contact,))
-    
+
+
+def is_trusted_proxy(ip):
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return any(address in network for network in settings.server.trusted_proxies)
+
+
+def get_client_ip(request):
+    # walk X-Forwarded-For from the right, skipping our own proxies; the first
+    # address a trusted proxy vouches for is the visitor
+    client_ip = request.remote_addr
+    if not is_trusted_proxy(client_ip):
+        return client_ip
+
+    forwarded_for = request.headers.get("X-Forwarded-For", "")
+    for hop in reversed([hop.strip() for hop in forwarded_for.split(",") if hop.strip()]):
+        try:
+            ipaddress.ip_address(hop)
+        except ValueError:
+            # the hops checked so far are all our own proxies, so a garbled chain
+            # never yields a proxy address as the visitor
+            return request.remote_addr
+        client_ip = hop
+        if not is_trusted_proxy(hop):
+            break
+    return client_ip
 
     
 if __name__=="__main__":
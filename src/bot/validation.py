@@ -0,0 +1,215 @@
+"""
+Request body checks that run before a view is called.
+
+Each route gets a schema of required/optional fields and their JSON types.
+The schemas are compiled once at import, mostly from the declarations in
+src/bot/flow.py. init_app installs a before_request hook that rejects
+malformed bodies with a 400 before the view runs. Views only check out a
+pooled MySQL connection when they need one, so rejected requests never
+touch the database.
+
+Value checks (option catalogs, name/email/contact formats) stay in the
+handlers, which keep their own responses. This layer only catches bodies
+those handlers cannot safely read: not JSON, missing fields, wrong types.
+"""
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+from flask import request, jsonify
+from src.bot.logger import logging
+from src.bot.metrics import Gauge
+from src.bot.flow import PERSONAS
+
+STRING = (str,)
+ROW_ID = (int, str)
+LIST = (list,)
+OBJECT = (dict,)
+
+
+@dataclass(frozen=True)
+class Field:
+    name: str
+    types: tuple
+    required: bool = True
+    items: Optional[tuple] = None  # element types when the field is a list
+
+
+@dataclass(frozen=True)
+class Requires:
+    # `field` is required when `trigger` is (or, for lists, contains) one of `values`
+    trigger: str
+    values: frozenset
+    field: str
+
+
+@dataclass(frozen=True)
+class Schema:
+    fields: tuple
+    requires: tuple = ()
+    steps: Optional[Mapping] = None  # step name -> Schema, for the batch "steps" list
+
+
+def _type_ok(value, types):
+    # bool is an int to Python but not a valid row id or option
+    if isinstance(value, bool) and bool not in types:
+        return False
+    return isinstance(value, types)
+
+
+def check(schema, body, prefix=""):
+    """Returns a list of (field, reason) problems, empty when the body is fine."""
+    if not isinstance(body, dict):
+        return [(prefix.rstrip(".") or "body", "not_an_object")]
+
+    problems = []
+    for spec in schema.fields:
+        value = body.get(spec.name)
+        if value is None:
+            if spec.required:
+                problems.append((prefix + spec.name, "missing"))
+            continue
+        if not _type_ok(value, spec.types):
+            problems.append((prefix + spec.name, "wrong_type"))
+        elif spec.items is not None and not all(_type_ok(item, spec.items) for item in value):
+            problems.append((prefix + spec.name, "wrong_item_type"))
+
+    for rule in schema.requires:
+        selected = body.get(rule.trigger)
+        chosen = selected if isinstance(selected, list) else [selected]
+        if any(isinstance(option, str) and option in rule.values for option in chosen):
+            value = body.get(rule.field)
+            if value is None:
+                problems.append((prefix + rule.field, "missing"))
+            elif not isinstance(value, str):
+                problems.append((prefix + rule.field, "wrong_type"))
+
+    if schema.steps is not None and isinstance(body.get("steps"), list):
+        for position, payload in enumerate(body["steps"]):
+            step_schema = schema.steps.get(payload.get("step")) if isinstance(payload, dict) else None
+            # unknown step names are reported by the batch handler itself
+            if step_schema is not None:
+                problems.extend(check(step_schema, payload, f"steps[{position}]."))
+    return problems
+
+
+def step_schema(step, with_row_id=True):
+    fields = [Field("row_id", ROW_ID)] if with_row_id else []
+    if step.options is None:
+        # steps with their own "missing value" response keep answering it
+        fields.append(Field(step.input_key, STRING, required=step.invalid_response is None))
+    elif step.multi:
+        fields.append(Field(step.input_key, LIST, items=STRING))
+    else:
+        fields.append(Field(step.input_key, STRING))
+
+    requires = ()
+    if step.other_options:
+        requires = (Requires(step.input_key, step.other_options, step.other_key),)
+    return Schema(fields=tuple(fields), requires=requires)
+
+
+DETAILS_SCHEMA = Schema(fields=(
+    Field("name", STRING),
+    Field("email", STRING),
+    Field("contact", STRING),
+    Field("company", STRING, required=False),
+    Field("ip", STRING, required=False),
+))
+
+FEEDBACK_SCHEMA = Schema(fields=(Field("row_id", ROW_ID), Field("text", STRING)))
+
+
+def compile_schemas(personas):
+    schemas = {
+        "create_database_api": Schema(fields=(Field("host", STRING), Field("user", STRING), Field("password", STRING))),
+        "create_tables_api": Schema(fields=(
+            Field("host", STRING), Field("user", STRING), Field("password", STRING), Field("database", STRING),
+        )),
+        "client": Schema(fields=(Field("client_type", STRING),)),
+    }
+    for persona in personas.values():
+        schemas[persona.details_endpoint] = DETAILS_SCHEMA
+        schemas[persona.feedback_endpoint] = FEEDBACK_SCHEMA
+        batch_steps = {"feedback": Schema(fields=(Field("text", STRING),))}
+        for step in persona.steps.values():
+            schemas[step.endpoint] = step_schema(step)
+            batch_steps[step.name] = step_schema(step, with_row_id=False)
+        schemas[persona.batch_endpoint] = Schema(
+            fields=(Field("row_id", ROW_ID), Field("steps", LIST, items=OBJECT)),
+            steps=MappingProxyType(batch_steps),
+        )
+    return MappingProxyType(schemas)
+
+
+SCHEMAS = compile_schemas(PERSONAS)
+
+_rejections_lock = threading.Lock()
+_rejections = Counter()  # (endpoint, reason) -> count
+
+
+def _reject(endpoint, problems):
+    with _rejections_lock:
+        for _, reason in problems:
+            _rejections[(endpoint, reason)] += 1
+    logging.warning(f"request rejected - {endpoint} {problems}")
+    body = {
+        "status": "error",
+        "code": 400,
+        "message": "Invalid request.",
+        "errors": [{"field": field, "reason": reason} for field, reason in problems],
+    }
+    return body, 400
+
+
+def rejection(endpoint, method, body):
+    """
+    Returns (response body, 400) when `body` does not fit the endpoint's schema,
+    None when it does or the endpoint has none. Shared by the Flask hook below
+    and the Quart hook in src/bot/asgi.py; `body` is None when it was not JSON.
+    """
+    schema = SCHEMAS.get(endpoint)
+    if schema is None or method != "POST":
+        return None
+    if body is None:
+        return _reject(endpoint, [("body", "invalid_json")])
+    problems = check(schema, body)
+    if problems:
+        return _reject(endpoint, problems)
+    return None
+
+
+def validate_request():
+    rejected = rejection(request.endpoint, request.method, request.get_json(silent=True))
+    if rejected is not None:
+        body, status = rejected
+        return jsonify(body), status
+    return None
+
+
+def get_validation_stats():
+    with _rejections_lock:
+        stats = {}
+        for (endpoint, reason), count in _rejections.items():
+            stats.setdefault(endpoint, {})[reason] = count
+        return stats
+
+
+def _rejection_samples():
+    for endpoint, reasons in get_validation_stats().items():
+        for reason, count in reasons.items():
+            yield (endpoint, reason), count
+
+
+Gauge(
+    "bot_validation_rejections_total",
+    "Request body problems rejected before the view, by endpoint and reason",
+    ("endpoint", "reason"),
+    _rejection_samples,
+    kind="counter",
+)
+
+
+def init_app(app):
+    app.before_request(validate_request)
@@ -0,0 +1,91 @@
+import os
+import re
+import sys
+import tempfile
+import pytest
+
+# settings are read once, on the first import of src.bot.config, so the test
+# environment has to be in place before any test module imports the app
+os.environ.setdefault("log_dir", tempfile.mkdtemp(prefix="bot-test-logs-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SMTP_CREDENTIALS = {
+    "sender_email": "bot@example.com",
+    "cc_email": "cc@example.com",
+    "prospect_receiver_emails": "sales@example.com",
+    "prospect_email_subject": "New prospect",
+    "existing_client_receiver_emails": "support@example.com",
+    "existing_client_email_subject": "Client issue",
+    "job_seeker_receiver_emails": "hr@example.com",
+    "job_seeker_email_subject": "New job seeker",
+}
+
+
+class FakeMySQL:
+    """
+    The conversation tables as dicts, for the request connection. Understands
+    the statements the flow handlers send: the details INSERT, UPDATE ... SET
+    ... WHERE <key> = %s, the conversation SELECT and the outbox INSERT.
+    """
+
+    def __init__(self):
+        self.tables = {}  # table -> row id -> {column: value}
+        self.outbox = []  # enqueue_values tuples
+        self.statements = []
+        self.commits = 0
+
+    def cursor(self, buffered=False):
+        return FakeMySQLCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def row(self, table, row_id):
+        return self.tables[table][row_id]
+
+
+class FakeMySQLCursor:
+    def __init__(self, db):
+        self.db = db
+        self.lastrowid = None
+        self.result = None
+
+    def execute(self, query, params=()):
+        query = " ".join(query.split())
+        self.db.statements.append((query, params))
+        if query.startswith("INSERT INTO EMAIL_OUTBOX"):
+            self.db.outbox.append(params)
+            self.lastrowid = len(self.db.outbox)
+        elif query.startswith("INSERT"):
+            table, columns = re.match(r"INSERT INTO (\w+) \(([^)]*)\)", query).groups()
+            rows = self.db.tables.setdefault(table, {})
+            self.lastrowid = len(rows) + 1
+            rows[self.lastrowid] = dict(zip(columns.split(", "), params))
+        elif query.startswith("UPDATE"):
+            table, assignments = re.match(r"UPDATE (\w+) SET (.*) WHERE \w+ = %s", query).groups()
+            columns = [assignment.split(" = ")[0] for assignment in assignments.split(", ")]
+            self.db.tables[table][params[-1]].update(zip(columns, params[:-1]))
+        else:
+            columns, table, key = re.match(r"SELECT (.*) FROM (\w+) WHERE (\w+) = %s", query).groups()
+            row = self.db.tables.get(table, {}).get(params[0])
+            row = None if row is None else dict(row, **{key: params[0]})
+            self.result = None if row is None else tuple(row.get(column) for column in columns.split(", "))
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def mysql(monkeypatch):
+    from src.bot import flow, conversation_buffer
+    from src.bot.conversation_buffer import ConversationBuffer
+
+    db = FakeMySQL()
+    monkeypatch.setattr(flow, "get_request_connection", lambda: db)
+    monkeypatch.setattr(conversation_buffer, "get_request_connection", lambda: db)
+    monkeypatch.setattr(conversation_buffer, "conversation_buffer", ConversationBuffer(max_conversations=10, idle_timeout=3600))
+    monkeypatch.setattr(flow, "get_smtp_credentials", lambda: SMTP_CREDENTIALS)
+    return db
@@ -0,0 +1,141 @@
+import smtplib
+from dataclasses import replace
+from types import SimpleNamespace
+import pytest
+from src.bot import alert
+from src.bot.alert import SMTPSession
+from src.bot.config import settings
+
+CREDENTIALS = {"smtp_server": "smtp.example.com", "smtp_port": 587, "smtp_username": "bot", "smtp_password": "secret"}
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in: every instance is one server connection, and `failures` are raised by the next sends."""
+
+    connections = []
+    failures = []
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.calls = []
+        self.noop_code = 250
+        FakeSMTP.connections.append(self)
+
+    def starttls(self, context=None):
+        self.calls.append("starttls")
+
+    def login(self, username, password):
+        self.calls.append("login")
+
+    def noop(self):
+        self.calls.append("noop")
+        return self.noop_code, b"OK"
+
+    def sendmail(self, sender, recipients, message):
+        self.calls.append("sendmail")
+        if FakeSMTP.failures:
+            raise FakeSMTP.failures.pop(0)
+
+    def quit(self):
+        self.calls.append("quit")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    FakeSMTP.connections = []
+    FakeSMTP.failures = []
+    monkeypatch.setattr(alert.smtplib, "SMTP", FakeSMTP)
+    monkeypatch.setattr(alert, "settings", replace(settings, smtp=replace(settings.smtp, debug_server=None)))
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(alert, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def send(session):
+    session.send(CREDENTIALS, "bot@example.com", ["sales@example.com"], "message")
+
+
+def test_the_connection_is_reused_without_a_noop_while_fresh(clock):
+    session = SMTPSession(noop_after=30, max_idle=240)
+    send(session)
+    clock.now += 10
+    send(session)
+    assert len(FakeSMTP.connections) == 1
+    assert FakeSMTP.connections[0].calls == ["starttls", "login", "sendmail", "sendmail"]
+    assert session.stats()["handshakes"] == 1
+
+
+def test_an_idle_connection_is_checked_with_noop_before_reuse(clock):
+    session = SMTPSession(noop_after=30, max_idle=240)
+    send(session)
+    clock.now += 31
+    send(session)
+    assert FakeSMTP.connections[0].calls == ["starttls", "login", "sendmail", "noop", "sendmail"]
+    assert session.stats()["noop_checks"] == 1
+
+    # a server that no longer answers NOOP with 250 gets a new connection
+    FakeSMTP.connections[0].noop_code = 421
+    clock.now += 31
+    send(session)
+    assert len(FakeSMTP.connections) == 2
+    assert FakeSMTP.connections[0].calls[-2:] == ["noop", "quit"]
+
+
+def test_a_connection_idle_past_max_idle_is_dropped_without_asking(clock):
+    session = SMTPSession(noop_after=30, max_idle=240)
+    send(session)
+    clock.now += 241
+    send(session)
+    assert FakeSMTP.connections[0].calls == ["starttls", "login", "sendmail", "quit"]
+    assert len(FakeSMTP.connections) == 2
+
+
+def test_the_connection_is_recycled_after_max_messages(clock):
+    session = SMTPSession(max_messages=2)
+    for _ in range(5):
+        send(session)
+    assert [connection.calls.count("sendmail") for connection in FakeSMTP.connections] == [2, 2, 1]
+    assert session.stats()["handshakes"] == 3
+    assert session.stats()["messages_sent"] == 5
+
+
+@pytest.mark.parametrize("failure", [
+    smtplib.SMTPServerDisconnected("Connection unexpectedly closed"),
+    smtplib.SMTPResponseException(421, b"Service not available"),
+])
+def test_a_dropped_send_is_retried_once_on_a_new_connection(clock, failure):
+    session = SMTPSession()
+    FakeSMTP.failures = [failure]
+    send(session)
+    assert len(FakeSMTP.connections) == 2
+    assert FakeSMTP.connections[1].calls == ["starttls", "login", "sendmail"]
+    assert session.stats() == dict(
+        handshakes=2, messages_sent=1, noop_checks=0, reconnects=1, send_failures=1, connected=True
+    )
+
+
+def test_a_second_drop_is_raised_and_not_retried_again(clock):
+    session = SMTPSession()
+    FakeSMTP.failures = [smtplib.SMTPServerDisconnected("gone"), smtplib.SMTPServerDisconnected("gone again")]
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        send(session)
+    assert len(FakeSMTP.connections) == 2
+    assert session.stats()["connected"] is False
+
+
+def test_a_rejected_message_is_not_retried(clock):
+    # anything but 421 means the server is up and refused this message; a retry would only repeat that
+    session = SMTPSession()
+    FakeSMTP.failures = [smtplib.SMTPResponseException(550, b"Mailbox unavailable")]
+    with pytest.raises(smtplib.SMTPResponseException):
+        send(session)
+    assert len(FakeSMTP.connections) == 1
+    assert session.stats()["reconnects"] == 0
+
+
+def test_new_credentials_force_a_new_login(clock):
+    session = SMTPSession()
+    send(session)
+    session.send(dict(CREDENTIALS, smtp_username="other"), "bot@example.com", ["sales@example.com"], "message")
+    assert len(FakeSMTP.connections) == 2
+    assert FakeSMTP.connections[0].calls[-1] == "quit"
@@ -0,0 +1,33 @@
+import app as bot_app
+
+
+def make_client(monkeypatch):
+    monkeypatch.setattr(bot_app, "build_greeting", lambda ip: f"Hello from {ip}")
+    return bot_app.create_app(start_outbox_worker=False).test_client()
+
+
+def test_greeting(monkeypatch):
+    response = make_client(monkeypatch).get("/chatbot/greeting")
+    assert response.status_code == 200
+    assert response.get_json() == {"status": "success", "message": "Hello from 127.0.0.1"}
+
+
+def test_greeting_uses_forwarded_for_behind_a_trusted_proxy(monkeypatch):
+    # the test client connects from 127.0.0.1, one of the default trusted proxies
+    response = make_client(monkeypatch).get("/chatbot/greeting", headers={"X-Forwarded-For": "198.51.100.4, 203.0.113.9"})
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "Hello from 203.0.113.9"
+
+
+def test_module_level_app_is_built_on_first_access(monkeypatch):
+    # `gunicorn app:app` still works, but importing app.py builds nothing
+    built = []
+    monkeypatch.setattr(bot_app, "create_app", lambda: built.append(1) or "the app")
+    vars(bot_app).pop("app", None)
+    try:
+        assert built == []
+        assert bot_app.app == "the app"
+        assert bot_app.app == "the app"
+        assert built == [1]
+    finally:
+        vars(bot_app).pop("app", None)
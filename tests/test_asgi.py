@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("quart_cors")
+
+import app as bot_app
+from src.bot import asgi
+
+
+def routes(app):
+    # HEAD and OPTIONS are added by the frameworks, and only Flask serves /static here
+    return {
+        (rule.rule, rule.endpoint, frozenset(rule.methods - {"HEAD", "OPTIONS"}))
+        for rule in app.url_map.iter_rules()
+        if rule.endpoint != "static"
+    }
+
+
+def test_the_async_app_serves_the_same_routes():
+    flask_app = bot_app.create_app(start_outbox_worker=False)
+    quart_app = asgi.create_async_app(start_outbox_worker=False)
+    assert routes(quart_app) == routes(flask_app)
+
+
+def test_both_apps_reject_a_bad_body_the_same_way():
+    body = {"row_id": 7, "selected_option": 4}
+    flask_response = bot_app.create_app(start_outbox_worker=False).test_client().post("/chatbot/prospect/rate", json=body)
+
+    async def post():
+        response = await asgi.create_async_app(start_outbox_worker=False).test_client().post("/chatbot/prospect/rate", json=body)
+        return response.status_code, await response.get_json()
+
+    assert asyncio.run(post()) == (flask_response.status_code, flask_response.get_json())
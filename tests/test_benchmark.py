@@ -0,0 +1,10 @@
+from src.bot.benchmark import parse_target
+
+
+def test_named_url_with_a_query_string():
+    assert parse_target("prod=http://127.0.0.1:8001/?a=b&c=d") == ("prod", "http://127.0.0.1:8001/?a=b&c=d")
+
+
+def test_bare_url():
+    assert parse_target("http://127.0.0.1:8000") == ("", "http://127.0.0.1:8000")
+    assert parse_target("http://127.0.0.1:8000/?a=b") == ("", "http://127.0.0.1:8000/?a=b")
@@ -0,0 +1,53 @@
+import pytest
+from src.bot import config
+from src.bot.config import ConfigError, load_settings, check_write_mode
+
+
+def test_buffered_mode_refuses_several_workers(monkeypatch):
+    monkeypatch.setattr(config, "settings", load_settings({"conversation_write_mode": "buffered"}))
+    check_write_mode(1)
+    with pytest.raises(ConfigError):
+        check_write_mode(3)
+
+
+def test_write_through_allows_several_workers(monkeypatch):
+    monkeypatch.setattr(config, "settings", load_settings({}))
+    check_write_mode(3)
+
+
+def test_replica_hosts():
+    replicas = load_settings({
+        "database_port": "3306",
+        "database_replica_hosts": "db-replica-1, db-replica-2:3307, [fd00::5]:3308, fd00::6, [fd00::7], 10.0.0.8:3309",
+    }).database.replicas
+    assert replicas == (
+        ("db-replica-1", 3306),
+        ("db-replica-2", 3307),
+        ("fd00::5", 3308),
+        ("fd00::6", 3306),
+        ("fd00::7", 3306),
+        ("10.0.0.8", 3309),
+    )
+
+
+@pytest.mark.parametrize("value", ["db:port", "[fd00::5", "[fd00::5]3307", "[not-an-ip]:3307", "fd00::zz", "[fd00::5]:"])
+def test_invalid_replica_hosts(value):
+    with pytest.raises(ConfigError, match="database_replica_hosts"):
+        load_settings({"database_replica_hosts": value})
+
+
+def test_log_levels_are_normalised():
+    log = load_settings({"log_levels": "database=warning, greet=DEBUG", "log_rotate_when": "W0"}).log
+    assert log.levels == "database=WARNING,greet=DEBUG"
+    assert log.rotate_when == "w0"
+
+
+@pytest.mark.parametrize("environ", [
+    {"log_levels": "database=verbose"},
+    {"log_levels": "database"},
+    {"log_levels": "=debug"},
+    {"log_rotate_when": "hourly"},
+])
+def test_invalid_log_settings(environ):
+    with pytest.raises(ConfigError, match=next(iter(environ))):
+        load_settings(environ)
@@ -0,0 +1,69 @@
+import pytest
+from src.bot import conversation_buffer as buffer_module
+from src.bot.conversation_buffer import ConversationBuffer, flush_conversation
+from src.bot.exception import CustomException
+
+TABLE, KEY = "PROSPECT_CONVERSATION", "PROSPECT_ID"
+
+
+class FakeCursor:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.executed = []
+
+    def execute(self, query, params=()):
+        if self.fail:
+            raise RuntimeError("lost connection")
+        self.executed.append((query, params))
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    fresh = ConversationBuffer(max_conversations=10, idle_timeout=3600)
+    monkeypatch.setattr(buffer_module, "conversation_buffer", fresh)
+    return fresh
+
+
+def test_flush_writes_buffered_answers_and_final_values(buffer):
+    buffer.record_insert(TABLE, KEY, 7, {"NAME": "Ada"})
+    buffer.record(TABLE, KEY, 7, "VERTICAL", 2)
+    cursor = FakeCursor()
+    with flush_conversation(cursor, TABLE, KEY, 7, {"FEEDBACK": "thanks"}) as in_memory:
+        pass
+    assert cursor.executed == [(f"UPDATE {TABLE} SET VERTICAL = %s, FEEDBACK = %s WHERE {KEY} = %s", (2, "thanks", 7))]
+    assert in_memory == {"NAME": "Ada", KEY: 7, "VERTICAL": 2, "FEEDBACK": "thanks"}
+    assert buffer.pop(TABLE, 7) == ({}, None)
+
+
+def test_failed_commit_restores_the_buffered_answers(buffer):
+    buffer.record_insert(TABLE, KEY, 7, {"NAME": "Ada"})
+    buffer.record(TABLE, KEY, 7, "VERTICAL", 2)
+    with pytest.raises(CustomException):
+        with flush_conversation(FakeCursor(), TABLE, KEY, 7, {"FEEDBACK": "thanks"}):
+            raise RuntimeError("commit failed")
+    # the feedback was never saved, only the step answers wait for the next flush
+    assert buffer.pop(TABLE, 7) == ({"VERTICAL": 2}, {"NAME": "Ada", KEY: 7})
+
+
+def test_failed_update_restores_the_buffered_answers(buffer):
+    buffer.record(TABLE, KEY, 7, "VERTICAL", 2)
+    with pytest.raises(CustomException):
+        with flush_conversation(FakeCursor(fail=True), TABLE, KEY, 7, {"FEEDBACK": "thanks"}):
+            pytest.fail("the block must not run when the UPDATE fails")
+    assert buffer.pop(TABLE, 7) == ({"VERTICAL": 2}, None)
+
+
+def test_restore_keeps_answers_recorded_meanwhile(buffer):
+    buffer.record(TABLE, KEY, 7, "VERTICAL", 2)
+    with pytest.raises(CustomException):
+        with flush_conversation(FakeCursor(), TABLE, KEY, 7, {}):
+            buffer.record(TABLE, KEY, 7, "VERTICAL", 3)
+            raise RuntimeError("commit failed")
+    assert buffer.pop(TABLE, 7) == ({"VERTICAL": 3}, None)
+
+
+def test_failure_with_nothing_buffered_leaves_the_buffer_empty(buffer):
+    with pytest.raises(CustomException):
+        with flush_conversation(FakeCursor(), TABLE, KEY, 7, {"FEEDBACK": "thanks"}):
+            raise RuntimeError("commit failed")
+    assert buffer.stats()["conversations"] == 0
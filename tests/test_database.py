@@ -0,0 +1,185 @@
+from dataclasses import replace
+from types import SimpleNamespace
+import pytest
+from src.bot import database, smtp_creds_db
+from src.bot.config import settings
+from src.bot.database import read_connection
+
+
+class FakeServer:
+    """One MySQL server: its replication lag (None when it is not replicating) and whether it is up."""
+
+    def __init__(self, lag=None, up=True):
+        self.lag = lag
+        self.up = up
+
+
+class FakeCursor:
+    description = [("Seconds_Behind_Source",)]
+
+    def __init__(self, server):
+        self.server = server
+
+    def execute(self, query, params=()):
+        self.query = query
+
+    def fetchone(self):
+        if self.query.startswith("SHOW"):
+            return None if self.server.lag is None else (self.server.lag,)
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    unread_result = False
+    in_transaction = False
+
+    def __init__(self, host):
+        self.host = host
+
+    def cursor(self, buffered=False):
+        return FakeCursor(SERVERS[self.host])
+
+    def close(self):
+        pass
+
+
+SERVERS = {}
+
+
+def connect(host, **kwargs):
+    if not SERVERS[host].up:
+        raise OSError(f"can't connect to {host}")
+    return FakeConnection(host)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    SERVERS.clear()
+    SERVERS.update(primary=FakeServer(), r1=FakeServer(lag=1.0), r2=FakeServer(lag=1.0))
+    monkeypatch.setattr(database.conn, "connect", connect)
+    monkeypatch.setattr(database, "_pools", {})
+    monkeypatch.setattr(database, "_replica_lag", {})
+    monkeypatch.setattr(database.READS, "_values", {})
+    return replace(
+        settings.database,
+        host="primary",
+        replicas=(("r1", 3306), ("r2", 3306)),
+        replica_max_lag=5.0,
+        replica_lag_check_interval=0.0,  # measure on every read
+    )
+
+
+def hosts_read(db, reads=4, **kwargs):
+    hosts = []
+    for _ in range(reads):
+        with read_connection(db, **kwargs) as mydb:
+            hosts.append(mydb.host)
+    return hosts
+
+
+def test_reads_alternate_between_healthy_replicas(db):
+    assert sorted(hosts_read(db)) == ["r1", "r1", "r2", "r2"]
+    assert database.READS._values == {("replica", "replica"): 4}
+
+
+def test_a_lagging_replica_is_skipped(db):
+    SERVERS["r2"].lag = 30.0
+    assert hosts_read(db) == ["r1"] * 4
+
+
+def test_primary_takes_the_reads_when_every_replica_lags(db):
+    SERVERS["r1"].lag = SERVERS["r2"].lag = 30.0
+    assert hosts_read(db) == ["primary"] * 4
+    assert database.READS._values == {("primary", "replica_lagging"): 4}
+
+
+def test_primary_takes_the_reads_when_replicas_are_down_or_not_replicating(db):
+    SERVERS["r1"].up = False
+    SERVERS["r2"].lag = None
+    assert hosts_read(db) == ["primary"] * 4
+    assert database.READS._values == {("primary", "replica_error"): 4}
+
+
+def test_a_recovered_replica_is_used_again(db):
+    SERVERS["r1"].up = False
+    SERVERS["r2"].up = False
+    assert hosts_read(db, reads=1) == ["primary"]
+    SERVERS["r1"].up = True
+    assert hosts_read(db) == ["r1"] * 4
+
+
+def test_fresh_reads_and_no_replicas_use_the_primary(db):
+    assert hosts_read(db, fresh=True) == ["primary"] * 4
+    assert hosts_read(replace(db, replicas=())) == ["primary"] * 4
+    assert database.READS._values == {("primary", "fresh"): 4, ("primary", "no_replica"): 4}
+
+
+def test_stand_ins_without_lag_checks(db):
+    # plain local servers that are not replicating still serve reads with replica_check_lag off
+    SERVERS["r1"].lag = SERVERS["r2"].lag = None
+    assert sorted(hosts_read(replace(db, replica_check_lag=False))) == ["r1", "r1", "r2", "r2"]
+
+
+def test_errors_inside_the_block_propagate_and_return_the_connection(db):
+    with pytest.raises(KeyError):
+        with read_connection(db):
+            raise KeyError("caller")
+    assert all(pool.stats()["in_use"] == 0 for pool in database._pools.values())
+
+
+@pytest.fixture
+def credentials(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    loads = []
+
+    def load(db=None):
+        loads.append(database._smtp_credentials_fresh(db))
+        return {"smtp_server": "smtp.example.com", "smtp_username": f"bot{len(loads)}"}
+
+    monkeypatch.setattr(database, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(database, "settings", replace(settings, smtp=replace(settings.smtp, credentials_ttl=60.0)))
+    monkeypatch.setattr(database, "_smtp_credentials_cache", {})
+    monkeypatch.setattr(database, "_smtp_credentials_stats", {"hits": 0, "misses": 0, "invalidations": 0})
+    monkeypatch.setattr(database, "_smtp_credentials_changed", [None])
+    monkeypatch.setattr(database, "load_smtp_credentials", load)
+    return SimpleNamespace(clock=clock, loads=loads)
+
+
+def test_smtp_credentials_are_read_once_per_ttl(credentials):
+    db = replace(settings.database, replica_max_lag=5.0, replica_lag_check_interval=1.0)
+    assert database.get_smtp_credentials(db)["smtp_username"] == "bot1"
+    credentials.clock.now += 59
+    assert database.get_smtp_credentials(db)["smtp_username"] == "bot1"
+    credentials.clock.now += 2
+    assert database.get_smtp_credentials(db)["smtp_username"] == "bot2"
+    assert credentials.loads == [False, False]
+    assert database.get_smtp_credentials_cache_stats() == {"hits": 1, "misses": 2, "invalidations": 0, "ttl": 60.0}
+
+
+def test_callers_get_a_copy_of_the_cached_credentials(credentials):
+    database.get_smtp_credentials()["smtp_username"] = "changed"
+    assert database.get_smtp_credentials()["smtp_username"] == "bot1"
+
+
+def test_writing_new_credentials_invalidates_the_cache(credentials, monkeypatch):
+    db = replace(settings.database, replica_max_lag=5.0, replica_lag_check_interval=1.0)
+    written = SimpleNamespace(statements=[], commits=0)
+    cursor = SimpleNamespace(execute=lambda query, params=(): written.statements.append(params))
+    mydb = SimpleNamespace(commit=lambda: setattr(written, "commits", written.commits + 1))
+    monkeypatch.setattr(smtp_creds_db, "connect_to_mysql_database", lambda *args: mydb)
+    monkeypatch.setattr(smtp_creds_db, "create_cursor_object", lambda mydb: cursor)
+
+    database.get_smtp_credentials(db)
+    assert smtp_creds_db.smtp_creds_to_db("primary", "user", "password", "bot") is True
+    assert written.commits == 1
+    assert database.get_smtp_credentials(db)["smtp_username"] == "bot2"
+    assert database.get_smtp_credentials_cache_stats()["invalidations"] == 1
+
+    # until replicas have had time to catch up, the new row is read from the primary
+    assert credentials.loads == [False, True]
+    credentials.clock.now += 61
+    database.get_smtp_credentials(db)
+    assert credentials.loads == [False, True, False]
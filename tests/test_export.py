@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from datetime import datetime
+from src.bot import export
+from src.bot.export import iter_rows, page_query
+from src.bot.flow import PERSONAS
+
+PROSPECT = PERSONAS["prospect"]
+KEY = PROSPECT.key_column
+COLUMNS = list(PROSPECT.column_map)
+DAY = datetime(2026, 1, 5, 9, 30)
+
+
+def make_row(row_id, created):
+    return tuple({KEY: row_id, "CREATED": created, "RATING": 5}.get(column) for column in COLUMNS)
+
+
+class FakeTable:
+    """Answers the export's page queries from a list of rows, applying the keyset condition and LIMIT."""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row[COLUMNS.index("CREATED")], row[COLUMNS.index(KEY)]))
+        self.checked_out = False
+        self.queries = []
+
+    @contextmanager
+    def connection(self, db=None):
+        self.checked_out = True
+        try:
+            yield self
+        finally:
+            self.checked_out = False
+
+    def cursor(self, buffered=False):
+        return self
+
+    def execute(self, query, params):
+        self.queries.append((query, params))
+        rows = self.rows
+        if "CREATED = %s AND" in query:
+            created, _, key = params[-4:-1]
+            position = lambda row: (row[COLUMNS.index("CREATED")], row[COLUMNS.index(KEY)])
+            rows = [row for row in rows if position(row) > (created, key)]
+        self.result = rows[:params[-1]]
+
+    def fetchmany(self, size):
+        return self.result[:size]
+
+    def close(self):
+        pass
+
+
+def test_page_query_without_bounds():
+    query, params = page_query(PROSPECT, ["CREATED", KEY], None, None, None, 100)
+    assert query == f"SELECT CREATED, {KEY} FROM {PROSPECT.table} ORDER BY CREATED, {KEY} LIMIT %s"
+    assert params == (100,)
+
+
+def test_page_query_continues_after_the_last_row_of_the_previous_page():
+    start, end = datetime(2026, 1, 1), datetime(2026, 2, 1)
+    query, params = page_query(PROSPECT, ["CREATED", KEY], start, end, (DAY, 41), 100)
+    assert f"WHERE CREATED >= %s AND CREATED < %s AND (CREATED > %s OR (CREATED = %s AND {KEY} > %s))" in query
+    assert "OFFSET" not in query
+    assert params == (start, end, DAY, DAY, 41, 100)
+
+
+def test_pages_split_rows_sharing_a_timestamp_without_losing_or_repeating_any(monkeypatch):
+    # five rows in the same second, read two per page
+    table = FakeTable([make_row(row_id, DAY) for row_id in (5, 3, 9, 1, 7)])
+    monkeypatch.setattr(export, "read_connection", table.connection)
+    rows = list(iter_rows(PROSPECT, page_size=2))
+    assert [row[KEY] for row in rows] == [1, 3, 5, 7, 9]
+    assert len(table.queries) == 3
+    assert table.queries[1][1][-4:] == (DAY, DAY, 3, 2)
+
+
+def test_a_full_last_page_costs_one_empty_query(monkeypatch):
+    table = FakeTable([make_row(row_id, DAY) for row_id in (1, 2)])
+    monkeypatch.setattr(export, "read_connection", table.connection)
+    assert len(list(iter_rows(PROSPECT, page_size=2))) == 2
+    assert len(table.queries) == 2
+
+
+def test_rows_are_decoded_and_sent_after_the_connection_is_returned(monkeypatch):
+    table = FakeTable([make_row(1, DAY)])
+    monkeypatch.setattr(export, "read_connection", table.connection)
+    for row in iter_rows(PROSPECT, page_size=10):
+        assert not table.checked_out
+        assert row["RATING"] == "Outstanding"
@@ -0,0 +1,259 @@
+from datetime import datetime, timezone
+from functools import partial
+import pytest
+from src.bot import conversation_buffer, flow
+from src.bot.database import fetch_conversation
+from src.bot.exception import CustomException
+from src.bot.flow import PERSONAS, decode_columns, handle_batch, handle_details, handle_feedback, handle_step
+
+ROW = 7
+
+# what the per-route handlers in the original app.py stored and answered, one case per
+# declared step (plus the free text variants): persona, step, body, column, stored value, response
+BASELINE = [
+    ("prospect", "industries", {"selected_options": ["1", "11", "99"], "source_specification": "Mining"},
+     "INDUSTRY", "Insurance,Others : Mining", {"selected_industries": ["Insurance", "Others : Mining"], "code": 200, "row_id": ROW}),
+    ("prospect", "verticals", {"selected_option": "2"},
+     "VERTICAL", "IT Infrastructure", {"selected_vertical": "IT Infrastructure", "code": 200, "row_id": ROW}),
+    ("prospect", "verticals", {"selected_option": "6", "source_specification": "IoT"},
+     "VERTICAL", "Others : IoT", {"selected_vertical": "Others : IoT", "code": 200, "row_id": ROW}),
+    ("prospect", "ai_requirement", {"selected_option": "4", "requirement_specification": "A chatbot"},
+     "REQUIREMENTS", "Others : A chatbot", {"selected_requirement": "Others : A chatbot", "code": 200, "row_id": ROW}),
+    ("prospect", "md_requirement", {"selected_option": "2"},
+     "REQUIREMENTS", "Version Upgrades", {"selected_requirement": "Version Upgrades", "code": 200, "row_id": ROW}),
+    ("prospect", "sf_requirement", {"selected_option": "2"},
+     "REQUIREMENTS", "Platform Migration", {"selected_requirement": "Platform Migration", "code": 200, "row_id": ROW}),
+    ("prospect", "it_requirement", {"selected_option": "3"},
+     "REQUIREMENTS", "Implementation and Migration", {"selected_requirement": "Implementation and Migration", "code": 200, "row_id": ROW}),
+    ("prospect", "known_source", {"selected_option": "2"},
+     "KNOWN_SOURCE", "LinkedIn", {"selected_known_source": "LinkedIn", "code": 200, "row_id": ROW}),
+    ("prospect", "known_source", {"selected_option": "5", "source_specification": "A colleague"},
+     "KNOWN_SOURCE", "A colleague", {"selected_known_source": "A colleague", "code": 200, "row_id": ROW}),
+    ("prospect", "rate", {"selected_option": "4"},
+     "RATING", "Excellent", {"status": "success", "message": "Excellent", "code": 200, "row_id": ROW}),
+    ("existing_client", "verticals", {"selected_options": ["2", "6"], "source_specification": "ERP"},
+     "VERTICAL", "Sales force,Others : ERP", {"selected_verticals": ["Sales force", "Others : ERP"], "code": 200, "row_id": ROW}),
+    ("existing_client", "issue_escalation", {"selected_option": "2"},
+     "ISSUE_ESCALATION", "Support", {"selected_isse_type": "Support", "code": 200, "row_id": ROW}),
+    ("existing_client", "issue_type", {"user_response": "3"},
+     "ISSUE_TYPE", "High", {"user_response": "High", "row_id": ROW, "code": 200}),
+    ("existing_client", "collect_issue", {"issue": "Login fails"},
+     "ISSUE_TEXT", "Login fails", {"message": "client issue saved", "issue": "Login fails", "row_id": ROW}),
+    ("existing_client", "rate", {"selected_option": "1"},
+     "RATING", "Requires Improvement", {"status": "success", "message": "Requires Improvement", "code": 200, "row_id": ROW}),
+    ("job_seeker", "category", {"user_type": "3"},
+     "CATEGORY", "External consultant", {"user_type": "External consultant", "row_id": ROW, "code": 200}),
+    ("job_seeker", "verticals", {"selected_options": ["5"]},
+     "VERTICAL", "Salesforce", {"selected_verticals": ["Salesforce"], "code": 200, "row_id": ROW}),
+    ("job_seeker", "interview_avail", {"user_response": "1"},
+     "INTERVIEW_AVAILABLE", "Yes", {"selected_interview_avail": "Yes", "row_id": ROW, "code": 200}),
+    ("job_seeker", "interview_mode", {"user_response": "2"},
+     "INTERVIEW_MODE", "In person Interview", {"selected_interview_mode": "In person Interview", "row_id": ROW, "code": 200}),
+    ("job_seeker", "date_of_interview", {"interview_date": "2024-06-03 10:00"},
+     "TIME_AVAILABLE", "2024-06-03 10:00", {"interview_date": "2024-06-03 10:00", "row_id": ROW, "code": 200}),
+    ("job_seeker", "notice_period", {"joining_date": "4"},
+     "NOTICE_PERIOD", "60 days", {"joining_date": "60 days", "row_id": ROW, "code": 200}),
+    ("job_seeker", "linkedin_url", {"linkedin_url": "https://www.linkedin.com/in/ada"},
+     "LINKEDIN_URL", "https://www.linkedin.com/in/ada", {"message": "LinkedIn URL received", "row_id": ROW, "linkedin_url": "https://www.linkedin.com/in/ada"}),
+    ("job_seeker", "rate", {"selected_option": "5"},
+     "RATING", "Outstanding", {"status": "success", "message": "Outstanding", "code": 200, "row_id": ROW}),
+]
+
+# the original handlers' answers to an invalid body; nothing was stored
+BASELINE_REJECTIONS = [
+    ("prospect", "ai_requirement", {"selected_option": "9"}, ({"message": "Please choose a valid option.", "code": 400}, 200)),
+    ("prospect", "known_source", {"selected_option": None}, ({"message": "Please choose a valid option.", "code": 400}, 200)),
+    ("prospect", "rate", {"selected_option": "6"}, ({"status": "error", "message": "Invalid option. Please choose from 1 to 5."}, 200)),
+    ("existing_client", "issue_escalation", {"selected_option": "3"}, ({"message": "Please choose a valid option.", "code": 400}, 200)),
+    ("job_seeker", "category", {"user_type": "4"}, ({"message": "Please choose a valid option.", "code": 400}, 200)),
+    ("job_seeker", "notice_period", {"joining_date": "6"}, ({"error": "Invalid input. Please select a valid option.", "code": 400}, 200)),
+    ("job_seeker", "linkedin_url", {"linkedin_url": ""}, ({"error": "No LinkedIn URL provided"}, 400)),
+]
+
+
+def conversation(mysql, persona):
+    # a row as left by the user details step
+    mysql.tables.setdefault(persona.table, {})[ROW] = {"NAME": "Ada"}
+    return mysql.row(persona.table, ROW)
+
+
+def test_every_declared_step_has_a_baseline_case():
+    declared = {(persona.name, name) for persona in PERSONAS.values() for name in persona.steps}
+    assert {(persona, step) for persona, step, *_ in BASELINE} == declared
+
+
+@pytest.mark.parametrize("persona, step, body, column, stored, response", BASELINE)
+def test_steps_store_and_answer_like_the_original_handlers(mysql, persona, step, body, column, stored, response):
+    persona = PERSONAS[persona]
+    row = conversation(mysql, persona)
+    assert handle_step(persona, persona.steps[step], dict(body, row_id=ROW)) == (response, 200)
+    assert set(row) == {"NAME", column}
+    # option codes are stored as numbers and read back as the label the original handler stored
+    assert decode_columns(persona, row)[column] == stored
+    assert mysql.commits == 1
+
+
+@pytest.mark.parametrize("persona, step, body, answer", BASELINE_REJECTIONS)
+def test_invalid_bodies_are_answered_like_the_original_handlers(mysql, persona, step, body, answer):
+    persona = PERSONAS[persona]
+    row = conversation(mysql, persona)
+    assert handle_step(persona, persona.steps[step], dict(body, row_id=ROW)) == answer
+    assert row == {"NAME": "Ada"}
+    assert mysql.statements == []
+
+
+def test_an_unknown_prospect_vertical_still_raises(mysql):
+    # the original route answered it with its 500 handler
+    persona = PERSONAS["prospect"]
+    with pytest.raises(ValueError):
+        handle_step(persona, persona.steps["verticals"], {"selected_option": "9", "row_id": ROW})
+
+
+@pytest.mark.parametrize("persona", PERSONAS.values(), ids=PERSONAS.keys())
+def test_single_choice_codes_round_trip_through_decode_columns(persona):
+    for column, options in persona.coded_columns.items():
+        for number, label in options.items():
+            assert decode_columns(persona, {column: int(number)}) == {column: label}
+    # unset answers and columns that keep their text are left alone
+    text_column = next(step.column for step in persona.steps.values() if not step.coded)
+    assert decode_columns(persona, {text_column: "1", "RATING": None}) == {text_column: "1", "RATING": None}
+
+
+def batch(mysql, persona, *steps):
+    persona = PERSONAS[persona]
+    row = conversation(mysql, persona)
+    body, status = handle_batch(persona, {"row_id": ROW, "steps": list(steps)})
+    assert status == 200
+    return body, row
+
+
+def test_a_batch_is_written_in_one_update_and_answers_each_step_in_order(mysql):
+    body, row = batch(
+        mysql, "job_seeker",
+        {"step": "notice_period", "joining_date": "3"},
+        {"step": "category", "user_type": "2"},
+        {"step": "linkedin_url", "linkedin_url": "https://www.linkedin.com/in/ada"},
+    )
+    assert body["message"] == "Steps saved successfully"
+    assert [result["step"] for result in body["results"]] == ["notice_period", "category", "linkedin_url"]
+    assert body["results"][1] == {"step": "category", "status": 200, "response": {"user_type": "Experienced", "row_id": ROW, "code": 200}}
+    assert decode_columns(PERSONAS["job_seeker"], row) == {
+        "NAME": "Ada", "NOTICE_PERIOD": "30 days", "CATEGORY": "Experienced", "LINKEDIN_URL": "https://www.linkedin.com/in/ada",
+    }
+    assert len(mysql.statements) == 1 and mysql.commits == 1
+
+
+def test_a_later_step_for_the_same_column_wins(mysql):
+    body, row = batch(
+        mysql, "prospect",
+        {"step": "ai_requirement", "selected_option": "1"},
+        {"step": "it_requirement", "selected_option": "2"},
+    )
+    assert row["REQUIREMENTS"] == "Maintenance and Troubleshooting"
+
+
+def test_one_invalid_step_rejects_the_whole_batch(mysql):
+    body, row = batch(
+        mysql, "prospect",
+        {"step": "known_source", "selected_option": "2"},
+        {"step": "rate", "selected_option": "9"},
+        {"step": "verticals", "selected_option": "9"},
+        {"step": "no_such_step"},
+        {"step": "feedback", "text": "thanks"},
+    )
+    assert body["code"] == 400
+    assert body["message"] == "Nothing was saved, please correct the invalid steps."
+    # each step gets the answer its own route would give, in the order sent
+    assert body["results"] == [
+        {"step": "known_source", "status": 200, "response": {"selected_known_source": "LinkedIn", "code": 200, "row_id": ROW}},
+        {"step": "rate", "status": 200, "response": {"status": "error", "message": "Invalid option. Please choose from 1 to 5."}},
+        {"step": "verticals", "status": 400, "response": {"message": "Invalid selection", "code": 400}},
+        {"step": "no_such_step", "status": 400, "response": {"message": "Unknown step.", "code": 400}},
+        {"step": "feedback", "status": 200, "response": {"message": "Feedback saved successfully", "feedback": "thanks", "row_id": ROW}},
+    ]
+    assert row == {"NAME": "Ada"}
+    assert mysql.statements == [] and mysql.outbox == []
+
+
+def test_an_empty_batch_writes_nothing(mysql):
+    body, row = batch(mysql, "prospect")
+    assert (body["code"], body["message"], body["results"]) == (400, "No steps provided.", [])
+    assert mysql.statements == []
+
+
+def test_a_batch_with_the_feedback_queues_the_email_in_the_same_commit(mysql):
+    body, row = batch(
+        mysql, "existing_client",
+        {"step": "issue_type", "user_response": "2"},
+        {"step": "feedback", "text": "thanks"},
+    )
+    assert row["FEEDBACK"] == "thanks"
+    assert mysql.commits == 1
+    (email,) = mysql.outbox
+    assert email[1:3] == ("bot@example.com", "support@example.com")
+    assert "Issue Urgency: Medium" in email[-1]
+
+
+def test_a_failed_batch_commit_keeps_nothing_in_memory(mysql, monkeypatch):
+    monkeypatch.setattr(conversation_buffer, "write_mode", conversation_buffer.BUFFERED)
+    persona = PERSONAS["prospect"]
+    buffer = conversation_buffer.conversation_buffer
+    buffer.record_insert(persona.table, persona.key_column, ROW, {"NAME": "Ada"})
+    conversation(mysql, persona)
+
+    def commit():
+        raise OSError("lost connection")
+
+    monkeypatch.setattr(mysql, "commit", commit)
+    with pytest.raises(CustomException):
+        handle_batch(persona, {"row_id": ROW, "steps": [{"step": "rate", "selected_option": "3"}]})
+    # the answers were never committed, so the in-memory row must not claim them
+    assert buffer.pop(persona.table, ROW) == ({}, {"NAME": "Ada", persona.key_column: ROW})
+
+
+def test_a_buffered_batch_keeps_the_row_for_the_feedback_email(mysql, monkeypatch):
+    monkeypatch.setattr(conversation_buffer, "write_mode", conversation_buffer.BUFFERED)
+    persona = PERSONAS["prospect"]
+    buffer = conversation_buffer.conversation_buffer
+    buffer.record_insert(persona.table, persona.key_column, ROW, {"NAME": "Ada"})
+    conversation(mysql, persona)
+    handle_batch(persona, {"row_id": ROW, "steps": [{"step": "rate", "selected_option": "3"}]})
+    assert mysql.row(persona.table, ROW)["RATING"] == 3
+    assert buffer.pop(persona.table, ROW) == ({}, {"NAME": "Ada", persona.key_column: ROW, "RATING": 3})
+
+
+CREATED = datetime(2024, 6, 3, 9, 30, 15)
+
+
+@pytest.mark.parametrize("persona", PERSONAS.values(), ids=PERSONAS.keys())
+def test_coded_answers_and_created_are_stored_compactly_and_read_back_as_labels(mysql, monkeypatch, persona):
+    monkeypatch.setattr(flow, "get_current_utc_datetime", lambda: CREATED.replace(microsecond=123456, tzinfo=timezone.utc))
+    details = {"name": "Ada Lovelace", "email": "ada@example.com", "contact": "+44 20 7946 0958", "company": "Engines", "ip": "49.204.17.5"}
+    saved, _ = handle_details(persona, details)
+    row_id = saved["row_id"]
+    row = mysql.row(persona.table, row_id)
+    # a naive UTC DATETIME, to the second
+    assert row["CREATED"] == CREATED
+
+    labels = {}
+    for name, step, body, column, stored, _ in BASELINE:
+        if name == persona.name and persona.steps[step].coded and column not in labels:
+            handle_step(persona, persona.steps[step], dict(body, row_id=row_id))
+            labels[column] = stored
+    assert set(labels) == set(persona.coded_columns)
+    # TINYINT columns hold the option number, not the label
+    assert all(type(row[column]) is int for column in labels)
+
+    handle_feedback(persona, {"row_id": row_id, "text": "Thanks"})
+    conversation = fetch_conversation(
+        persona.conversation_class, persona.table, persona.column_map, row_id, mysql, partial(decode_columns, persona)
+    )
+    # INTERVIEW_AVAILABLE is stored but, as before, not part of the conversation read back
+    fields = {persona.column_map[column]: label for column, label in labels.items() if column in persona.column_map}
+    assert {field: getattr(conversation, field) for field in fields} == fields
+    assert (conversation.date, conversation.time) == (CREATED.date(), CREATED.time())
+
+    (email,) = mysql.outbox
+    message = email[-1]
+    assert "Date: 2024-06-03\nTime: 09:30:15\n" in message
+    assert all(f": {label}\n" in message for label in fields.values())
@@ -0,0 +1,119 @@
+from dataclasses import replace
+import pytest
+from src.bot import greet
+from src.bot.config import settings
+from src.bot.geoip import GeoIPIndex, build_index
+from src.bot.greet import LookupCache
+
+# two adjacent IPv4 ranges (the second in integer notation), a gap, an IPv6 range
+# and a row without a city
+RANGES = """start_ip,end_ip,city
+203.0.113.0,203.0.113.255,Chennai
+198.51.100.0,198.51.100.127,Coimbatore
+3325256832,3325256959,Madurai
+2001:db8::,2001:db8::ffff,Bengaluru
+192.0.2.0,192.0.2.255,
+"""
+
+
+def build(tmp_path, text, name="ranges.csv", locations=None):
+    csv_path = tmp_path / name
+    csv_path.write_text(text, encoding="utf-8")
+    locations_path = None
+    if locations is not None:
+        locations_path = tmp_path / "locations.csv"
+        locations_path.write_text(locations, encoding="utf-8")
+    index_path = tmp_path / "geoip.idx"
+    build_index(str(csv_path), str(index_path), locations_path and str(locations_path))
+    return str(index_path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = GeoIPIndex(build(tmp_path, RANGES))
+    yield index
+    index.close()
+
+
+def test_ranges_without_a_city_are_left_out(index):
+    assert index.count == 4
+
+
+@pytest.mark.parametrize("ip, city", [
+    ("203.0.113.0", "Chennai"),
+    ("203.0.113.77", "Chennai"),
+    ("203.0.113.255", "Chennai"),
+    ("198.51.100.127", "Coimbatore"),
+    ("198.51.100.128", "Madurai"),
+    ("198.51.100.255", "Madurai"),
+    ("2001:db8::", "Bengaluru"),
+    ("2001:db8::ffff", "Bengaluru"),
+])
+def test_range_edges(index, ip, city):
+    assert index.lookup(ip) == city
+
+
+@pytest.mark.parametrize("ip", [
+    "0.0.0.0",
+    "198.51.99.255",  # below the first range
+    "198.51.101.0",  # between ranges
+    "203.0.112.255",
+    "203.0.114.0",  # past the last IPv4 range
+    "192.0.2.10",  # the range without a city
+    "2001:db8::1:0",
+    "ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff",
+])
+def test_misses(index, ip):
+    assert index.lookup(ip) is None
+
+
+def test_ipv4_mapped_ipv6_finds_the_ipv4_range(index):
+    assert index.lookup("::ffff:203.0.113.5") == "Chennai"
+    assert index.lookup(" 203.0.113.5 ") == "Chennai"
+
+
+@pytest.mark.parametrize("ip", ["", "not-an-ip", "203.0.113", "203.0.113.256", "2001:db8::g", None])
+def test_bad_input_is_a_miss(index, ip):
+    assert index.lookup(ip) is None
+
+
+def test_cidr_and_maxmind_layouts(tmp_path):
+    index = GeoIPIndex(build(tmp_path, "network,city\n203.0.113.0/25,Chennai\n2001:db8::/48,Bengaluru\n"))
+    assert (index.lookup("203.0.113.127"), index.lookup("203.0.113.128")) == ("Chennai", None)
+    assert index.lookup("2001:db8:0:ffff::1") == "Bengaluru"
+    index.close()
+
+    index = GeoIPIndex(build(
+        tmp_path,
+        "network,geoname_id\n198.51.100.0/24,1264527\n203.0.113.0/24,\n",
+        name="blocks.csv",
+        locations="geoname_id,city_name\n1264527,Chennai\n",
+    ))
+    assert (index.lookup("198.51.100.9"), index.lookup("203.0.113.9"), index.count) == ("Chennai", None, 1)
+    index.close()
+
+
+def test_an_over_long_city_is_cut_on_a_character_boundary(tmp_path):
+    # 0x8000 two-byte characters: a byte cut at 0xFFFF would split the last one
+    index = GeoIPIndex(build(tmp_path, "start_ip,end_ip,city\n203.0.113.0,203.0.113.255," + "é" * 0x8000 + "\n"))
+    assert index.lookup("203.0.113.1") == "é" * 0x7FFF
+    index.close()
+
+
+def test_a_file_that_is_not_an_index_is_refused(tmp_path):
+    path = tmp_path / "geoip.idx"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        GeoIPIndex(str(path))
+
+
+def test_the_greeting_runs_offline_with_the_local_resolver(tmp_path, monkeypatch):
+    # documentation ranges are not global addresses and get the plain greeting, so use a routable one
+    index_path = build(tmp_path, "network,city\n49.204.0.0/16,Chennai\n")
+    greeting = replace(settings.greeting, geoip_resolver="local", geoip_index_path=index_path)
+    monkeypatch.setattr(greet, "settings", replace(settings, greeting=greeting))
+    monkeypatch.setattr(greet, "get_location", lambda ip: pytest.fail("ipapi must not be called"))
+    monkeypatch.setattr(greet, "weather_cache", LookupCache("weather", maxsize=10, ttl=60, stale=600))
+    monkeypatch.setattr(greet, "get_weather", lambda location: "clear")
+    assert greet.enrich_greeting("49.204.17.5") == ("Chennai", "Enjoy the clear weather!")
+    assert greet.enrich_greeting("8.8.8.8") == (None, None)
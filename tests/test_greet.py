@@ -0,0 +1,163 @@
+import time
+import asyncio
+import threading
+from types import SimpleNamespace
+import pytest
+import requests
+from src.bot import greet
+from src.bot.exception import CustomException
+from src.bot.greet import LookupCache, get_location, get_weather
+
+
+class FakeResponse:
+    def __init__(self, status, text="", body=None):
+        self.status_code = status
+        self.text = text
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def json(self):
+        return self.body
+
+
+class FakeHttp:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def get(self, url, timeout=None):
+        return self.responses.pop(0)
+
+
+@pytest.mark.parametrize("response", [
+    FakeResponse(429, "RateLimited"),
+    FakeResponse(503, "Service Unavailable"),
+    FakeResponse(200, "RateLimited"),
+    FakeResponse(200, '{"error": true, "reason": "RateLimited"}'),
+    FakeResponse(200, "Undefined"),
+    FakeResponse(200, ""),
+])
+def test_location_failures_raise(monkeypatch, response):
+    monkeypatch.setattr(greet, "http", FakeHttp(response))
+    with pytest.raises(CustomException):
+        get_location("203.0.113.9")
+
+
+def test_location_is_the_city(monkeypatch):
+    monkeypatch.setattr(greet, "http", FakeHttp(FakeResponse(200, "Chennai\n")))
+    assert get_location("203.0.113.9") == "Chennai"
+
+
+def test_weather_failures_raise(monkeypatch):
+    monkeypatch.setattr(greet, "http", FakeHttp(FakeResponse(401, body={"cod": 401}), FakeResponse(200, body={"cod": "404", "message": "city not found"})))
+    for _ in range(2):
+        with pytest.raises(CustomException):
+            get_weather("Chennai")
+
+
+def test_failed_lookups_are_not_cached(monkeypatch):
+    monkeypatch.setattr(greet, "http", FakeHttp(FakeResponse(429, "RateLimited"), FakeResponse(200, "Chennai")))
+    cache = LookupCache("location", maxsize=10, ttl=60, stale=600)
+    with pytest.raises(CustomException):
+        cache.get("203.0.113.9", get_location)
+    assert cache.stats()["size"] == 0
+    assert cache.get("203.0.113.9", get_location) == "Chennai"
+    assert cache.stats()["upstream_errors"] == 1
+
+
+def test_failed_refresh_keeps_serving_the_stale_value(monkeypatch):
+    cache = LookupCache("location", maxsize=10, ttl=0, stale=600)
+    cache.get("203.0.113.9", lambda ip: "Chennai")
+
+    def failing(ip):
+        raise RuntimeError("429")
+
+    # the refresh runs in the background; its failure must leave the old entry in place
+    assert cache.get("203.0.113.9", failing) == "Chennai"
+    deadline = time.monotonic() + 5
+    while cache.stats()["upstream_errors"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.stats()["upstream_errors"] == 1
+    assert cache.get("203.0.113.9", failing) == "Chennai"
+
+
+def test_greeting_without_a_visitor_address_makes_no_lookups(monkeypatch):
+    def enrich(ip):
+        raise AssertionError("no lookup expected")
+
+    monkeypatch.setattr(greet, "enrich_greeting", enrich)
+    assert greet.build_greeting(None) == greet.GREETING
+
+
+@pytest.fixture
+def slow_enrichment(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def enrich(ip):
+        calls.append(ip)
+        release.wait(5)
+        return "Chennai", "Enjoy the clear weather!"
+
+    async def enrich_async(ip):
+        calls.append(ip)
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+        return "Chennai", "Enjoy the clear weather!"
+
+    monkeypatch.setattr(greet, "enrich_greeting", enrich)
+    monkeypatch.setattr(greet, "enrich_greeting_async", enrich_async)
+    monkeypatch.setattr(greet, "_inflight_enrichment", {})
+    monkeypatch.setattr(greet, "_async_enrichment", {})
+    yield SimpleNamespace(release=release, calls=calls)
+    release.set()
+
+
+def test_a_slow_lookup_gets_the_plain_greeting_within_the_deadline(slow_enrichment):
+    started = time.monotonic()
+    assert greet.build_greeting("49.204.17.5", deadline=0.1) == greet.GREETING
+    assert time.monotonic() - started < 1
+
+    # the lookup keeps running and is picked up by the next visitor from that address
+    future = greet._inflight_enrichment["49.204.17.5"]
+    slow_enrichment.release.set()
+    future.result(timeout=5)
+    assert greet.build_greeting("49.204.17.5", deadline=0.1).endswith("We hope you're connecting from Chennai. Enjoy the clear weather!")
+
+
+def test_concurrent_greetings_for_one_address_share_the_lookup(slow_enrichment):
+    for _ in range(3):
+        assert greet.build_greeting("49.204.17.5", deadline=0.05) == greet.GREETING
+    assert greet.build_greeting("49.204.17.6", deadline=0.05) == greet.GREETING
+    assert slow_enrichment.calls == ["49.204.17.5", "49.204.17.6"]
+    assert set(greet._inflight_enrichment) == {"49.204.17.5", "49.204.17.6"}
+
+    futures = list(greet._inflight_enrichment.values())
+    slow_enrichment.release.set()
+    for future in futures:
+        future.result(timeout=5)
+    # finished lookups leave the in-flight table, so a later miss starts a new one
+    deadline = time.monotonic() + 5
+    while greet._inflight_enrichment and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert greet._inflight_enrichment == {}
+
+
+def test_the_async_greeting_keeps_the_same_deadline_and_sharing(slow_enrichment):
+    async def visit():
+        started = time.monotonic()
+        first = await asyncio.gather(*(greet.build_greeting_async("49.204.17.5", deadline=0.1) for _ in range(3)))
+        elapsed = time.monotonic() - started
+        shared = len(greet._async_enrichment)
+        slow_enrichment.release.set()
+        await asyncio.sleep(0.05)
+        return first, elapsed, shared, await greet.build_greeting_async("49.204.17.5", deadline=0.5)
+
+    first, elapsed, shared, later = asyncio.run(visit())
+    assert first == [greet.GREETING] * 3
+    assert elapsed < 1
+    assert shared == 1
+    assert slow_enrichment.calls == ["49.204.17.5", "49.204.17.5"]
+    assert later.endswith("We hope you're connecting from Chennai. Enjoy the clear weather!")
@@ -0,0 +1,105 @@
+import os
+import gzip
+import time
+import logging
+import pytest
+from src.bot.logger import RotatingLogHandler
+
+
+def make_handler(tmp_path, **overrides):
+    options = dict(when="midnight", interval=1, max_bytes=0, compress=False, retention_days=7, max_archives=10)
+    options.update(overrides)
+    return RotatingLogHandler(str(tmp_path / "bot_1.log"), prefix="bot_", **options)
+
+
+def write(handler, message):
+    handler.handle(logging.makeLogRecord({"msg": message, "levelno": logging.INFO, "levelname": "INFO"}))
+
+
+def archives(tmp_path):
+    return sorted(name for name in os.listdir(tmp_path) if name != "bot_1.log")
+
+
+@pytest.fixture
+def handlers():
+    opened = []
+    yield opened
+    for handler in opened:
+        handler.close()
+
+
+def test_the_file_rolls_over_once_it_reaches_max_bytes(tmp_path, handlers):
+    handler = make_handler(tmp_path, max_bytes=100)
+    handlers.append(handler)
+    for _ in range(3):
+        write(handler, "x" * 60)
+    # the size is checked before each write, so the second record still lands in the first file
+    names = archives(tmp_path)
+    assert len(names) == 1 and names[0].startswith("bot_1.log.")
+    assert (tmp_path / names[0]).read_text() == ("x" * 60 + "\n") * 2
+    assert (tmp_path / "bot_1.log").read_text() == "x" * 60 + "\n"
+
+
+def test_max_bytes_zero_never_rolls_over_on_size(tmp_path, handlers):
+    handler = make_handler(tmp_path)
+    handlers.append(handler)
+    for _ in range(50):
+        write(handler, "x" * 60)
+    assert archives(tmp_path) == []
+
+
+def test_the_file_rolls_over_when_its_interval_ends(tmp_path, handlers):
+    handler = make_handler(tmp_path)
+    handlers.append(handler)
+    write(handler, "before")
+    handler.rolloverAt = time.time() - 1
+    write(handler, "after")
+    (name,) = archives(tmp_path)
+    assert (tmp_path / name).read_text() == "before\n"
+    assert (tmp_path / "bot_1.log").read_text() == "after\n"
+    assert handler.rolloverAt > time.time()
+
+
+def test_an_empty_file_is_not_archived(tmp_path, handlers):
+    handler = make_handler(tmp_path)
+    handlers.append(handler)
+    handler.doRollover()
+    assert archives(tmp_path) == []
+
+
+def test_archives_are_gzipped_and_never_overwrite_each_other(tmp_path, handlers):
+    handler = make_handler(tmp_path, max_bytes=1, compress=True)
+    handlers.append(handler)
+    for message in ("first", "second", "third"):
+        write(handler, message)
+    # rollovers within one second share a timestamp, and the later archive gets a suffix
+    names = archives(tmp_path)
+    assert len(names) == 2 and all(name.endswith(".gz") for name in names)
+    contents = sorted(gzip.open(tmp_path / name).read() for name in names)
+    assert contents == [b"first\n", b"second\n"]
+
+
+def test_prune_drops_expired_files_and_keeps_the_newest_archives(tmp_path, handlers):
+    now = time.time()
+    for age_days, name in [
+        (10, "bot_1.log.20240101-000000.gz"),  # past retention
+        (10, "bot_99.log"),  # a worker that exited long ago
+        (3, "bot_1.log.20240108-000000.gz"),
+        (2, "bot_1.log.20240109-000000.gz"),
+        (1, "bot_2.log.20240110-000000"),
+        (10, "other.log"),  # not ours
+    ]:
+        path = tmp_path / name
+        path.write_text("old")
+        os.utime(path, (now - age_days * 86400, now - age_days * 86400))
+
+    handler = make_handler(tmp_path, retention_days=7, max_archives=2)
+    handlers.append(handler)
+    write(handler, "current")
+    handler.prune()
+    assert sorted(os.listdir(tmp_path)) == [
+        "bot_1.log",
+        "bot_1.log.20240109-000000.gz",
+        "bot_2.log.20240110-000000",
+        "other.log",
+    ]
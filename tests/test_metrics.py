@@ -0,0 +1,28 @@
+import app as bot_app
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def test_module_stats_are_exported():
+    text = scrape(bot_app.create_app(start_outbox_worker=False).test_client())
+    for name in (
+        "bot_validation_rejections_total",
+        "bot_flow_steps_total",
+        "bot_conversation_buffer_events_total",
+        "bot_smtp_events_total",
+        "bot_greeting_cache_hit_ratio",
+        "bot_greeting_upstream_seconds_total",
+        "bot_smtp_credentials_cache_total",
+    ):
+        assert f"# TYPE {name} " in text
+
+
+def test_rejections_are_counted_by_reason():
+    client = bot_app.create_app(start_outbox_worker=False).test_client()
+    response = client.post("/chatbot/client", data="not json", content_type="application/json")
+    assert response.status_code == 400
+    assert 'bot_validation_rejections_total{endpoint="client",reason="invalid_json"}' in scrape(client)
@@ -0,0 +1,87 @@
+import pytest
+from src.bot import migrations
+from src.bot.flow import PERSONAS
+from src.bot.migrations import native_column_types, _code_case
+
+PROSPECT = PERSONAS["prospect"]
+
+
+class FakeRun:
+    """Stands in for migrations.Runner: serves column metadata and counts, records the statements."""
+
+    def __init__(self, columns, recent=0):
+        self._columns = columns
+        self.recent = recent
+        self.old_code_quiet = 600
+        self.statements = []
+
+    def columns(self, table):
+        return self._columns if table == PROSPECT.table else {}
+
+    def count(self, query, params=()):
+        return self.recent if "UTC_TIMESTAMP" in query else 0
+
+    def alter(self, table, clauses):
+        if clauses:
+            self.statements.append(("alter", table, tuple(clauses)))
+
+    def backfill(self, table, key, assignment, params=(), where=None):
+        self.statements.append(("backfill", table, assignment, where))
+
+
+def old_prospect_columns():
+    columns = {column: ("varchar", True) for column in PROSPECT.column_map}
+    columns.pop("CREATED")
+    columns.update(CREATED_ON=("varchar", True), CREATED_TIME=("varchar", True))
+    return columns
+
+
+@pytest.fixture(autouse=True)
+def prospect_only(monkeypatch):
+    monkeypatch.setattr(migrations, "_personas", lambda: [PROSPECT])
+
+
+def test_code_case_accepts_labels_and_option_numbers():
+    case, params = _code_case(PROSPECT, "RATING", "RATING")
+    pairs = dict(zip(params[::2], params[1::2]))
+    assert case.startswith("CASE TRIM(RATING) WHEN %s THEN %s")
+    assert pairs["Outstanding"] == 5
+    assert pairs["5"] == 5
+    assert len(pairs) == 2 * len(PROSPECT.coded_columns["RATING"])
+
+
+def test_swap_waits_for_the_old_code_to_stop_writing():
+    run = FakeRun(old_prospect_columns(), recent=3)
+    with pytest.raises(RuntimeError, match="deploy the new code"):
+        native_column_types(run)
+    # the new columns were added and filled, nothing was renamed or dropped
+    alters = [statement[2] for statement in run.statements if statement[0] == "alter"]
+    assert alters == [("ADD COLUMN CREATED DATETIME NULL", "ADD COLUMN RATING_CODE TINYINT UNSIGNED NULL")]
+
+
+def test_swap_renames_before_dropping_and_catches_up():
+    run = FakeRun(old_prospect_columns())
+    native_column_types(run)
+    alters = [statement[2] for statement in run.statements if statement[0] == "alter"]
+    assert alters[1] == ("RENAME COLUMN RATING TO RATING_LABEL", "RENAME COLUMN RATING_CODE TO RATING")
+    assert alters[2] == (
+        "MODIFY COLUMN CREATED DATETIME NOT NULL",
+        "DROP COLUMN CREATED_ON",
+        "DROP COLUMN CREATED_TIME",
+        "DROP COLUMN RATING_LABEL",
+    )
+    rename = run.statements.index(("alter", PROSPECT.table, alters[1]))
+    code_passes = [i for i, statement in enumerate(run.statements) if statement[0] == "backfill" and statement[2].startswith("RATING_CODE")]
+    assert len(code_passes) == 2 and code_passes[-1] < rename
+    assert ("backfill", PROSPECT.table, run.statements[rename + 1][2], "RATING IS NULL AND RATING_LABEL IS NOT NULL") == run.statements[rename + 1]
+    # old-code rows keep their own date, only rows without one get the placeholder
+    placeholders = [statement[3] for statement in run.statements if statement[0] == "backfill" and "1970" in statement[2]]
+    assert set(placeholders) == {"CREATED IS NULL AND CREATED_ON IS NULL"}
+
+
+def test_rerun_after_the_renames_drops_the_label_columns():
+    columns = {column: ("varchar", True) for column in PROSPECT.column_map}
+    columns.update(RATING=("tinyint", True), RATING_LABEL=("varchar", True), CREATED=("datetime", True))
+    run = FakeRun(columns)
+    native_column_types(run)
+    assert run.statements[-1] == ("alter", PROSPECT.table, ("MODIFY COLUMN CREATED DATETIME NOT NULL", "DROP COLUMN RATING_LABEL"))
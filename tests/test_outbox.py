@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime
+import pytest
+from src.bot import outbox
+from src.bot.config import settings
+from src.bot.outbox import PENDING, SENDING, SENT, DEAD, backoff_delay, claim_batch, drain_outbox, requeue_dead_letters
+
+ROW = ("sender@example.com", "sales@example.com", "cc@example.com", "New prospect", "details")
+LEASE = datetime(2024, 5, 1, 12, 5, 0)
+
+
+class FakeDatabase:
+    """A pooled connection stand-in: records every statement and answers SELECTs with `due` rows."""
+
+    def __init__(self, due=()):
+        self.due = list(due)
+        self.statements = []
+        self.commits = 0
+        self.rowcount = 0
+        self.fail_updates = False
+
+    @contextmanager
+    def connection(self, db=None):
+        yield self
+
+    def cursor(self, buffered=False):
+        return self
+
+    def start_transaction(self):
+        pass
+
+    def execute(self, query, params=()):
+        query = " ".join(query.split())
+        if self.fail_updates and "LOCKED_UNTIL = NULL" in query:
+            raise TimeoutError("pool exhausted")
+        self.statements.append((query, params))
+
+    def fetchall(self):
+        return self.due
+
+    def fetchone(self):
+        return (LEASE,)
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch):
+    fake = FakeDatabase()
+    monkeypatch.setattr(outbox, "pooled_connection", fake.connection)
+    monkeypatch.setattr(outbox, "settings", replace(settings, outbox=replace(settings.outbox, max_attempts=3, backoff_base=30, backoff_max=3600)))
+    return fake
+
+
+def test_claim_leases_the_due_rows(database):
+    database.due = [(11, 0, *ROW), (12, 2, *ROW)]
+    assert claim_batch(5) == (database.due, LEASE)
+    select, lease, update = database.statements
+    assert "FOR UPDATE SKIP LOCKED" in select[0]
+    assert "OR (STATUS = %s AND LOCKED_UNTIL < UTC_TIMESTAMP())" in select[0]
+    assert select[1] == (PENDING, SENDING, 5)
+    assert lease == ("SELECT UTC_TIMESTAMP() + INTERVAL %s SECOND", (settings.outbox.lease_seconds,))
+    assert update[0].startswith("UPDATE EMAIL_OUTBOX SET STATUS = %s, LOCKED_UNTIL = %s WHERE OID IN (%s, %s)")
+    assert update[1] == (SENDING, LEASE, 11, 12)
+    assert database.commits == 1
+
+
+def test_claim_with_nothing_due_updates_nothing(database):
+    assert claim_batch(5) == ([], None)
+    assert len(database.statements) == 1
+    assert database.commits == 1
+
+
+def test_drain_marks_sent_and_schedules_a_retry(database, monkeypatch):
+    database.due = [(11, 0, *ROW), (12, 0, *ROW)]
+    database.rowcount = 1
+    sent = []
+
+    def send_email(sender, receivers, cc, subject, message):
+        sent.append(subject)
+        if len(sent) == 2:
+            raise OSError("connection refused")
+
+    monkeypatch.setattr(outbox, "send_email", send_email)
+    assert drain_outbox(5) == 2
+    marked = database.statements[3:]
+    assert marked[0][0].endswith("WHERE OID = %s AND STATUS = %s AND LOCKED_UNTIL = %s")
+    assert marked[0][1] == (SENT, 11, SENDING, LEASE)
+    query, params = marked[1]
+    assert "NEXT_ATTEMPT_AT = UTC_TIMESTAMP() + INTERVAL %s SECOND" in query
+    status, attempts, error, delay, oid, *lease = params
+    assert (status, attempts, error, oid) == (PENDING, 1, "connection refused", 12)
+    assert lease == [SENDING, LEASE]
+    assert 24 <= delay <= 30
+
+
+def test_last_attempt_moves_the_email_to_the_dead_letters(database, monkeypatch):
+    database.due = [(12, 2, *ROW)]
+    database.rowcount = 1
+
+    def send_email(*args):
+        raise OSError("mailbox unavailable")
+
+    monkeypatch.setattr(outbox, "send_email", send_email)
+    drain_outbox(5)
+    query, params = database.statements[-1]
+    assert "NEXT_ATTEMPT_AT" not in query
+    assert params == (DEAD, 3, "mailbox unavailable", 12, SENDING, LEASE)
+
+
+def test_an_expired_lease_leaves_the_row_to_its_new_owner(database):
+    # rowcount 0: another worker re-claimed the row, so its lease no longer matches
+    database.rowcount = 0
+    assert outbox.mark_sent(11, LEASE) is False
+    assert outbox.mark_failed(11, LEASE, 0, OSError("timeout")) is False
+    database.rowcount = 1
+    assert outbox.mark_sent(11, LEASE) is True
+
+
+def test_a_failed_status_update_does_not_abandon_the_batch(database, monkeypatch):
+    database.due = [(11, 0, *ROW), (12, 0, *ROW), (13, 0, *ROW)]
+    database.fail_updates = True
+    sent = []
+    monkeypatch.setattr(outbox, "send_email", lambda *args: sent.append(args))
+    assert drain_outbox(5) == 3
+    assert len(sent) == 3
+
+
+def test_backoff_doubles_up_to_the_maximum(database):
+    for attempts, ceiling in ((1, 30), (2, 60), (3, 120), (10, 3600), (30, 3600)):
+        for _ in range(20):
+            assert ceiling * 0.8 - 1 <= backoff_delay(attempts) <= ceiling
+
+
+def test_requeue_dead_letters(database):
+    database.rowcount = 4
+    assert requeue_dead_letters() == 4
+    assert database.statements[0][1] == (PENDING, DEAD)
+    assert database.commits == 1
@@ -0,0 +1,169 @@
+import threading
+import pytest
+from flask import Flask
+from src.bot import database
+from src.bot.database import ConnectionPool, PoolExhaustedError, get_connection_pool, get_request_connection, reset_pools
+
+
+class FakeConnection:
+    def __init__(self, **connect_args):
+        self.connect_args = connect_args
+        self.unread_result = False
+        self.in_transaction = False
+        self.calls = []
+        self.broken = False
+
+    def consume_results(self):
+        self.calls.append("consume_results")
+        self.unread_result = False
+
+    def rollback(self):
+        if self.broken:
+            raise OSError("server has gone away")
+        self.calls.append("rollback")
+        self.in_transaction = False
+
+    def ping(self, reconnect=False, attempts=1):
+        self.calls.append("ping")
+
+    def close(self):
+        self.calls.append("close")
+
+
+class FakeServer(list):
+    """Every connection opened so far, oldest first; `down` makes the next connects fail."""
+
+    down = False
+
+    def connect(self, **kwargs):
+        if self.down:
+            raise OSError("can't connect")
+        self.append(FakeConnection(**kwargs))
+        return self[-1]
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(database.conn, "connect", server.connect)
+    monkeypatch.setattr(database, "_pools", {})
+    return server
+
+
+def make_pool(**kwargs):
+    return ConnectionPool("primary", "bot", "secret", "chatbot", **kwargs)
+
+
+def test_a_returned_connection_is_reused(connections):
+    pool = make_pool(size=2)
+    first = pool.checkout()
+    assert pool.stats()["in_use"] == 1
+    pool.release(first)
+    assert pool.stats()["in_use"] == 0
+    assert pool.checkout()._connection is first._connection
+    stats = pool.stats()
+    assert (stats["created"], stats["checkouts"], stats["returns"], stats["open"]) == (1, 2, 1, 1)
+    assert connections[0].connect_args["host"] == "primary"
+
+
+def test_overflow_connections_are_closed_on_return(connections):
+    pool = make_pool(size=1, max_overflow=1)
+    first, second = pool.checkout(), pool.checkout()
+    assert pool.stats()["peak_in_use"] == 2
+    pool.release(first)
+    pool.release(second)
+    stats = pool.stats()
+    assert (stats["open"], stats["idle"], stats["in_use"], stats["discarded"]) == (1, 1, 0, 1)
+    assert connections[1].calls == ["close"]
+
+
+def test_an_exhausted_pool_gives_up_after_the_timeout(connections):
+    pool = make_pool(size=1, max_overflow=0, timeout=0.05)
+    held = pool.checkout()
+    with pytest.raises(PoolExhaustedError):
+        pool.checkout()
+    assert pool.stats()["exhausted"] == 1
+    pool.release(held)
+    assert pool.checkout()._connection is held._connection
+
+
+def test_a_waiting_checkout_gets_the_next_returned_connection(connections):
+    pool = make_pool(size=1, max_overflow=0, timeout=5)
+    held = pool.checkout()
+    threading.Timer(0.05, pool.release, (held,)).start()
+    assert pool.checkout()._connection is held._connection
+    assert pool.stats()["waits"] == 1
+
+
+def test_release_rolls_back_and_drains_the_connection(connections):
+    pool = make_pool()
+    mydb = pool.checkout()
+    connections[0].unread_result = True
+    connections[0].in_transaction = True
+    pool.release(mydb)
+    assert connections[0].calls == ["consume_results", "rollback"]
+    assert pool.stats()["idle"] == 1
+
+
+def test_a_broken_connection_is_discarded(connections):
+    pool = make_pool()
+    mydb = pool.checkout()
+    connections[0].in_transaction = True
+    connections[0].broken = True
+    pool.release(mydb)
+    stats = pool.stats()
+    assert (stats["open"], stats["idle"], stats["discarded"]) == (0, 0, 1)
+    assert pool.checkout()._connection is connections[1]
+
+
+def test_a_failed_connect_frees_its_slot(connections):
+    pool = make_pool(size=1, max_overflow=0, timeout=0.05)
+    connections.down = True
+    with pytest.raises(OSError):
+        pool.checkout()
+    stats = pool.stats()
+    assert (stats["open"], stats["in_use"]) == (0, 0)
+    connections.down = False
+    pool.checkout()
+
+
+def test_a_long_idle_connection_is_pinged(connections):
+    pool = make_pool(recycle=0)
+    pool.release(pool.checkout())
+    pool.checkout()
+    assert connections[0].calls == ["ping"]
+
+
+def test_the_request_connection_is_returned_on_teardown(connections):
+    app = Flask(__name__)
+    database.init_app(app)
+    seen = []
+
+    @app.route("/ok")
+    def ok():
+        seen.append(get_request_connection())
+        seen.append(get_request_connection())
+        return "ok"
+
+    @app.route("/boom")
+    def boom():
+        get_request_connection()
+        raise RuntimeError("view failed")
+
+    client = app.test_client()
+    assert client.get("/ok").status_code == 200
+    assert seen[0] is seen[1]
+    assert client.get("/boom").status_code == 500
+    stats = get_connection_pool().stats()
+    assert (stats["checkouts"], stats["returns"], stats["in_use"], stats["created"]) == (2, 2, 0, 1)
+
+
+def test_reset_pools_forgets_the_parents_connections(connections):
+    pool = get_connection_pool()
+    pool.release(pool.checkout())
+    reset_pools()
+    assert get_connection_pool() is not pool
+    # the socket belongs to the parent process; closing it here would break the parent's session
+    assert connections[0].calls == []
+    get_connection_pool().checkout()
+    assert len(connections) == 2
@@ -0,0 +1,126 @@
+from collections import Counter
+from dataclasses import replace
+from datetime import date, datetime
+from types import SimpleNamespace
+from src.bot import rollups
+from src.bot.config import settings
+from src.bot.flow import PERSONAS
+from src.bot.rollups import count_rows, funnel_stages
+
+PROSPECT = PERSONAS["prospect"]
+EXISTING_CLIENT = PERSONAS["existing_client"]
+
+
+def test_funnel_stages_follow_the_flow():
+    assert funnel_stages(PROSPECT) == [
+        ("details", None),
+        ("industries", "INDUSTRY"),
+        ("verticals", "VERTICAL"),
+        ("requirements", "REQUIREMENTS"),
+        ("known_source", "KNOWN_SOURCE"),
+        ("rate", "RATING"),
+        ("feedback", "FEEDBACK"),
+    ]
+
+
+def test_steps_sharing_a_column_are_one_stage():
+    step = lambda name, column: SimpleNamespace(name=name, column=column)
+    persona = SimpleNamespace(steps={
+        "category": step("category", "CATEGORY"),
+        "fresher_vertical": step("fresher_vertical", "VERTICAL"),
+        "experienced_vertical": step("experienced_vertical", "VERTICAL"),
+    })
+    assert funnel_stages(persona) == [("details", None), ("category", "CATEGORY"), ("vertical", "VERTICAL"), ("feedback", "FEEDBACK")]
+
+
+def test_count_rows_by_day_dimension_and_stage():
+    rows = [
+        {"CREATED": datetime(2026, 1, 5, 9), "VERTICAL": "Data and AI, Cloud", "ISSUE_ESCALATION": "Support", "RATING": "Excellent", "FEEDBACK": "thanks"},
+        {"CREATED": datetime(2026, 1, 5, 23, 59), "VERTICAL": "Cloud", "RATING": None, "FEEDBACK": ""},
+        {"CREATED": datetime(2026, 1, 6, 0, 1)},
+    ]
+    counts = count_rows(EXISTING_CLIENT, rows, Counter())
+    first, second = date(2026, 1, 5), date(2026, 1, 6)
+    assert counts[("total", first, "")] == 2
+    assert counts[("total", second, "")] == 1
+    # a multi-select answer counts once per option
+    assert counts[("vertical", first, "Cloud")] == 2
+    assert counts[("vertical", first, "Data and AI")] == 1
+    assert counts[("rating", first, "Excellent")] == 1
+    assert counts[("funnel", first, "details")] == 2
+    assert counts[("funnel", first, "verticals")] == 2
+    assert counts[("funnel", first, "issue_escalation")] == 1
+    # empty answers do not reach a stage
+    assert counts[("funnel", first, "feedback")] == 1
+    assert counts[("funnel", second, "details")] == 1
+    assert ("funnel", second, "verticals") not in counts
+    assert not any(dimension == "known_source" for dimension, _, _ in counts)
+
+
+def test_count_rows_adds_to_existing_counts():
+    counts = Counter({("total", date(2026, 1, 5), ""): 10})
+    count_rows(PROSPECT, [{"CREATED": datetime(2026, 1, 5, 12)}], counts)
+    assert counts[("total", date(2026, 1, 5), "")] == 11
+
+
+class FakeRollupDatabase:
+    """The prospect table as (PID, CREATED) rows; answers the statements update_persona sends."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.watermarks = []
+        self.commits = 0
+
+    def cursor(self, buffered=False):
+        return FakeRollupCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+class FakeRollupCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=()):
+        query = " ".join(query.split())
+        if query.startswith("SELECT LAST_ID"):
+            self.result = []
+        elif query.startswith("SELECT MAX"):
+            watermark, cutoff = params
+            self.result = [(max((pid for pid, created in self.db.rows if pid > watermark and created < cutoff), default=None),)]
+        elif query.startswith("SELECT"):
+            low, high = params
+            self.result = [(pid, created) + (None,) * (query.count(",") - 1) for pid, created in self.db.rows if low < pid <= high]
+        elif "ROLLUP_WATERMARK" in query:
+            self.db.watermarks.append(params[1])
+
+    def executemany(self, query, values):
+        pass
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def __iter__(self):
+        return iter(self.result)
+
+    def close(self):
+        pass
+
+
+def test_update_persona_returns_the_rows_its_batches_counted(monkeypatch):
+    monkeypatch.setattr(rollups, "settings", replace(settings, rollup=replace(settings.rollup, batch_size=2, settle_seconds=3600)))
+    now = datetime(2026, 1, 5, 12)
+    old = datetime(2026, 1, 5, 9)
+    # PID 4 is younger than the cutoff but PID 5 is not, so the key range up to 5 counts it too
+    db = FakeRollupDatabase([(1, old), (2, old), (3, old), (4, datetime(2026, 1, 5, 11, 30)), (5, old), (6, datetime(2026, 1, 5, 11, 59))])
+    assert rollups.update_persona(db, db.cursor(), PROSPECT, now) == 5
+    assert db.watermarks == [2, 4, 5]
+    assert db.commits == 3
+
+
+def test_update_persona_with_nothing_settled_counts_nothing():
+    db = FakeRollupDatabase([(1, datetime(2026, 1, 5, 11, 59))])
+    assert rollups.update_persona(db, db.cursor(), PROSPECT, datetime(2026, 1, 5, 12)) == 0
+    assert db.watermarks == []
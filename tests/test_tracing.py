@@ -0,0 +1,99 @@
+import re
+from dataclasses import replace
+from types import SimpleNamespace
+import pytest
+import app as bot_app
+from src.bot import tracing
+from src.bot.config import settings
+from src.bot.logger import request_id
+from src.bot.metrics import phase
+from src.bot.tracing import Trace, traced
+
+
+@pytest.fixture
+def client(monkeypatch):
+    seen = SimpleNamespace(request_ids=[], warnings=[])
+
+    def greeting(ip):
+        # the lookups a real greeting makes, as phases of this request
+        seen.request_ids.append(request_id.get())
+        with phase("greeting_location_lookup"):
+            pass
+        with phase("greeting_weather_lookup"):
+            pass
+        with phase("greeting_weather_lookup"):
+            pass
+        return "Hello"
+
+    monkeypatch.setattr(bot_app, "build_greeting", greeting)
+    monkeypatch.setattr(tracing, "logging", SimpleNamespace(warning=seen.warnings.append, info=lambda message: None, error=lambda message: None))
+    seen.client = bot_app.create_app(start_outbox_worker=False).test_client()
+    return seen
+
+
+def test_server_timing_lists_each_phase_once_with_its_count(client):
+    response = client.client.get("/chatbot/greeting")
+    entries = response.headers["Server-Timing"].split(", ")
+    assert [entry.split(";")[0] for entry in entries] == ["greeting_location_lookup", "greeting_weather_lookup", "total"]
+    assert re.fullmatch(r'greeting_weather_lookup;dur=\d+\.\d;desc="x2"', entries[1])
+    assert re.fullmatch(r"total;dur=\d+\.\d", entries[2])
+
+
+def test_server_timing_can_be_turned_off(client, monkeypatch):
+    monkeypatch.setattr(tracing, "settings", replace(settings, trace=replace(settings.trace, server_timing=False)))
+    response = client.client.get("/chatbot/greeting")
+    assert "Server-Timing" not in response.headers
+    assert response.headers["X-Request-ID"]
+
+
+def test_an_incoming_request_id_is_echoed_and_stamped_on_the_logs(client):
+    response = client.client.get("/chatbot/greeting", headers={"X-Request-ID": "lb-1234.abc_9"})
+    assert response.headers["X-Request-ID"] == "lb-1234.abc_9"
+    assert client.request_ids == ["lb-1234.abc_9"]
+    # the id does not leak past the request
+    assert request_id.get() == "-"
+
+
+@pytest.mark.parametrize("incoming", [None, "", "has spaces", "x" * 65, "id;drop"])
+def test_a_missing_or_odd_request_id_is_replaced(client, incoming):
+    headers = {} if incoming is None else {"X-Request-ID": incoming}
+    response = client.client.get("/chatbot/greeting", headers=headers)
+    assert re.fullmatch(r"[0-9a-f]{32}", response.headers["X-Request-ID"])
+    assert client.request_ids == [response.headers["X-Request-ID"]]
+
+
+def test_every_request_gets_its_own_id(client):
+    ids = {client.client.get("/chatbot/greeting").headers["X-Request-ID"] for _ in range(3)}
+    assert len(ids) == 3
+
+
+def test_a_slow_request_is_logged_with_its_spans(client, monkeypatch):
+    monkeypatch.setattr(tracing, "settings", replace(settings, trace=replace(settings.trace, slow_ms=0.0)))
+    client.client.get("/chatbot/greeting")
+    (warning,) = client.warnings
+    assert warning.startswith("slow request GET /chatbot/greeting 200 ")
+    assert re.search(r"greeting_location_lookup@\d+ms=\d+\.\dms greeting_weather_lookup@", warning)
+
+
+def test_rejected_requests_are_traced_too(client):
+    response = client.client.post("/chatbot/prospect/rate", json={}, headers={"X-Request-ID": "abc"})
+    assert response.status_code == 400
+    assert response.headers["X-Request-ID"] == "abc"
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+
+
+def test_failed_phases_are_marked_in_the_description():
+    trace = Trace()
+    trace.add("db_query", trace.started, 0.004, False)
+    trace.add("smtp_login", trace.started + 0.004, 0.0021, True)
+    assert trace.describe() == "db_query@0ms=4.0ms smtp_login@4ms=2.1ms!"
+    assert trace.server_timing(9.81) == "db_query;dur=4.0, smtp_login;dur=2.1, total;dur=9.8"
+
+
+def test_background_work_shares_one_id_across_its_log_lines():
+    with traced("outbox drain") as trace:
+        with phase("db_query"):
+            pass
+        assert request_id.get() == trace.request_id
+    assert [span[0] for span in trace.spans] == ["db_query"]
+    assert request_id.get() == "-"
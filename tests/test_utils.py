@@ -0,0 +1,36 @@
+import ipaddress
+from dataclasses import replace
+from types import SimpleNamespace
+import pytest
+from src.bot import utils
+from src.bot.config import settings
+from src.bot.utils import get_client_ip
+
+
+@pytest.fixture(autouse=True)
+def trusted_proxies(monkeypatch):
+    proxies = tuple(ipaddress.ip_network(cidr) for cidr in ("127.0.0.1/32", "10.0.0.0/8"))
+    monkeypatch.setattr(utils, "settings", replace(settings, server=replace(settings.server, trusted_proxies=proxies)))
+
+
+def request(remote_addr, forwarded_for=None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for is not None else {}
+    return SimpleNamespace(remote_addr=remote_addr, headers=headers)
+
+
+def test_direct_visitor_ignores_forwarded_for():
+    assert get_client_ip(request("198.51.100.4", "203.0.113.9")) == "198.51.100.4"
+
+
+def test_skips_every_trusted_hop():
+    assert get_client_ip(request("127.0.0.1", "198.51.100.4, 203.0.113.9, 10.0.0.7, 10.0.0.2")) == "203.0.113.9"
+
+
+def test_trusted_proxy_without_forwarded_for():
+    assert get_client_ip(request("127.0.0.1")) == "127.0.0.1"
+
+
+def test_malformed_hop_never_returns_one_of_our_proxies():
+    # 10.0.0.2 is our own proxy; the garbage to its left must not promote it to visitor
+    assert get_client_ip(request("127.0.0.1", "203.0.113.9, not-an-ip, 10.0.0.2")) == "127.0.0.1"
+    assert get_client_ip(request("127.0.0.1", "unknown")) == "127.0.0.1"
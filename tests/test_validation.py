@@ -0,0 +1,109 @@
+import pytest
+import app as bot_app
+from src.bot.flow import PERSONAS
+from src.bot.validation import SCHEMAS, Field, Requires, Schema, STRING, ROW_ID, LIST, check, rejection
+
+SCHEMA = Schema(
+    fields=(Field("row_id", ROW_ID), Field("selected_options", LIST, items=STRING), Field("note", STRING, required=False)),
+    requires=(Requires("selected_options", frozenset({"6"}), "source_specification"),),
+)
+
+
+@pytest.mark.parametrize("body, problems", [
+    ({"row_id": 7, "selected_options": ["1"]}, []),
+    ({"row_id": "7", "selected_options": [], "note": "hi"}, []),
+    # fields the schema does not name are left for the handler to ignore
+    ({"row_id": 7, "selected_options": ["1"], "utm_source": 3}, []),
+    ({"selected_options": ["1"]}, [("row_id", "missing")]),
+    ({"row_id": None, "selected_options": ["1"]}, [("row_id", "missing")]),
+    ({"row_id": 7.5, "selected_options": ["1"]}, [("row_id", "wrong_type")]),
+    ({"row_id": True, "selected_options": ["1"]}, [("row_id", "wrong_type")]),
+    ({"row_id": 7, "selected_options": "1"}, [("selected_options", "wrong_type")]),
+    ({"row_id": 7, "selected_options": ["1", 2]}, [("selected_options", "wrong_item_type")]),
+    ({"row_id": 7, "selected_options": ["1"], "note": 5}, [("note", "wrong_type")]),
+    ({}, [("row_id", "missing"), ("selected_options", "missing")]),
+    ([1, 2], [("body", "not_an_object")]),
+])
+def test_check_reports_missing_and_wrong_type_fields(body, problems):
+    assert check(SCHEMA, body) == problems
+
+
+def test_requires_asks_for_the_specification_only_when_its_option_is_chosen():
+    assert check(SCHEMA, {"row_id": 7, "selected_options": ["1", "6"]}) == [("source_specification", "missing")]
+    assert check(SCHEMA, {"row_id": 7, "selected_options": ["6"], "source_specification": 1}) == [("source_specification", "wrong_type")]
+    assert check(SCHEMA, {"row_id": 7, "selected_options": ["6"], "source_specification": "Mining"}) == []
+    assert check(SCHEMA, {"row_id": 7, "selected_options": ["1"]}) == []
+
+    single = SCHEMAS["known_source"]
+    assert check(single, {"row_id": 7, "selected_option": "5"}) == [("source_specification", "missing")]
+    assert check(single, {"row_id": 7, "selected_option": "2"}) == []
+
+
+def test_batch_steps_are_checked_against_their_own_schema():
+    schema = SCHEMAS[PERSONAS["prospect"].batch_endpoint]
+    body = {"row_id": 7, "steps": [
+        {"step": "rate", "selected_option": 4},
+        {"step": "industries", "selected_options": ["11"]},
+        {"step": "feedback"},
+        {"step": "no_such_step"},
+    ]}
+    assert check(schema, body) == [
+        ("steps[0].selected_option", "wrong_type"),
+        ("steps[1].source_specification", "missing"),
+        ("steps[2].text", "missing"),
+    ]
+    assert check(schema, {"row_id": 7, "steps": ["rate"]}) == [("steps", "wrong_item_type")]
+
+
+def test_every_post_route_has_a_schema():
+    app = bot_app.create_app(start_outbox_worker=False)
+    posted = {rule.endpoint for rule in app.url_map.iter_rules() if "POST" in rule.methods}
+    assert posted <= set(SCHEMAS)
+
+
+def test_free_text_steps_with_their_own_answer_keep_it():
+    # an empty linkedin_url still gets the handler's "No LinkedIn URL provided" response
+    assert rejection("collect_linkedin_url", "POST", {"row_id": 7}) is None
+    assert rejection("collect_issue", "POST", {"row_id": 7}) == (
+        {"status": "error", "code": 400, "message": "Invalid request.", "errors": [{"field": "issue", "reason": "missing"}]},
+        400,
+    )
+
+
+def test_only_posts_to_known_endpoints_are_checked():
+    assert rejection("get_greeting", "GET", None) is None
+    assert rejection("metrics", "POST", None) is None
+    assert rejection("client", "POST", None)[0]["errors"] == [{"field": "body", "reason": "invalid_json"}]
+
+
+@pytest.fixture
+def client(mysql):
+    mysql.tables["PROSPECTS"] = {7: {"NAME": "Ada"}}
+    return bot_app.create_app(start_outbox_worker=False).test_client()
+
+
+@pytest.mark.parametrize("body", [
+    {"selected_option": "4"},
+    {"row_id": 7, "selected_option": 4},
+    {"row_id": 7, "selected_option": ["4"]},
+    {"row_id": [7], "selected_option": "4"},
+])
+def test_a_rejected_body_never_reaches_the_database(client, mysql, body):
+    response = client.post("/chatbot/prospect/rate", json=body)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Invalid request."
+    assert mysql.statements == []
+    assert mysql.commits == 0
+
+
+def test_a_body_that_is_not_json_never_reaches_the_database(client, mysql):
+    response = client.post("/chatbot/prospect/rate", data="selected_option=4", content_type="application/x-www-form-urlencoded")
+    assert response.status_code == 400
+    assert response.get_json()["errors"] == [{"field": "body", "reason": "invalid_json"}]
+    assert mysql.statements == []
+
+
+def test_a_valid_body_reaches_the_handler(client, mysql):
+    response = client.post("/chatbot/prospect/rate", json={"row_id": 7, "selected_option": "4"})
+    assert response.get_json()["message"] == "Excellent"
+    assert mysql.row("PROSPECTS", 7)["RATING"] == 4